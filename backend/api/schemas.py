@@ -131,6 +131,70 @@ class VideoGenerationPrompt(BaseModel):
     )
 
 
+class ContentPlanItem(BaseModel):
+    """A single planned post in an AI-generated content plan."""
+
+    day: int = Field(ge=1, description="Day of the plan on which to post, starting at 1.")
+    content_type: Literal["post", "story", "reel"] = Field(
+        description="The type of content to be created."
+    )
+    post_context: str = Field(
+        min_length=1,
+        description="The specific, genuine moment the post should show.",
+    )
+
+
+class ContentPlan(BaseModel):
+    """Structured output of the reel and story content planners."""
+
+    items: List[ContentPlanItem]
+
+
+class GeneratedCaption(BaseModel):
+    """Structured output of caption generation."""
+
+    caption: str = Field(min_length=1, description="A short, engaging caption, 1-3 sentences.")
+    hashtags: List[str] = Field(description="3-5 relevant hashtags, each starting with #.")
+
+
+class GeneratedPost(VideoGenerationPrompt):
+    """Structured output of fused scene prompt and caption generation."""
+
+    description: str = Field(
+        min_length=1,
+        description="A third-person narrative describing the scene: environment, actions, and dialogue.",
+    )
+    intention: str = Field(
+        min_length=1,
+        description="A first-person, internal monologue describing the character's thoughts, feelings, or motivation.",
+    )
+    caption: str = Field(min_length=1, description="A short, engaging caption, 1-3 sentences.")
+    hashtags: List[str] = Field(description="3-5 relevant hashtags, each starting with #.")
+
+
+class GeneratedPostBatchItem(GeneratedPost):
+    index: int = Field(ge=0, description="Index of the video concept this post answers.")
+
+
+class GeneratedPostBatch(BaseModel):
+    """Structured output of batched post generation."""
+
+    posts: List[GeneratedPostBatchItem]
+
+
+class PlanItemReview(BaseModel):
+    id: int = Field(description="Id of the planned post being reviewed.")
+    consistent: bool = Field(
+        description="Whether the planned post still fits the rewritten life story."
+    )
+
+
+class PlanReview(BaseModel):
+    """Structured output of the incremental re-planning review."""
+
+    items: List[PlanItemReview]
+
+
 class VideoBase(BaseModel):
     scheduled_time: datetime
     content_type: Literal["post", "story", "reel"] = "post"
@@ -151,6 +215,7 @@ class Video(VideoBase):
     sponsor_id: Optional[int] = None
     video_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
+    post_context: Optional[str] = None
     status: VideoStatus
     performance_metrics: Optional[Dict[str, Any]] = None
     created_at: datetime
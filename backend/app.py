@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+import json
 import os
 import uuid
 from dotenv import load_dotenv
@@ -8,6 +9,7 @@ import asyncio
 
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from starlette.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 
@@ -27,11 +29,25 @@ from api import schemas
 from managers.instagram_manager import InstagramManager
 from managers.scheduler import video_scheduler
 from managers.ai_generator import ai_generator
+from managers.circuit_breaker import circuit_breaker
+from managers.hedging import request_hedger
+from managers.llm_metrics import llm_metrics
+from managers.model_router import model_router
+from managers.rate_limiter import rate_limiter
+from managers.scene_dedup import scene_deduplicator
+from managers.life_story_memory import record_life_event, reset_life_story
 from utils.background_tasks import (
+    clear_future_posts,
     process_interval_schedule,
     process_dated_schedule,
     plan_and_schedule_from_life_story,
 )
+from utils.lazy_generation import lazy_stats, start_materializer
+from utils.replanning import replan_after_intervention
+from utils.life_story_stream import (
+    get_life_story_stream,
+    start_life_story_generation,
+)
 
 load_dotenv()
 
@@ -49,6 +65,10 @@ app.add_middleware(
 app.mount("/storage", StaticFiles(directory="storage"), name="storage")
 
 ig_manager = InstagramManager()
+start_materializer(video_scheduler.scheduler)
+# Rebuild jobs lost with the last process in the background; the API serves
+# requests meanwhile.
+video_scheduler.rehydrate_in_background()
 
 STORAGE_DIR = Path("storage/files")
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
@@ -57,7 +77,7 @@ STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 # NOTE: The following function is a placeholder for a real AI implementation
 # and would ideally live in the `managers.ai_generator` module.
 def update_life_story_if_significant_mock(
-    current_life_story: str, event_description: str
+    influencer: Influencer, event_description: str
 ) -> tuple[str, bool]:
     """
     (Mock) Uses AI to determine if an event is significant and, if so, updates the life story.
@@ -67,10 +87,14 @@ def update_life_story_if_significant_mock(
     simulates a scenario where the LLM always deems the new event significant enough
     to warrant a narrative update, triggering a full content regeneration.
 
+    The event is recorded in the influencer's bounded life-story memory, so the
+    story stays within its token budget however many posts the account makes.
+
     Returns the new life story and a boolean indicating that it was changed.
     """
     # This simulates the LLM deciding the event is always significant.
-    updated_story = f"{current_life_story}\n\n{event_description}"
+    with llm_metrics.for_influencer(influencer.id):
+        updated_story = record_life_event(influencer, event_description)
     return updated_story, True
 
 
@@ -98,7 +122,7 @@ def process_lifestyle_post_update(
             updated_story,
             was_updated,
         ) = ai_generator.update_life_story_if_significant(
-            influencer.life_story, event_description
+            influencer, event_description
         )
 
         if not was_updated:
@@ -112,33 +136,9 @@ def process_lifestyle_post_update(
         db.refresh(influencer)
         print(f"Updated life story for {influencer.name}.")
 
-        # 2. Clear upcoming scheduled posts
-        now = datetime.now()
-        future_schedules = (
-            db.query(Schedule)
-            .join(Video, Video.id == Schedule.video_id)
-            .filter(Video.influencer_id == influencer_id)
-            .filter(Schedule.run_at > now)
-            .all()
-        )
-
-        for schedule in future_schedules:
-            if schedule.video_id == trigger_video_id:
-                continue  # Don't delete the post that triggered this update
-
-            print(f"Unscheduling and deleting old post {schedule.video_id}")
-            if schedule.job_id:
-                video_scheduler.unschedule_video(schedule.job_id)
-
-            video_to_delete = (
-                db.query(Video).filter(Video.id == schedule.video_id).first()
-            )
-            db.delete(schedule)
-            if video_to_delete:
-                db.delete(video_to_delete)
-
-        db.commit()
-        print("Cleared future posts.")
+        # 2. Clear upcoming scheduled posts, except the one that triggered this update
+        cleared = clear_future_posts(db, influencer_id, exclude_video_ids=(trigger_video_id,))
+        print(f"Cleared {cleared} future posts.")
 
         # 3. Regenerate schedule
         plan_and_schedule_from_life_story(influencer.id, days_to_plan=30)
@@ -148,24 +148,11 @@ def process_lifestyle_post_update(
         db.close()
 
 
-@app.post("/sorcerer/init", response_model=schemas.Influencer)
-def create_influencer_wizard(
-    wizard_data: schemas.OnboardingWizardRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-):
-    print(wizard_data)
-
-    """Create influencer through onboarding wizard"""
-    persona = {
-        "background": wizard_data.background_info,
-        "goals": wizard_data.goals,
-        "tone": wizard_data.tone,
-    }
-
-    life_story = None
-    if wizard_data.mode == InfluencerMode.LIFESTYLE:
-        life_story = ai_generator.generate_life_story(wizard_data.name, persona)
+def _create_wizard_influencer(
+    wizard_data: schemas.OnboardingWizardRequest, life_story, db: Session
+) -> Influencer:
+    """Persists the influencer described by the onboarding wizard."""
+    persona = _wizard_persona(wizard_data)
 
     audience_targeting = {
         "age_range": wizard_data.audience_age_range,
@@ -192,15 +179,56 @@ def create_influencer_wizard(
     db.add(db_influencer)
     db.commit()
     db.refresh(db_influencer)
+    return db_influencer
+
 
+def _wizard_persona(wizard_data: schemas.OnboardingWizardRequest) -> dict:
+    return {
+        "background": wizard_data.background_info,
+        "goals": wizard_data.goals,
+        "tone": wizard_data.tone,
+    }
+
+
+def _wizard_days_to_plan(wizard_data: schemas.OnboardingWizardRequest) -> int:
+    return (
+        wizard_data.lifestyle_planning.days_to_plan
+        if wizard_data.lifestyle_planning
+        else 30
+    )  # for now
+
+
+def _link_instagram_account(
+    wizard_data: schemas.OnboardingWizardRequest, influencer_id: int
+):
     success, _message = ig_manager.add_account(
-        wizard_data.instagram_username, wizard_data.instagram_password, db_influencer.id
+        wizard_data.instagram_username, wizard_data.instagram_password, influencer_id
     )
     if not success:
         print(
             f"Warning: Could not link Instagram account for {wizard_data.name}. Error: {_message}"
         )
 
+
+@app.post("/sorcerer/init", response_model=schemas.Influencer)
+def create_influencer_wizard(
+    wizard_data: schemas.OnboardingWizardRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
+    print(wizard_data)
+
+    """Create influencer through onboarding wizard"""
+    life_story = None
+    if wizard_data.mode == InfluencerMode.LIFESTYLE:
+        life_story = ai_generator.generate_life_story(
+            wizard_data.name, _wizard_persona(wizard_data)
+        )
+
+    db_influencer = _create_wizard_influencer(wizard_data, life_story, db)
+
+    _link_instagram_account(wizard_data, db_influencer.id)
+
     if wizard_data.posting_frequency and wizard_data.mode == InfluencerMode.COMPANY:
         background_tasks.add_task(
             process_interval_schedule,
@@ -210,20 +238,95 @@ def create_influencer_wizard(
             wizard_data.posting_frequency.story_interval_hours,
         )
     elif wizard_data.mode == InfluencerMode.LIFESTYLE:
-        days_to_plan = (
-            wizard_data.lifestyle_planning.days_to_plan
-            if wizard_data.lifestyle_planning
-            else 30
-        )  # for now
         background_tasks.add_task(
             plan_and_schedule_from_life_story,
             db_influencer.id,
-            days_to_plan=days_to_plan,
+            days_to_plan=_wizard_days_to_plan(wizard_data),
+        )
+
+    return db_influencer
+
+
+@app.post("/sorcerer/init/stream", response_model=schemas.Influencer)
+def create_influencer_wizard_streaming(
+    wizard_data: schemas.OnboardingWizardRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
+    """
+    Create influencer through onboarding wizard without waiting for the life story.
+
+    The influencer is returned immediately with an empty life story. For
+    lifestyle influencers the story is generated in the background; follow it
+    token by token at GET /influencer/{id}/life-story/stream. Content planning
+    starts as soon as the story is complete.
+    """
+    db_influencer = _create_wizard_influencer(wizard_data, None, db)
+
+    if wizard_data.mode == InfluencerMode.LIFESTYLE:
+        start_life_story_generation(
+            db_influencer.id,
+            wizard_data.name,
+            _wizard_persona(wizard_data),
+            days_to_plan=_wizard_days_to_plan(wizard_data),
+        )
+
+    # Logging in to Instagram can take several seconds; do it after responding.
+    background_tasks.add_task(_link_instagram_account, wizard_data, db_influencer.id)
+
+    if wizard_data.posting_frequency and wizard_data.mode == InfluencerMode.COMPANY:
+        background_tasks.add_task(
+            process_interval_schedule,
+            db_influencer.id,
+            7,  # 7 days
+            wizard_data.posting_frequency.reel_interval_hours,
+            wizard_data.posting_frequency.story_interval_hours,
         )
 
     return db_influencer
 
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/influencer/{influencer_id}/life-story/stream")
+def stream_life_story(influencer_id: int, db: Session = Depends(get_db)):
+    """
+    Streams an influencer's life story as server-sent events.
+
+    Emits `token` events (`{"text": ...}`) from the beginning of the story, then
+    a single `done` event. If no generation is in progress, the stored story is
+    sent as one token.
+    """
+    influencer = db.query(Influencer).filter(Influencer.id == influencer_id).first()
+    if not influencer:
+        raise HTTPException(status_code=404, detail="Influencer not found")
+
+    stream = get_life_story_stream(influencer_id)
+    stored_story = influencer.life_story
+
+    def events():
+        if stream is None:
+            if stored_story:
+                yield _sse_event("token", {"text": stored_story})
+            yield _sse_event("done", {"error": None})
+            return
+
+        for text in stream.iter_chunks():
+            if text is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _sse_event("token", {"text": text})
+        yield _sse_event("done", {"error": stream.error})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/influencers", response_model=List[schemas.Influencer])
 def list_influencers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """List user's influencers"""
@@ -623,8 +726,14 @@ def root():
         "name": "AIfluence API",
         "version": "1.0.0",
         "endpoints": {
-            "influencer": ["/sorcerer/init", "/influencers", "/influencer/{id}"],
-            "scheduling": ["/schedule", "/schedule/interval", "/schedule/bulk"],
+            "influencer": [
+                "/sorcerer/init",
+                "/sorcerer/init/stream",
+                "/influencers",
+                "/influencer/{id}",
+                "/influencer/{id}/life-story/stream",
+            ],
+            "scheduling": ["/schedule", "/schedule/interval", "/schedule/bulk", "/scheduler/status"],
             "video_generation": ["/video/generate"],
             "divine_intervention": ["/influencer/{id}/divine-intervention"],
             "sponsors": [
@@ -633,11 +742,41 @@ def root():
                 "/video/{id}/add-sponsor",
             ],
             "image generation": ["/generate-image"],
+            "metrics": ["/metrics/llm"],
             # "legacy": ["/accounts", "/upload/*", "/analytics/*"],
         },
     }
 
 
+@app.get("/scheduler/status")
+def get_scheduler_status():
+    """
+    Scheduler engine and job store in use, progress of the startup rehydration
+    and, for the polling engine, dispatch counts and lag.
+    """
+    return video_scheduler.status()
+
+
+@app.get("/metrics/llm")
+def get_llm_metrics(influencer_id: Optional[int] = None):
+    """
+    Latency, token, cost, retry and fallback statistics for Claude calls,
+    per AIContentGenerator method. Pass `influencer_id` for one influencer's
+    breakdown.
+    """
+    metrics = llm_metrics.summary(influencer_id)
+    if influencer_id is None:
+        metrics["prompt_cache"] = ai_generator.cache_stats
+        metrics["response_cache"] = ai_generator.response_cache.stats()
+        metrics["rate_limiter"] = rate_limiter.stats()
+        metrics["model_routes"] = model_router.stats()
+        metrics["circuit_breakers"] = circuit_breaker.stats()
+        metrics["hedging"] = request_hedger.stats()
+        metrics["scene_dedup"] = scene_deduplicator.stats()
+        metrics["lazy_generation"] = lazy_stats.summary()
+    return metrics
+
+
 @app.post("/influencer/{influencer_id}/divine-intervention")
 def divine_intervention(
     influencer_id: int,
@@ -647,41 +786,29 @@ def divine_intervention(
 ):
     """
     Triggers a divine intervention, rewriting the influencer's life story
-    and regenerating their content schedule.
+    and replanning the future posts that no longer fit it.
     """
     influencer = db.query(Influencer).filter(Influencer.id == influencer_id).first()
     if not influencer or influencer.mode != InfluencerMode.LIFESTYLE:
         raise HTTPException(status_code=404, detail="Lifestyle influencer not found")
 
     # 1. Rewrite the life story using AI
-    updated_story = ai_generator.rewrite_life_story(
-        influencer.life_story, request.event_description, request.intensity
-    )
-    influencer.life_story = updated_story
-    db.commit()
-
-    # 2. Clear all future posts
-    now = datetime.now()
-    future_schedules = (
-        db.query(Schedule)
-        .join(Video, Video.id == Schedule.video_id)
-        .filter(Video.influencer_id == influencer_id)
-        .filter(Schedule.run_at > now)
-        .all()
-    )
-    for schedule in future_schedules:
-        if schedule.job_id:
-            video_scheduler.cancel_schedule(schedule.job_id)
-        video_to_delete = db.query(Video).filter(Video.id == schedule.video_id).first()
-        db.delete(schedule)
-        if video_to_delete:
-            db.delete(video_to_delete)
+    old_story = influencer.life_story or ""
+    with llm_metrics.for_influencer(influencer.id):
+        updated_story = ai_generator.rewrite_life_story(
+            influencer.life_story, request.event_description, request.intensity
+        )
+        reset_life_story(influencer, updated_story)
     db.commit()
-    print(f"Cleared {len(future_schedules)} future posts for divine intervention.")
 
-    # 3. Trigger background task to regenerate content from the new story
+    # 2. Replace the future posts that no longer fit the new story in the background
     background_tasks.add_task(
-        plan_and_schedule_from_life_story, influencer.id, days_to_plan=30
+        replan_after_intervention,
+        influencer.id,
+        old_story,
+        request.event_description,
+        request.intensity,
+        days_to_plan=30,
     )
 
     return {"message": "The heavens have spoken. A new destiny is being written."}
@@ -9,14 +9,22 @@ from sqlalchemy import (
     JSON,
     Float,
     Enum,
+    Index,
     create_engine,
+    inspect,
+    text,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import os
 import enum
+import logging
 import pathlib
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -47,6 +55,8 @@ class Influencer(Base):
     face_image_url = Column(String(500), nullable=True)
     persona = Column(JSON, nullable=False)
     life_story = Column(Text, nullable=True)
+    # Rolling summary plus recent events backing a bounded life_story
+    life_story_memory = Column(JSON, nullable=True)
     mode = Column(Enum(InfluencerMode), nullable=False)
     audience_targeting = Column(JSON, nullable=True)
     growth_phase_enabled = Column(Boolean, default=True)
@@ -91,6 +101,11 @@ class Video(Base):
     scheduled_time = Column(DateTime, nullable=False)
     content_type = Column(String(20), default="post")  # post, story, reel
     generation_prompt = Column(JSON, nullable=True)
+    # The plan item the post was created from. Lazily planned posts have only
+    # this until their scene prompt and caption are generated near run time.
+    post_context = Column(Text, nullable=True)
+    # Set while a materialisation pass is generating the post's content.
+    materialize_claimed_until = Column(DateTime, nullable=True)
     video_url = Column(String(500), nullable=True)
     caption = Column(Text, nullable=True)
     hashtags = Column(JSON, nullable=True)
@@ -113,12 +128,21 @@ class Schedule(Base):
     run_at = Column(DateTime, nullable=False)
     is_active = Column(Boolean, default=True)
     job_id = Column(String(255), nullable=True)
+    # The process currently running this schedule and until when its claim
+    # holds; an expired lease may be claimed by another process.
+    lease_owner = Column(String(255), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     video = relationship("Video", back_populates="schedules")
 
 
+# Serves the polling dispatcher's "active and due" query.
+SCHEDULE_DUE_INDEX = Index("ix_schedules_is_active_run_at", Schedule.is_active, Schedule.run_at)
+
+
 class Sponsor(Base):
     __tablename__ = "sponsors"
 
@@ -159,10 +183,14 @@ _current_dir = pathlib.Path(__file__).parent
 _storage_dir = _current_dir.parent / "storage"
 _storage_dir.mkdir(exist_ok=True)
 
-# Construct the absolute path to the database file
-DATABASE_URL = f"sqlite:///{_storage_dir.joinpath('accounts.db')}"
+# Construct the absolute path to the database file, unless DATABASE_URL points
+# somewhere else (e.g. a throwaway database for load tests)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{_storage_dir.joinpath('accounts.db')}"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -174,7 +202,44 @@ def get_db():
         db.close()
 
 
+# Columns added to existing tables since their first release. create_all only
+# creates missing tables, so these are added to older databases at startup.
+ADDED_COLUMNS = [
+    Influencer.__table__.c.life_story_memory,
+    Video.__table__.c.post_context,
+    Video.__table__.c.materialize_claimed_until,
+    Schedule.__table__.c.lease_owner,
+    Schedule.__table__.c.lease_expires_at,
+    Schedule.__table__.c.attempts,
+]
+
+def add_missing_columns():
+    """Adds any of ADDED_COLUMNS the database lacks. Safe to run repeatedly."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for column in ADDED_COLUMNS:
+            table = column.table.name
+            if column.name in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            definition = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+            if not column.nullable:
+                # Existing rows need a value; only integer counters are added as NOT NULL.
+                definition += f" NOT NULL DEFAULT {column.default.arg}"
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {definition}"))
+            logger.info(f"Added column {table}.{column.name}")
+
+
+def init_db():
+    """Creates missing tables and adds missing columns. Safe to run repeatedly."""
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+
+# Run once per process, before the scheduler or any request opens a session,
+# whichever session factory it uses.
+init_db()
+
+
 def get_db_session():
     """Simple database session for direct use"""
-    Base.metadata.create_all(bind=engine)
     return SessionLocal()
@@ -1,32 +1,593 @@
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 import logging
-import json
+import threading
+import time
 from anthropic import Anthropic
 from dotenv import load_dotenv
+from api.schemas import (
+    ContentPlan,
+    GeneratedCaption,
+    GeneratedPost,
+    GeneratedPostBatch,
+    PlanReview,
+    VideoGenerationPrompt,
+)
+from managers.circuit_breaker import CircuitOpenError, circuit_breaker
+from managers.fake_llm import FakeAnthropic
+from managers.hedging import request_hedger
+from managers.llm_cache import llm_cache
+from managers.llm_metrics import LLMCall, llm_metrics
+from managers.model_router import model_router
+from managers.prompt_recorder import prompt_recorder
+from managers.rate_limiter import rate_limiter
+from managers.scene_dedup import DEDUP_RETRIES, SCENE_DEDUP_ENABLED, scene_deduplicator
+from managers.story_retrieval import estimate_tokens, story_retriever
+from managers.structured_output import StructuredOutput, StructuredOutputError
+from utils.json_stream import JsonArrayStream
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Output token ceiling for a single batched generation request, and the
+# starting guess for how many output tokens one post (scene + caption) takes.
+# The per-post estimate is refined from observed usage as batches complete.
+BATCH_MAX_OUTPUT_TOKENS = 8192
+INITIAL_TOKENS_PER_POST = 450
+
+# Scene prompts for influencers whose life story is longer than this only get
+# the story excerpts relevant to the post, up to the given budget.
+STORY_RETRIEVAL_MIN_TOKENS = int(os.getenv("AI_STORY_RETRIEVAL_MIN_TOKENS", "1500"))
+STORY_RETRIEVAL_TOKEN_BUDGET = int(os.getenv("AI_STORY_RETRIEVAL_TOKEN_BUDGET", "600"))
+
+# "anthropic" for the real API, or "fake" for the deterministic local stand-in
+# used for load testing (see managers/fake_llm.py).
+AI_BACKEND = os.getenv("AI_BACKEND", "anthropic").lower()
+
+# Per-request timeout. The SDK's default of 10 minutes lets a hung request
+# stall a whole plan before the circuit breaker or a fallback can step in; the
+# largest batched requests still need a few minutes.
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "300"))
+
+# Structured outputs. Every request that starts with the influencer prefix
+# offers the same tools (forcing a different one), so the cached prefix is
+# shared between planning and post generation.
+CONTENT_PLAN_OUTPUT = StructuredOutput(
+    "submit_content_plan",
+    "Submit the content plan. Each item is one planned post.",
+    ContentPlan,
+    items_field="items",
+)
+SCENE_PROMPT_OUTPUT = StructuredOutput(
+    "submit_scene_prompt",
+    "Submit the scene prompt for the video.",
+    VideoGenerationPrompt,
+)
+POST_OUTPUT = StructuredOutput(
+    "submit_post",
+    "Submit the scene prompt and caption for the post.",
+    GeneratedPost,
+)
+POST_BATCH_OUTPUT = StructuredOutput(
+    "submit_posts",
+    "Submit the posts, one per video concept.",
+    GeneratedPostBatch,
+    items_field="posts",
+)
+CAPTION_OUTPUT = StructuredOutput(
+    "submit_caption",
+    "Submit the caption and its hashtags.",
+    GeneratedCaption,
+)
+PLAN_REVIEW_OUTPUT = StructuredOutput(
+    "submit_plan_review",
+    "Submit whether each planned post is still consistent with the life story.",
+    PlanReview,
+    items_field="items",
+)
+INFLUENCER_TOOLSET = [
+    CONTENT_PLAN_OUTPUT,
+    SCENE_PROMPT_OUTPUT,
+    POST_OUTPUT,
+    POST_BATCH_OUTPUT,
+    PLAN_REVIEW_OUTPUT,
+]
+
 
 class AIContentGenerator:
     """AI content generator using Claude API for dynamic, context-aware content."""
 
     def __init__(self):
         api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
+        if AI_BACKEND == "fake":
+            self.client = FakeAnthropic()
+            logger.warning("Using the fake LLM backend; all AI content is synthetic.")
+        elif not api_key:
             logger.warning("ANTHROPIC_API_KEY not found. AI features will be limited.")
             self.client = None
         else:
-            self.client = Anthropic(api_key=api_key)
+            # Retries are handled by the shared rate limiter, which also backs
+            # off every other caller when the API reports throttling.
+            self.client = Anthropic(
+                api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT_SECONDS
+            )
             logger.info("Claude API initialized successfully")
 
+        self._cache_stats_lock = threading.Lock()
+        self.cache_stats: Dict[str, Dict[str, int]] = {}
+        # Shared by concurrent batches; guarded by its lock.
+        self._tokens_per_post = float(INITIAL_TOKENS_PER_POST)
+        self._tokens_per_post_lock = threading.Lock()
+        self.response_cache = llm_cache
+
+    def _create_message(self, method: str, **params) -> Any:
+        """
+        Sends a request to the Claude API and reports its prompt-cache usage.
+
+        If the request's model fails, the other models routed to the method's
+        task are tried in order.
+
+        For methods opted into the response cache, an identical earlier request
+        is answered from disk without calling the API. Responses are only
+        stored by `_cache_response`, once the caller has validated them.
+        """
+        call = llm_metrics.current()
+        prompt_recorder.record(method, params)
+        cache_key = None
+        if self.response_cache and self.response_cache.enabled_for(method):
+            cache_key = self.response_cache.key(params)
+            cached = self.response_cache.get(method, cache_key)
+            if cached is not None:
+                if call:
+                    call.response_cache_hit = True
+                return cached
+
+        models = model_router.chain(method, params.get("model"))
+        for attempt, model in enumerate(models):
+            try:
+                response, retries = self._send_request(
+                    {**params, "model": model}, call.influencer_id if call else None, method
+                )
+                break
+            except Exception as e:
+                if attempt == len(models) - 1 or not model_router.should_fall_back(e):
+                    raise
+                model_router.record_fallback(method, model, e)
+        usage = self._report_cache_usage(method, response)
+        if call:
+            call.add_usage(model, usage, retries)
+        return response
+
+    def _cache_response(self, method: str, params: Dict[str, Any], response: Any):
+        """Stores a validated response for methods opted into the response cache."""
+        if self.response_cache and self.response_cache.enabled_for(method):
+            self.response_cache.set(method, self.response_cache.key(params), response)
+
+    def _send_request(
+        self,
+        params: Dict[str, Any],
+        influencer_id: Optional[int] = None,
+        method: Optional[str] = None,
+    ) -> Tuple[Any, int]:
+        """
+        Sends one request through the shared rate limiter; returns (message, retries).
+
+        The model's circuit breaker is checked before every attempt, so an
+        outage fails fast instead of retrying. Requests of hedged methods may be
+        duplicated when slow (see RequestHedger).
+        """
+        model = params["model"]
+        estimated = rate_limiter.estimate_tokens(params)
+        circuit_breaker.check(model)
+        attempts = 0
+
+        def send():
+            nonlocal attempts
+            if attempts:
+                # A retry: stop if the circuit opened in the meantime.
+                circuit_breaker.check(model)
+            attempts += 1
+            try:
+                if request_hedger.enabled_for(method):
+                    response = request_hedger.run(
+                        method,
+                        lambda: self.client.messages.create(**params),
+                        lambda: rate_limiter.acquire(influencer_id, estimated),
+                    )
+                else:
+                    response = self.client.messages.create(**params)
+            except Exception as e:
+                circuit_breaker.record_failure(model, e)
+                raise
+            circuit_breaker.record_success(model)
+            return response
+
+        response, retries = rate_limiter.run(send, influencer_id, estimated)
+        rate_limiter.settle(estimated, _usage_tokens(response))
+        return response, retries
+
+    def _structured_call(
+        self, method: str, output: StructuredOutput, **params
+    ) -> Tuple[Any, Any]:
+        """
+        Sends a request answered through `output`'s tool and validates the answer.
+
+        Returns `(result, response)`, where `result` is the validated model, or
+        the list of valid items for list outputs. Whatever fails validation gets
+        one repair request carrying just the validation errors; list items that
+        are still invalid are dropped. Raises `StructuredOutputError` if no
+        valid output can be obtained.
+        """
+        response = self._create_message(method, **params)
+        tool_use = output.tool_use(response)
+        if tool_use is None:
+            llm_metrics.record_parse(0, 1)
+            raise StructuredOutputError(f"{method} response did not call {output.tool_name}")
+        # A truncated tool call is incomplete rather than wrong; there is nothing to repair.
+        can_repair = getattr(response, "stop_reason", None) != "max_tokens"
+
+        if output.items_field:
+            try:
+                valid, invalid = output.validate_items(tool_use.input)
+            except StructuredOutputError:
+                llm_metrics.record_parse(0, 1)
+                if can_repair:
+                    raise
+                # Truncated before the list was complete.
+                return [], response
+            if not invalid or not can_repair:
+                llm_metrics.record_parse(len(valid), len(invalid))
+                if not invalid:
+                    self._cache_response(method, params, response)
+                return valid, response
+            logger.warning(f"{method}: repairing {len(invalid)} invalid {output.items_field}")
+            repair = self._create_message(
+                method,
+                **{
+                    **params,
+                    "messages": output.repair_messages(
+                        params["messages"], tool_use, output.item_repair_prompt(invalid)
+                    ),
+                },
+            )
+            repaired_use = output.tool_use(repair)
+            repaired = []
+            if repaired_use is not None:
+                try:
+                    repaired, _ = output.validate_items(repaired_use.input)
+                except StructuredOutputError as e:
+                    logger.error(f"{method}: repair failed: {e}")
+            llm_metrics.record_parse(
+                len(valid) + len(repaired),
+                max(len(invalid) - len(repaired), 0),
+                len(repaired),
+                1,
+            )
+            return valid + repaired, response
+
+        try:
+            result = output.validate(tool_use.input)
+            llm_metrics.record_parse(1, 0)
+            self._cache_response(method, params, response)
+            return result, response
+        except StructuredOutputError as e:
+            if not can_repair:
+                llm_metrics.record_parse(0, 1)
+                raise
+            logger.warning(f"{method}: repairing invalid output: {e}")
+            problems = output.object_repair_prompt(str(e))
+
+        repair = self._create_message(
+            method,
+            **{**params, "messages": output.repair_messages(params["messages"], tool_use, problems)},
+        )
+        repaired_use = output.tool_use(repair)
+        try:
+            result = output.validate(repaired_use.input if repaired_use else tool_use.input)
+        except StructuredOutputError:
+            llm_metrics.record_parse(0, 1, 0, 1)
+            raise
+        llm_metrics.record_parse(1, 0, 1, 1)
+        return result, repair
+
+    def _stream_items(
+        self, method: str, output: StructuredOutput, call: Optional[LLMCall], **params
+    ) -> Iterator[Any]:
+        """
+        Streams a list output, yielding each valid item as soon as it is complete.
+
+        Items are parsed from the tool input as it streams, so downstream work
+        can start on the first item and a response cut off by max_tokens still
+        yields every item before the cut. Invalid items get one repair request
+        after the stream ends. The request is retried, and falls back along the
+        method's model chain, only until the first item arrives; later errors
+        are raised to the caller, which keeps the items it already has. Usage
+        and parse results are recorded on `call`, which is never made current
+        across a `yield`. A consumer that stops early still settles the breaker
+        and the rate limiter.
+
+        Like `_create_message`, methods opted into the response cache are
+        answered from an identical earlier request, and a stream is stored
+        once all of its items validated.
+        """
+        prompt_recorder.record(method, params)
+        if self.response_cache and self.response_cache.enabled_for(method):
+            cached = self.response_cache.get(method, self.response_cache.key(params))
+            if cached is not None:
+                items, _ = output.validate_items(output.tool_use(cached).input)
+                if call:
+                    call.response_cache_hit = True
+                    call.add_parse(len(items), 0)
+                yield from items
+                return
+
+        estimated = rate_limiter.estimate_tokens(params)
+        models = model_router.chain(method, params["model"])
+        parsed, invalid = 0, []
+        received = 0
+        fallback = attempt = 0
+        while True:
+            model = models[fallback]
+            try:
+                circuit_breaker.check(model)
+            except CircuitOpenError as e:
+                if fallback == len(models) - 1:
+                    raise
+                model_router.record_fallback(method, model, e)
+                fallback, attempt = fallback + 1, 0
+                continue
+            rate_limiter.acquire(call.influencer_id if call else None, estimated)
+            parser = JsonArrayStream(output.items_field)
+            try:
+                with self.client.messages.stream(**{**params, "model": model}) as stream:
+                    for event in stream:
+                        if event.type != "content_block_delta" or event.delta.type != "input_json_delta":
+                            continue
+                        received += len(event.delta.partial_json)
+                        for raw in parser.feed(event.delta.partial_json):
+                            try:
+                                item = output.validate_item(raw)
+                            except StructuredOutputError as e:
+                                invalid.append((raw, str(e)))
+                                continue
+                            parsed += 1
+                            yield item
+                    message = stream.get_final_message()
+                break
+            except GeneratorExit:
+                # The consumer stopped reading; the model was answering.
+                circuit_breaker.record_success(model)
+                rate_limiter.settle(estimated, _streamed_tokens(params, received))
+                if call:
+                    call.add_parse(parsed, len(invalid))
+                raise
+            except Exception as e:
+                circuit_breaker.record_failure(model, e)
+                # Once items have been yielded a retry would repeat them.
+                started = parsed or invalid
+                delay = None if started else rate_limiter.retry_delay(e, attempt)
+                if delay is None:
+                    if not started and fallback < len(models) - 1 and model_router.should_fall_back(e):
+                        model_router.record_fallback(method, model, e)
+                        fallback, attempt = fallback + 1, 0
+                        continue
+                    if call:
+                        call.add_parse(parsed, len(invalid))
+                    raise
+                time.sleep(delay)
+                attempt += 1
+        circuit_breaker.record_success(model)
+        rate_limiter.record_success()
+        rate_limiter.settle(estimated, _usage_tokens(message))
+        usage = self._report_cache_usage(method, message)
+        if call:
+            call.add_usage(model, usage, attempt)
+
+        if message.stop_reason == "max_tokens":
+            logger.warning(f"{method}: response truncated after {parsed} {output.items_field}")
+        tool_use = output.tool_use(message)
+        if not invalid or message.stop_reason == "max_tokens" or tool_use is None:
+            if call:
+                call.add_parse(parsed, len(invalid))
+            if not invalid and tool_use is not None:
+                self._cache_response(method, params, message)
+            return
+
+        logger.warning(f"{method}: repairing {len(invalid)} invalid {output.items_field}")
+        repaired = []
+        try:
+            with llm_metrics.active(call):
+                repair = self._create_message(
+                    method,
+                    **{
+                        **params,
+                        "model": model,
+                        "messages": output.repair_messages(
+                            params["messages"], tool_use, output.item_repair_prompt(invalid)
+                        ),
+                    },
+                )
+            repaired_use = output.tool_use(repair)
+            if repaired_use is not None:
+                repaired, _ = output.validate_items(repaired_use.input)
+        except Exception as e:
+            logger.error(f"{method}: repair failed: {e}")
+        if call:
+            call.add_parse(parsed + len(repaired), max(len(invalid) - len(repaired), 0), len(repaired), 1)
+        yield from repaired
+
+    def _report_cache_usage(self, method: str, response: Any) -> Dict[str, int]:
+        """Logs cache hit/miss for a single call and folds it into `cache_stats`."""
+        usage = getattr(response, "usage", None)
+        call_usage = {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        }
+        # Cache reads are billed at a tenth of the normal input price.
+        call_usage["tokens_saved"] = int(call_usage["cache_read_input_tokens"] * 0.9)
+        if call_usage["cache_read_input_tokens"]:
+            outcome = "hit"
+        elif call_usage["cache_creation_input_tokens"]:
+            outcome = "miss (written)"
+        else:
+            outcome = "not cached"
+        logger.info(
+            f"{method}: prompt cache {outcome}, "
+            f"{call_usage['cache_read_input_tokens']} cached / "
+            f"{call_usage['cache_creation_input_tokens']} cache-write / "
+            f"{call_usage['input_tokens']} uncached input tokens "
+            f"(~{call_usage['tokens_saved']} input tokens saved)"
+        )
+
+        with self._cache_stats_lock:
+            stats = self.cache_stats.setdefault(
+                method,
+                {"calls": 0, "hits": 0, "misses": 0, **{k: 0 for k in call_usage}},
+            )
+            stats["calls"] += 1
+            if call_usage["cache_read_input_tokens"]:
+                stats["hits"] += 1
+            elif call_usage["cache_creation_input_tokens"]:
+                stats["misses"] += 1
+            for key, value in call_usage.items():
+                stats[key] += value
+        return call_usage
+
+    def _influencer_system_prompt(
+        self,
+        influencer,
+        query: Optional[str] = None,
+        excerpt_budget: int = STORY_RETRIEVAL_TOKEN_BUDGET,
+    ) -> List[Dict[str, Any]]:
+        """
+        Builds the stable per-influencer prefix (life story and persona).
+
+        Planning and scene prompt calls for the same influencer all start with
+        this exact block, so it is marked for prompt caching and only the small
+        per-call instructions that follow it are billed as fresh input.
+
+        When a per-post `query` is given and the life story is long, only the
+        story excerpts relevant to it are included instead. The excerpts differ
+        per post, so they follow the cached profile block in a second block
+        after the cache breakpoint.
+        """
+        persona = influencer.persona or {}
+        audience = influencer.audience_targeting or {}
+        life_story = influencer.life_story or ""
+
+        intro = f"""You are part of the creative team behind a virtual influencer named **{influencer.name}**. Everything you write must be deeply consistent with the character profile and life story below."""
+        profile = f"""**Influencer Profile:**
+- **Background:** {persona.get("background", "")}
+- **Tone:** {persona.get("tone", "casual")}
+- **Core Goals:** {', '.join(persona.get("goals", []))}
+- **Target Audience Interests:** {', '.join(audience.get("interests", []) or [])}
+"""
+
+        if query is not None and estimate_tokens(life_story) > STORY_RETRIEVAL_MIN_TOKENS:
+            excerpts = story_retriever.relevant_excerpts(influencer, query, excerpt_budget)
+            excerpt_text = "\n\n".join(excerpts) or "No relevant excerpts."
+            return [
+                {
+                    "type": "text",
+                    "text": f"{intro}\n\n{profile}",
+                    "cache_control": {"type": "ephemeral"},
+                },
+                {
+                    "type": "text",
+                    "text": f"""**Relevant Excerpts From The Influencer's Life Story:**
+These passages of their backstory are the ones most relevant to this content. Treat them as the source of truth for their character, motivations, and the world they inhabit.
+---
+{excerpt_text}
+---""",
+                },
+            ]
+
+        story_section = f"""**Influencer's Life Story:**
+This is the overarching narrative and backstory for the influencer. Use this as the primary source of truth for their character, motivations, and the world they inhabit.
+---
+{life_story or "No life story provided."}
+---"""
+        text = f"""{intro}
+
+{story_section}
+
+{profile}"""
+        return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+    @llm_metrics.instrument("generate_life_story")
     def generate_life_story(self, name: str, persona: Dict[str, Any]) -> str:
         """Generates a comprehensive life story for a lifestyle influencer."""
         if not self.client:
             logger.warning("AI client not configured. Cannot generate life story.")
+            llm_metrics.mark_fallback()
             return "A life yet to be written."
 
+        try:
+            params = self.life_story_request(name, persona)
+            response = self._create_message("generate_life_story", **params)
+            life_story = response.content[0].text.strip()
+            if life_story:
+                self._cache_response("generate_life_story", params, response)
+            logger.info("Successfully generated life story.")
+            return life_story
+        except Exception as e:
+            logger.error(f"Failed to generate life story: {e}")
+            llm_metrics.mark_fallback()
+            return f"Error in generation: {e}"
+
+    def stream_life_story(self, name: str, persona: Dict[str, Any]) -> Iterator[str]:
+        """
+        Streams a life story (see `generate_life_story`) as text deltas.
+
+        API errors are raised to the caller, which decides what to keep of a
+        partially streamed story. A consumer that stops early still settles the
+        breaker and the rate limiter.
+        """
+        with llm_metrics.track_stream("generate_life_story") as call:
+            if not self.client:
+                logger.warning("AI client not configured. Cannot generate life story.")
+                call.fallback = True
+                yield "A life yet to be written."
+                return
+
+            params = self.life_story_request(name, persona)
+            estimated = rate_limiter.estimate_tokens(params)
+            attempt = 0
+            while True:
+                circuit_breaker.check(params["model"])
+                rate_limiter.acquire(call.influencer_id, estimated)
+                received = 0
+                try:
+                    with self.client.messages.stream(**params) as stream:
+                        for text in stream.text_stream:
+                            received += len(text)
+                            yield text
+                        message = stream.get_final_message()
+                    break
+                except GeneratorExit:
+                    # The consumer stopped reading; the model was answering.
+                    circuit_breaker.record_success(params["model"])
+                    rate_limiter.settle(estimated, _streamed_tokens(params, received))
+                    raise
+                except Exception as e:
+                    circuit_breaker.record_failure(params["model"], e)
+                    # Once text has been yielded a retry would repeat it.
+                    delay = None if received else rate_limiter.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+            circuit_breaker.record_success(params["model"])
+            rate_limiter.record_success()
+            rate_limiter.settle(estimated, _usage_tokens(message))
+            usage = self._report_cache_usage("generate_life_story", message)
+            call.add_usage(params["model"], usage, attempt)
+        logger.info("Successfully streamed life story.")
+
+    def life_story_request(self, name: str, persona: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the Messages API parameters for a new life story."""
         prompt = f"""You are a character designer and storyteller for social media. Your task is to create a deep and compelling character bio for a new virtual influencer named **{name}**. This bio should read less like a formal novel and more like the rich, messy, and authentic backstory of a real person who shares their life online.
 
 **Core Persona:**
@@ -43,20 +604,14 @@ class AIContentGenerator:
 
 **Output:** Return only the raw text of the story, with no titles or headers. It should be written as a compelling, multi-paragraph narrative that feels like the authentic, detailed "About Me" section of a personal blog.
 """
-        try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=3000,
-                temperature=0.9,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            life_story = response.content[0].text.strip()
-            logger.info("Successfully generated life story.")
-            return life_story
-        except Exception as e:
-            logger.error(f"Failed to generate life story: {e}")
-            return f"Error in generation: {e}"
+        return {
+            "model": model_router.model_for("life_story"),
+            "max_tokens": 3000,
+            "temperature": 0.9,
+            "messages": [{"role": "user", "content": prompt}],
+        }
 
+    @llm_metrics.instrument("rewrite_life_story")
     def rewrite_life_story(self, current_story: str, event: str, intensity: str) -> str:
         """
         Rewrites the life story by incorporating a new "divine intervention" event,
@@ -72,6 +627,7 @@ class AIContentGenerator:
         """
         if not self.client:
             logger.warning("AI client not configured. Cannot rewrite life story.")
+            llm_metrics.mark_fallback()
             return f"{current_story}\\n\\nA new event occurred: {event}"
 
         intensity_map = {
@@ -110,39 +666,117 @@ class AIContentGenerator:
 """
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=3000,
-                temperature=0.85,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            params = {
+                "model": model_router.model_for("rewrite"),
+                "max_tokens": 3000,
+                "temperature": 0.85,
+                "messages": [{"role": "user", "content": prompt}],
+            }
+            response = self._create_message("rewrite_life_story", **params)
             rewritten_story = response.content[0].text.strip()
+            if rewritten_story:
+                self._cache_response("rewrite_life_story", params, response)
             logger.info(f"Successfully rewrote life story with {intensity} intensity.")
             return rewritten_story
         except Exception as e:
             logger.error(f"Failed to rewrite life story: {e}")
+            llm_metrics.mark_fallback()
             # Fallback to appending to avoid losing the event info
             return f"{current_story}\\n\\n**A Fateful Intervention Occurred:** {event}"
 
-    def generate_reel_content_plan(
-        self, influencer, days_to_plan: int
-    ) -> List[Dict[str, Any]]:
-        """Generates a reel content plan based on the influencer's life story."""
+    @llm_metrics.instrument("condense_life_story")
+    def condense_life_story(
+        self, summary: str, events: List[str], token_budget: int
+    ) -> Optional[str]:
+        """
+        Folds older life events into the condensed life-story summary.
+
+        Returns the new summary, or None if the AI is unavailable so the caller
+        can fall back to trimming.
+        """
         if not self.client:
-            return []
-        persona = influencer.persona or {}
-        num_reels = max(2, int(days_to_plan / 4))
+            llm_metrics.mark_fallback()
+            return None
 
-        prompt = f"""You are a content strategist for an influencer. Based on their character bio, generate a plan for {num_reels} 'tent-pole' reels over the next {days_to_plan} days. These reels should feel like authentic, shareable moments, not chapters in a book.
+        word_budget = int(token_budget * 0.75)
+        events_text = "\n".join(f"- {event}" for event in events) or "- (none)"
+        prompt = f"""You maintain the running memory of a virtual influencer's life story. Fold the newer events below into the existing summary so that it remains a single, cohesive narrative.
 
-**Character Bio:**
+**Existing Summary:**
 ---
-{influencer.life_story or "No life story provided."}
+{summary or "No summary yet."}
 ---
 
-**Persona:**
-- **Background:** {persona.get("background", "")}
-- **Goals:** {', '.join(persona.get("goals", []))}
+**Events To Fold In (oldest first):**
+---
+{events_text}
+---
+
+**Output Requirements:**
+- Keep the defining backstory, relationships, motivations and ongoing projects; compress or drop minor, one-off details.
+- The events happened after everything in the summary; reflect how they changed the influencer's life.
+- Stay under {word_budget} words.
+- Return only the rewritten summary, with no titles, headers, or explanations.
+"""
+
+        try:
+            params = {
+                "model": model_router.model_for("rewrite"),
+                "max_tokens": max(256, int(token_budget * 1.2)),
+                "temperature": 0.3,
+                "messages": [{"role": "user", "content": prompt}],
+            }
+            response = self._create_message("condense_life_story", **params)
+            condensed = response.content[0].text.strip()
+            if condensed:
+                self._cache_response("condense_life_story", params, response)
+            logger.info(f"Condensed life story memory with {len(events)} events.")
+            return condensed or None
+        except Exception as e:
+            logger.error(f"Failed to condense life story: {e}")
+            llm_metrics.mark_fallback()
+            return None
+
+    def generate_reel_content_plan(
+        self, influencer, days_to_plan: int
+    ) -> List[Dict[str, Any]]:
+        """Generates a reel content plan based on the influencer's life story."""
+        return list(self.stream_reel_content_plan(influencer, days_to_plan))
+
+    def stream_reel_content_plan(self, influencer, days_to_plan: int) -> Iterator[Dict[str, Any]]:
+        """Streams the reel content plan, yielding each plan item as soon as it is complete."""
+        yield from self._stream_content_plan(
+            "generate_reel_content_plan",
+            influencer,
+            self.reel_plan_request(influencer, days_to_plan),
+        )
+
+    def _stream_content_plan(
+        self, method: str, influencer, params: Dict[str, Any]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streams a content plan request's items as dicts. Errors end the plan
+        early but keep the items streamed so far.
+        """
+        with llm_metrics.track_stream(method, influencer.id) as call:
+            if not self.client:
+                call.fallback = True
+                return
+            count = 0
+            try:
+                for item in self._stream_items(method, CONTENT_PLAN_OUTPUT, call, **params):
+                    count += 1
+                    yield item.model_dump()
+            except Exception as e:
+                logger.error(f"{method} failed after {count} plan items: {e}")
+            if not count:
+                call.fallback = True
+
+    def reel_plan_request(self, influencer, days_to_plan: int) -> Dict[str, Any]:
+        """Builds the Messages API parameters for a reel content plan."""
+        num_reels = max(2, int(days_to_plan / 4))
+
+        prompt = f"""You are a content strategist for this influencer. Based on their life story and profile above, generate a plan for {num_reels} 'tent-pole' reels over the next {days_to_plan} days. These reels should feel like authentic, shareable moments, not chapters in a book.
 
 **Instructions:**
 - Identify key themes or recent events from the bio that would make for a compelling and relatable video.
@@ -150,9 +784,9 @@ class AIContentGenerator:
 - The `post_context` should describe a specific, genuine moment someone would realistically share with their audience.
 - The posts should NOT be on consecutive days. Create a natural, sparse posting cadence.
 - Do NOT specify a time, only the day.
-- Return a clean JSON array.
+- Submit the plan by calling the `submit_content_plan` tool.
 
-**JSON Output Format:**
+**Example items:**
 [
   {{
     "day": 2,
@@ -166,39 +800,39 @@ class AIContentGenerator:
   }}
 ]
 """
-        try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1500,
-                temperature=0.8,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            content = response.content[0].text
-            start = content.find("[")
-            end = content.rfind("]") + 1
-            if start == -1 or end == 0:
-                return []
-            return json.loads(content[start:end])
-        except Exception as e:
-            logger.error(f"Failed to generate reel content plan: {e}")
-            return []
+        return {
+            "model": model_router.model_for("plan"),
+            "max_tokens": 1500,
+            "temperature": 0.8,
+            "system": self._influencer_system_prompt(influencer),
+            "messages": [{"role": "user", "content": prompt}],
+            **CONTENT_PLAN_OUTPUT.tool_params(INFLUENCER_TOOLSET),
+        }
 
     def generate_story_content_plan(
         self, influencer, reel_plan_summary: str, days_to_plan: int
     ) -> List[Dict[str, Any]]:
         """Generates a story content plan that is aware of the reel plan."""
-        if not self.client:
-            return []
-        persona = influencer.persona or {}
+        return list(self.stream_story_content_plan(influencer, reel_plan_summary, days_to_plan))
+
+    def stream_story_content_plan(
+        self, influencer, reel_plan_summary: str, days_to_plan: int
+    ) -> Iterator[Dict[str, Any]]:
+        """Streams the story content plan, yielding each plan item as soon as it is complete."""
+        yield from self._stream_content_plan(
+            "generate_story_content_plan",
+            influencer,
+            self.story_plan_request(influencer, reel_plan_summary, days_to_plan),
+        )
+
+    def story_plan_request(
+        self, influencer, reel_plan_summary: str, days_to_plan: int
+    ) -> Dict[str, Any]:
+        """Builds the Messages API parameters for a story content plan."""
         # Dynamically calculate a reasonable number of stories
         num_stories = max(4, int(days_to_plan / 2))
 
-        prompt = f"""You are a content strategist for an influencer. Based on their character bio and upcoming reels, generate a plan for {num_stories} casual stories over the next {days_to_plan} days. These stories should feel like spontaneous, in-the-moment updates.
-
-**Character Bio:**
----
-{influencer.life_story or "No life story provided."}
----
+        prompt = f"""You are a content strategist for this influencer. Based on their life story above and their upcoming reels, generate a plan for {num_stories} casual stories over the next {days_to_plan} days. These stories should feel like spontaneous, in-the-moment updates.
 
 **Upcoming Reels (for context):**
 ---
@@ -210,9 +844,9 @@ class AIContentGenerator:
 - For each story, specify the day (from 1 to {days_to_plan}) and a `post_context`.
 - The posting schedule should be sparse and feel natural, not daily.
 - Do NOT specify a time, only the day.
-- Return a clean JSON array.
+- Submit the plan by calling the `submit_content_plan` tool.
 
-**JSON Output Format:**
+**Example items:**
 [
   {{
     "day": 1,
@@ -225,24 +859,139 @@ class AIContentGenerator:
     "post_context": "A 'work-in-progress' story showing a messy desk and a glimpse of the project being finalized for the reel on day 6."
   }}
 ]
+"""
+        return {
+            "model": model_router.model_for("plan"),
+            "max_tokens": 2000,
+            "temperature": 0.85,
+            "system": self._influencer_system_prompt(influencer),
+            "messages": [{"role": "user", "content": prompt}],
+            **CONTENT_PLAN_OUTPUT.tool_params(INFLUENCER_TOOLSET),
+        }
+
+    @llm_metrics.instrument("review_content_plan")
+    def review_content_plan(
+        self,
+        influencer,
+        story_changes: str,
+        event: str,
+        items: List[Dict[str, Any]],
+    ) -> Optional[List[int]]:
+        """
+        Asks which planned posts no longer fit a rewritten life story.
+
+        `items` are dicts with `id`, `day`, `content_type` and `post_context`.
+        Returns the ids of inconsistent items, or None when the review could not
+        be completed (the caller should then replan everything).
+        """
+        if not self.client:
+            llm_metrics.mark_fallback()
+            return None
+
+        planned = "\n".join(
+            f"- id {item['id']}, day {item['day']} ({item['content_type']}): {item['post_context']}"
+            for item in items
+        )
+        prompt = f"""You are a content strategist for this influencer. Their life story above has just been rewritten because of this event:
+---
+{event}
+---
+
+**What changed in the life story:**
+---
+{story_changes}
+---
+
+**Already planned posts:**
+{planned}
+
+**Instructions:**
+- For every planned post, decide whether it is still consistent with the rewritten life story.
+- A post is inconsistent only if it contradicts the changes, or ignores them where the audience would clearly expect them to show. Posts about unrelated everyday moments stay consistent.
+- Review every id exactly once.
+- Submit the review by calling the `submit_plan_review` tool.
+"""
+        try:
+            reviews, _ = self._structured_call(
+                "review_content_plan",
+                PLAN_REVIEW_OUTPUT,
+                model=model_router.model_for("plan"),
+                max_tokens=min(BATCH_MAX_OUTPUT_TOKENS, 200 + 30 * len(items)),
+                temperature=0.2,
+                system=self._influencer_system_prompt(influencer),
+                messages=[{"role": "user", "content": prompt}],
+                **PLAN_REVIEW_OUTPUT.tool_params(INFLUENCER_TOOLSET),
+            )
+        except Exception as e:
+            logger.error(f"Failed to review content plan: {e}")
+            llm_metrics.mark_fallback()
+            return None
+
+        reviewed = {review.id: review.consistent for review in reviews}
+        if any(item["id"] not in reviewed for item in items):
+            logger.error("Content plan review did not cover every planned post")
+            llm_metrics.mark_fallback()
+            return None
+        return [item["id"] for item in items if not reviewed[item["id"]]]
+
+    @llm_metrics.instrument("generate_replacement_plan")
+    def generate_replacement_plan(
+        self, influencer, days: List[int], kept_plan_summary: str, event: str
+    ) -> List[Dict[str, Any]]:
+        """Plans new posts for the given days, around the posts that were kept."""
+        if not self.client or not days:
+            llm_metrics.mark_fallback()
+            return []
+
+        prompt = f"""You are a content strategist for this influencer. Their life story above has just been rewritten because of this event:
+---
+{event}
+---
+
+Some of their planned posts no longer fit the new story and were removed. Plan replacement posts for these days: {', '.join(str(day) for day in days)}.
+
+**Posts that are still planned (for context, do not repeat them):**
+---
+{kept_plan_summary or "None."}
+---
+
+**Instructions:**
+- Plan one post for each listed day, and only for those days.
+- Use `reel` for tent-pole moments that reflect the changes in the story and `story` for casual, in-the-moment updates.
+- Each `post_context` should describe a specific, genuine moment someone would realistically share with their audience.
+- Submit the plan by calling the `submit_content_plan` tool.
 """
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=2000,
+            items, _ = self._structured_call(
+                "generate_replacement_plan",
+                CONTENT_PLAN_OUTPUT,
+                model=model_router.model_for("plan"),
+                max_tokens=min(BATCH_MAX_OUTPUT_TOKENS, 300 + 150 * len(days)),
                 temperature=0.85,
+                system=self._influencer_system_prompt(influencer),
                 messages=[{"role": "user", "content": prompt}],
+                **CONTENT_PLAN_OUTPUT.tool_params(INFLUENCER_TOOLSET),
             )
-            content = response.content[0].text
-            start = content.find("[")
-            end = content.rfind("]") + 1
-            if start == -1 or end == 0:
-                return []
-            return json.loads(content[start:end])
         except Exception as e:
-            logger.error(f"Failed to generate story content plan: {e}")
+            logger.error(f"Failed to generate replacement plan: {e}")
+            llm_metrics.mark_fallback()
             return []
 
+        wanted = set(days)
+        plan = [item.model_dump() for item in items if item.day in wanted]
+        if not plan:
+            llm_metrics.mark_fallback()
+        return plan
+
+    def parse_content_plan(self, response: Any) -> List[Dict[str, Any]]:
+        """Validated plan items from a content plan response, without repair (e.g. batch results)."""
+        tool_use = CONTENT_PLAN_OUTPUT.tool_use(response)
+        items, invalid = CONTENT_PLAN_OUTPUT.validate_items(tool_use.input if tool_use else None)
+        if invalid:
+            logger.warning(f"Dropped {len(invalid)} invalid content plan items: {invalid}")
+        return [item.model_dump() for item in items]
+
+    @llm_metrics.instrument("generate_scene_prompt")
     def generate_scene_prompt(
         self,
         influencer,
@@ -255,34 +1004,7 @@ class AIContentGenerator:
             logger.error("Claude API not configured")
             return self._fallback_prompt(context)
 
-        persona = influencer.persona or {}
-        audience = influencer.audience_targeting or {}
-
-        background = persona.get("background", "")
-        tone = persona.get("tone", "casual")
-        goals = persona.get("goals", [])
-        audience_interests = audience.get("interests", [])
-        life_story = influencer.life_story or ""
-
-        life_story_prompt = ""
-        if life_story:
-            life_story_prompt = f"""
-**Influencer's Life Story:**
-This is the overarching narrative and backstory for the influencer. Use this as the primary source of truth for their character, motivations, and the world they inhabit.
----
-{life_story}
----
-"""
-
-        prompt = f"""You are a creative director for a virtual influencer. Your task is to generate a scene prompt for a short video. The prompt must be deeply consistent with the influencer's established profile and life story.
-
-{life_story_prompt}
-
-**Influencer Profile:**
-- **Background:** {background}
-- **Tone:** {tone}
-- **Core Goals:** {', '.join(goals)}
-- **Target Audience Interests:** {', '.join(audience_interests)}
+        prompt = f"""You are the creative director for this influencer. Your task is to generate a scene prompt for a short video. The prompt must be deeply consistent with the influencer's established profile and life story above.
 
 **Video Concept:**
 {context if context else 'A typical day-in-the-life moment that aligns with the life story.'}
@@ -292,56 +1014,31 @@ This is the overarching narrative and backstory for the influencer. Use this as
 1.  **`description` (Third-Person):** Write a detailed, third-person narrative of the scene. Describe the environment, the character's appearance, their specific actions, and any dialogue they speak out loud. This is the objective view of the scene.
 2.  **`intention` (First-Person):** Write a short, first-person internal monologue. This should reveal the character's inner thoughts, feelings, motivations, or what they are about to do. This is their subjective, internal state.
 
-**JSON Output Format:**
-Provide the output as a clean JSON object with no extra text or explanations.
-{{
-  "description": "A third-person narrative of the scene (environment, actions, dialogue).",
-  "intention": "A first-person internal monologue (thoughts, feelings, motivation)."
-}}
+Submit the scene prompt by calling the `submit_scene_prompt` tool.
 """
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
+            scene, _ = self._structured_call(
+                "generate_scene_prompt",
+                SCENE_PROMPT_OUTPUT,
+                model=model_router.model_for("scene_prompt"),
                 max_tokens=1000,
                 temperature=0.95,
+                system=self._influencer_system_prompt(influencer, query=context or ""),
                 messages=[{"role": "user", "content": prompt}],
+                **SCENE_PROMPT_OUTPUT.tool_params(INFLUENCER_TOOLSET),
             )
+            logger.info("Generated scene prompt with Claude API")
+            return scene.model_dump()
 
-            content = response.content[0].text
-            try:
-                # Robust JSON extraction
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                if start == -1 or end == 0:
-                    logger.error(
-                        f"Failed to find JSON object in Claude response. Raw response: {content}"
-                    )
-                    return self._fallback_prompt(context)
-
-                json_str = content[start:end]
-                prompt_data = json.loads(json_str)
-
-                logger.info("Generated scene prompt with Claude API")
-                return {
-                    "description": prompt_data.get(
-                        "description", "No description generated."
-                    ),
-                    "intention": prompt_data.get(
-                        "intention", "No intention generated."
-                    ),
-                }
-
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.error(
-                    f"Failed to parse Claude response for scene prompt: {e}. Raw response: {content}"
-                )
-                return self._fallback_prompt(context)
-
+        except StructuredOutputError as e:
+            logger.error(f"Invalid scene prompt from Claude: {e}")
+            return self._fallback_prompt(context)
         except Exception as e:
             logger.error(f"Claude API error during scene prompt generation: {e}")
             return self._fallback_prompt(context)
 
+    @llm_metrics.instrument("generate_caption")
     def generate_caption(
         self, prompt_data: Dict[str, Any], hashtags: Optional[List[str]] = None
     ) -> str:
@@ -355,37 +1052,21 @@ Provide the output as a clean JSON object with no extra text or explanations.
 
 The post is about: "{description}"
 
-The caption should be 1-3 sentences and include 3-5 relevant hashtags. Format as JSON with "caption" and "hashtags" keys.
-Example:
-{{
-  "caption": "Your awesome caption here!",
-  "hashtags": ["#example", "#ai", "#content"]
-}}
+The caption should be 1-3 sentences and include 3-5 relevant hashtags. Submit it by calling the `submit_caption` tool.
 """
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=200,
+            caption_data, _ = self._structured_call(
+                "generate_caption",
+                CAPTION_OUTPUT,
+                model=model_router.model_for("caption"),
+                max_tokens=300,
                 temperature=0.75,
                 messages=[{"role": "user", "content": prompt}],
+                **CAPTION_OUTPUT.tool_params(),
+            )
+            full_caption = self._format_caption(
+                caption_data.caption, caption_data.hashtags, hashtags
             )
-            content = response.content[0].text
-            start = content.find("{")
-            end = content.rfind("}") + 1
-            json_str = content[start:end]
-            caption_data = json.loads(json_str)
-
-            caption = caption_data.get("caption", description)
-            generated_hashtags = caption_data.get("hashtags", [])
-
-            all_hashtags = []
-            if hashtags:
-                all_hashtags.extend(hashtags)
-            all_hashtags.extend(generated_hashtags)
-
-            final_hashtags = " ".join(all_hashtags)
-
-            full_caption = f"{caption} {final_hashtags}".strip()
             logger.info("Generated caption with Claude API")
             return full_caption
 
@@ -393,8 +1074,333 @@ Example:
             logger.error(f"Caption generation error: {e}")
             return self._simple_caption(prompt_data, hashtags)
 
+    @llm_metrics.instrument("generate_post_content")
+    def generate_post_content(
+        self,
+        influencer,
+        context: Optional[str] = None,
+        sponsor_info: Optional[Dict[str, Any]] = None,
+        hashtags: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Generates the scene prompt and its caption in a single call.
+
+        Equivalent to `generate_scene_prompt` followed by `generate_caption`,
+        but with one round trip instead of two. Returns `(prompt_data, caption)`
+        and falls back to `_fallback_prompt` / `_simple_caption` per field.
+        Scenes that nearly duplicate one of the influencer's recent scenes are
+        regenerated (see `_deduplicate_scene`).
+        """
+        if not self.client:
+            logger.error("Claude API not configured")
+            prompt_data = self._fallback_prompt(context)
+            return prompt_data, self._simple_caption(prompt_data, hashtags)
+
+        post = self._request_post_content(influencer, context, sponsor_info, hashtags)
+        return self._deduplicate_scene(influencer, post, context, sponsor_info, hashtags)
+
+    def _request_post_content(
+        self,
+        influencer,
+        context: Optional[str] = None,
+        sponsor_info: Optional[Dict[str, Any]] = None,
+        hashtags: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        try:
+            post, _ = self._structured_call(
+                "generate_post_content",
+                POST_OUTPUT,
+                **self.post_content_request(influencer, context, sponsor_info),
+            )
+            post_data = post.model_dump()
+        except StructuredOutputError as e:
+            # Salvage whichever fields were valid; the rest fall back below.
+            logger.error(f"Invalid post content from Claude: {e}")
+            post_data = e.data
+        except Exception as e:
+            logger.error(f"Claude API error during post content generation: {e}")
+            prompt_data = self._fallback_prompt(context)
+            return prompt_data, self._simple_caption(prompt_data, hashtags)
+
+        return self._post_content(post_data, context, hashtags)
+
+    def _deduplicate_scene(
+        self,
+        influencer,
+        post: Tuple[Dict[str, Any], str],
+        context: Optional[str] = None,
+        sponsor_info: Optional[Dict[str, Any]] = None,
+        hashtags: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Regenerates a post whose scene nearly duplicates one of the influencer's
+        recent scenes, asking for a different setting and moment, up to
+        AI_SCENE_DEDUP_RETRIES times. The accepted scene joins the index.
+        """
+        if not SCENE_DEDUP_ENABLED:
+            return post
+        for attempt in range(DEDUP_RETRIES + 1):
+            description = post[0].get("description", "")
+            # The scene joins the index in the same step, unless it is a
+            # duplicate that will be regenerated.
+            similar = scene_deduplicator.check_and_add(
+                influencer.id, description, keep_duplicate=attempt == DEDUP_RETRIES
+            )
+            if similar is None:
+                if attempt:
+                    scene_deduplicator.record("regenerated")
+                break
+            if attempt == DEDUP_RETRIES:
+                logger.warning(
+                    f"Keeping a scene for influencer {influencer.id} that is {similar[0]:.0%} similar to a recent one"
+                )
+                scene_deduplicator.record("kept_duplicates")
+                break
+            logger.info(
+                f"Scene for influencer {influencer.id} is {similar[0]:.0%} similar to a recent one; regenerating"
+            )
+            diversified = (
+                f"{context or 'A typical day-in-the-life moment that aligns with the life story.'}\n\n"
+                "The influencer recently posted the scene below. This one must show a clearly "
+                "different setting, activity and moment:\n"
+                f"\"{similar[1][:400]}\""
+            )
+            post = self._request_post_content(influencer, diversified, sponsor_info, hashtags)
+        return post
+
+    def post_content_request(
+        self,
+        influencer,
+        context: Optional[str] = None,
+        sponsor_info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Builds the Messages API parameters for a fused scene prompt and caption."""
+        prompt = f"""You are the creative director and social media manager for this influencer. Your task is to generate a scene prompt for a short video together with the caption it will be posted with. Both must be deeply consistent with the influencer's established profile and life story above.
+
+**Video Concept:**
+{context if context else 'A typical day-in-the-life moment that aligns with the life story.'}
+{f"This video is sponsored by {sponsor_info.get('company_name')}. The sponsorship should be subtly reflected in the intention or description." if sponsor_info else ""}
+
+**Instructions:**
+1.  **`description` (Third-Person):** Write a detailed, third-person narrative of the scene. Describe the environment, the character's appearance, their specific actions, and any dialogue they speak out loud. This is the objective view of the scene.
+2.  **`intention` (First-Person):** Write a short, first-person internal monologue. This should reveal the character's inner thoughts, feelings, motivations, or what they are about to do. This is their subjective, internal state.
+3.  **`caption`:** A short, engaging social media caption for the post, 1-3 sentences, written in the influencer's voice.
+4.  **`hashtags`:** 3-5 relevant hashtags for the post.
+
+Submit the post by calling the `submit_post` tool.
+"""
+
+        return {
+            "model": model_router.model_for("scene_prompt"),
+            "max_tokens": 1200,
+            "temperature": 0.95,
+            "system": self._influencer_system_prompt(influencer, query=context or ""),
+            "messages": [{"role": "user", "content": prompt}],
+            **POST_OUTPUT.tool_params(INFLUENCER_TOOLSET),
+        }
+
+    def parse_post_content(
+        self,
+        response: Any,
+        context: Optional[str] = None,
+        hashtags: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Parses a fused post response without repair (e.g. a batch result)."""
+        tool_use = POST_OUTPUT.tool_use(response)
+        post_data = tool_use.input if tool_use else None
+        try:
+            post_data = POST_OUTPUT.validate(post_data).model_dump()
+        except StructuredOutputError as e:
+            logger.error(f"Invalid post content from Claude: {e}")
+        return self._post_content(post_data, context, hashtags)
+
+    def _post_content(
+        self,
+        post_data: Any,
+        context: Optional[str] = None,
+        hashtags: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Builds `(prompt_data, caption)` from post fields, falling back per missing field."""
+        if not isinstance(post_data, dict):
+            prompt_data = self._fallback_prompt(context)
+            return prompt_data, self._simple_caption(prompt_data, hashtags)
+
+        if not post_data.get("description"):
+            prompt_data = self._fallback_prompt(context)
+        else:
+            prompt_data = {
+                "description": post_data["description"],
+                "intention": post_data.get("intention", "No intention generated."),
+            }
+
+        if post_data.get("caption"):
+            generated_hashtags = post_data.get("hashtags")
+            caption = self._format_caption(
+                post_data["caption"],
+                generated_hashtags if isinstance(generated_hashtags, list) else [],
+                hashtags,
+            )
+        else:
+            caption = self._simple_caption(prompt_data, hashtags)
+
+        logger.info("Generated scene prompt and caption with Claude API")
+        return prompt_data, caption
+
+    @llm_metrics.instrument("generate_post_content_batch")
+    def generate_post_content_batch(
+        self,
+        influencer,
+        contexts: List[Optional[str]],
+        hashtags: Optional[List[str]] = None,
+    ) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        Generates scene prompts and captions for many posts of one influencer.
+
+        Posts are packed into as few requests as the output token limit allows,
+        all sharing the cached influencer prefix. When a chunk is cut off by the
+        output limit, the posts that parsed are kept and the rest go into the
+        next, smaller chunk. Items that come back missing or malformed are
+        retried individually through `generate_post_content`. Results are
+        returned in the same order as `contexts`.
+        """
+        if not self.client:
+            return [
+                self.generate_post_content(influencer, context, hashtags=hashtags)
+                for context in contexts
+            ]
+
+        results: List[Optional[Tuple[Dict[str, Any], str]]] = [None] * len(contexts)
+        pending = list(range(len(contexts)))
+        while pending:
+            chunk = pending[:self._batch_chunk_size()]
+            parsed, truncated = self._generate_post_chunk(influencer, chunk, contexts, hashtags)
+            for index, result in parsed.items():
+                results[index] = result
+            pending = pending[len(chunk):]
+            if truncated and parsed:
+                # Only the posts after the cut are requested again.
+                pending = [index for index in chunk if index not in parsed] + pending
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            logger.warning(
+                f"Retrying {len(missing)} of {len(contexts)} batched posts individually"
+            )
+        for index in missing:
+            results[index] = self._request_post_content(
+                influencer, contexts[index], hashtags=hashtags
+            )
+        # In plan order, so near-duplicates within the batch are caught too.
+        return [
+            self._deduplicate_scene(influencer, result, context, hashtags=hashtags)
+            for result, context in zip(results, contexts)
+        ]
+
+    def _batch_chunk_size(self) -> int:
+        """How many posts fit in one batched request given the output token limit."""
+        # Leave headroom for the array syntax and per-item index fields.
+        budget = BATCH_MAX_OUTPUT_TOKENS * 0.85
+        with self._tokens_per_post_lock:
+            tokens_per_post = self._tokens_per_post
+        return max(1, int(budget // max(tokens_per_post, 1.0)))
+
+    def _generate_post_chunk(
+        self,
+        influencer,
+        indices: List[int],
+        contexts: List[Optional[str]],
+        hashtags: Optional[List[str]],
+    ) -> Tuple[Dict[int, Tuple[Dict[str, Any], str]], bool]:
+        """
+        Generates one chunk of a batch. Returns the items that parsed cleanly,
+        by index, and whether the response was cut off by the output limit.
+        """
+        concepts = "\n".join(
+            f"{position}. {contexts[index] or 'A typical day-in-the-life moment that aligns with the life story.'}"
+            for position, index in enumerate(indices)
+        )
+        prompt = f"""You are the creative director and social media manager for this influencer. Your task is to generate {len(indices)} separate short-video posts, each with a scene prompt and the caption it will be posted with. Every post must be deeply consistent with the influencer's established profile and life story above.
+
+**Video Concepts (one post per line, numbered by index):**
+{concepts}
+
+**Instructions:**
+For each concept, produce one object with:
+1.  **`index`:** The number of the concept it answers.
+2.  **`description` (Third-Person):** A detailed, third-person narrative of the scene: environment, the character's appearance, their specific actions, and any dialogue they speak out loud.
+3.  **`intention` (First-Person):** A short, first-person internal monologue revealing the character's thoughts, feelings or motivation.
+4.  **`caption`:** A short, engaging social media caption, 1-3 sentences, in the influencer's voice.
+5.  **`hashtags`:** 3-5 relevant hashtags.
+
+Even when concepts are similar, every post must depict a distinct scene, setting and moment.
+
+Submit all {len(indices)} posts in a single call to the `submit_posts` tool.
+"""
+        try:
+            items, response = self._structured_call(
+                "generate_post_content_batch",
+                POST_BATCH_OUTPUT,
+                model=model_router.model_for("scene_prompt"),
+                max_tokens=BATCH_MAX_OUTPUT_TOKENS,
+                temperature=0.95,
+                system=self._influencer_system_prompt(
+                    influencer,
+                    query=" ".join(contexts[index] or "" for index in indices),
+                    excerpt_budget=STORY_RETRIEVAL_TOKEN_BUDGET * min(len(indices), 4),
+                ),
+                messages=[{"role": "user", "content": prompt}],
+                **POST_BATCH_OUTPUT.tool_params(INFLUENCER_TOOLSET),
+            )
+        except Exception as e:
+            logger.error(f"Claude API error during batched post generation: {e}")
+            return {}, False
+
+        truncated = getattr(response, "stop_reason", None) == "max_tokens"
+        if truncated:
+            # The chunk did not fit; make the following chunks smaller.
+            with self._tokens_per_post_lock:
+                self._tokens_per_post *= 1.5
+            logger.warning(
+                f"Batched post generation hit the output limit with {len(indices)} posts"
+            )
+
+        parsed: Dict[int, Tuple[Dict[str, Any], str]] = {}
+        for item in items:
+            if not item.index < len(indices):
+                continue
+            prompt_data = {"description": item.description, "intention": item.intention}
+            parsed[indices[item.index]] = (
+                prompt_data,
+                self._format_caption(item.caption, item.hashtags, hashtags),
+            )
+
+        output_tokens = getattr(getattr(response, "usage", None), "output_tokens", 0)
+        if parsed and output_tokens:
+            # Exponential moving average so the chunk size tracks real output lengths.
+            observed = output_tokens / len(parsed)
+            with self._tokens_per_post_lock:
+                self._tokens_per_post = 0.7 * self._tokens_per_post + 0.3 * observed
+
+        logger.info(
+            f"Generated {len(parsed)}/{len(indices)} batched posts with Claude API"
+        )
+        return parsed, truncated
+
+    def _format_caption(
+        self,
+        caption: str,
+        generated_hashtags: List[str],
+        hashtags: Optional[List[str]] = None,
+    ) -> str:
+        all_hashtags = []
+        if hashtags:
+            all_hashtags.extend(hashtags)
+        all_hashtags.extend(generated_hashtags or [])
+        return f"{caption} {' '.join(all_hashtags)}".strip()
+
     def _fallback_prompt(self, context: Optional[str]) -> Dict[str, str]:
         logger.warning("Using fallback prompt generator")
+        llm_metrics.mark_fallback()
         return {
             "description": context or "A default video scene.",
             "intention": "I need to make this interesting.",
@@ -404,6 +1410,7 @@ Example:
         self, prompt_data: Dict[str, Any], hashtags: Optional[List[str]]
     ) -> str:
         logger.warning("Using simple caption generator")
+        llm_metrics.mark_fallback()
         caption_text = prompt_data.get("description", "Cool new video!")
         if hashtags:
             hashtag_str = " ".join(hashtags)
@@ -411,4 +1418,23 @@ Example:
         return caption_text
 
 
+def _streamed_tokens(params: Dict[str, Any], streamed_chars: int) -> int:
+    """Rough tokens used by a stream stopped early: its prompt plus the output so far."""
+    return rate_limiter.estimate_tokens({**params, "max_tokens": 0}) + streamed_chars // 4
+
+
+def _usage_tokens(response: Any) -> int:
+    """Tokens a response counted against the per-minute token limit."""
+    usage = getattr(response, "usage", None)
+    return sum(
+        getattr(usage, field, 0) or 0
+        for field in (
+            "input_tokens",
+            "output_tokens",
+            "cache_read_input_tokens",
+            "cache_creation_input_tokens",
+        )
+    )
+
+
 ai_generator = AIContentGenerator()
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from anthropic import APIConnectionError, APIStatusError
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# A model's circuit opens after this many consecutive failed requests. While
+# open, requests to it fail immediately; after the reset timeout one probe
+# request is let through, and its outcome closes or re-opens the circuit.
+FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))
+RESET_TIMEOUT_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+
+# Failures that say the provider is degraded. Throttling (429) is the rate
+# limiter's business, and 4xx errors are problems with the request itself.
+BREAKER_STATUSES = {500, 502, 503, 504, 529}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a model whose circuit is open."""
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"Circuit for {model} is open; retrying in {retry_in:.0f}s")
+        self.model = model
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker for model API requests.
+
+    Consecutive provider failures open a model's circuit so callers fail fast
+    into their fallbacks (the next model, or a template) instead of each
+    waiting out timeouts and retries against a degraded API.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._circuits: Dict[str, _Circuit] = {}
+
+    @staticmethod
+    def is_failure(error: Exception) -> bool:
+        if isinstance(error, APIStatusError):
+            return error.status_code in BREAKER_STATUSES
+        return isinstance(error, APIConnectionError)
+
+    def is_open(self, model: str) -> bool:
+        """Whether requests to `model` would currently be rejected (without claiming a probe)."""
+        with self._lock:
+            circuit = self._circuits.get(model)
+            if circuit is None or circuit.state == CLOSED:
+                return False
+            if circuit.state == OPEN:
+                return time.monotonic() - circuit.opened_at < self.reset_timeout
+            return circuit.probing
+
+    def check(self, model: str):
+        """Raises `CircuitOpenError` unless a request to `model` may be sent now."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            circuit = self._circuits.setdefault(model, _Circuit())
+            if circuit.state == CLOSED:
+                return
+            waited = time.monotonic() - circuit.opened_at
+            if circuit.state == OPEN and waited >= self.reset_timeout:
+                circuit.state = HALF_OPEN
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                logger.info(f"Probing {model} after {waited:.0f}s with its circuit open")
+                return
+            circuit.rejected += 1
+            raise CircuitOpenError(model, max(0.0, self.reset_timeout - waited))
+
+    def record_success(self, model: str):
+        with self._lock:
+            circuit = self._circuits.get(model)
+            if circuit is None:
+                return
+            if circuit.state != CLOSED:
+                logger.info(f"Circuit for {model} closed; the API is responding again")
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.probing = False
+
+    def record_failure(self, model: str, error: Exception):
+        """Counts `error` against `model` if it indicates a degraded provider."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            circuit = self._circuits.setdefault(model, _Circuit())
+            if not self.is_failure(error):
+                # The provider answered; only a failed probe keeps the circuit open.
+                circuit.probing = False
+                return
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or circuit.failures >= self.failure_threshold:
+                if circuit.state == CLOSED:
+                    circuit.opened += 1
+                    logger.warning(
+                        f"Circuit for {model} opened after {circuit.failures} consecutive failures ({error})"
+                    )
+                circuit.state = OPEN
+                circuit.opened_at = time.monotonic()
+                circuit.probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                model: {
+                    "state": circuit.state,
+                    "consecutive_failures": circuit.failures,
+                    "times_opened": circuit.opened,
+                    "rejected": circuit.rejected,
+                }
+                for model, circuit in self._circuits.items()
+            }
+
+
+circuit_breaker = CircuitBreaker()
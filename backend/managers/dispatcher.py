@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from database.models import SCHEDULE_DUE_INDEX, Video, engine, get_db_session
+from managers.execution_pool import AccountExecutionPool
+from managers.llm_metrics import percentiles
+from managers.schedule_leases import ScheduleLeases
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# How often due schedules are polled for and how many are claimed per query.
+# A full batch triggers the next poll right away, so a backlog drains at
+# worker speed rather than one batch per interval.
+POLL_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_POLL_INTERVAL_SECONDS", "5"))
+DISPATCH_BATCH_SIZE = int(os.getenv("SCHEDULER_DISPATCH_BATCH_SIZE", "100"))
+
+# Dispatch lag samples kept for the percentiles.
+LAG_WINDOW = 1000
+
+
+class PollingDispatcher:
+    """
+    Runs due schedules by polling the `schedules` table instead of keeping one
+    APScheduler job per post.
+
+    Each poll leases up to a batch of active, due rows with a single
+    `UPDATE ... RETURNING` on the `(is_active, run_at)` index and hands them
+    to the execution pool under their influencer's account. Because claims
+    are leases, any number of processes can poll the same database. Nothing
+    is held in memory for posts that are not due yet, so memory use does not
+    depend on how far ahead posts are planned.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[int], Any],
+        pool: AccountExecutionPool,
+        leases: ScheduleLeases,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        batch_size: int = DISPATCH_BATCH_SIZE,
+        misfire_skip_after: Optional[timedelta] = None,
+    ):
+        self.process = process
+        self.pool = pool
+        self.leases = leases
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        # Rows due longer ago than this are released as done without running.
+        self.misfire_skip_after = misfire_skip_after
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._lags: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._stats = {"polls": 0, "dispatched": 0, "skipped": 0, "failed": 0}
+        self._last_poll: Optional[datetime] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        SCHEDULE_DUE_INDEX.create(bind=engine, checkfirst=True)
+        self._thread = threading.Thread(target=self._run, name="schedule-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Polling dispatcher started: every {self.poll_interval}s, "
+            f"{self.batch_size} per batch, {self.pool.workers} workers"
+        )
+
+    def wakeup(self):
+        """Polls now instead of at the next interval, e.g. after scheduling a post that is already due."""
+        self._wakeup.set()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 5)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            claimed = 0
+            try:
+                claimed = self.poll()
+            except Exception as e:
+                logger.error(f"Dispatcher poll failed: {e}", exc_info=True)
+            # Keep polling while full batches come back; otherwise wait.
+            if claimed < self.batch_size or self._capacity() == 0:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _capacity(self) -> int:
+        # Claim no more than the workers can start soon, so claimed rows do not
+        # pile up in memory waiting for a worker.
+        with self._lock:
+            return max(0, 2 * self.pool.workers - self._in_flight)
+
+    def poll(self) -> int:
+        """Claims and dispatches one batch of due schedules; returns how many were claimed."""
+        limit = min(self.batch_size, self._capacity())
+        now = datetime.now()
+        with self._lock:
+            self._stats["polls"] += 1
+            self._last_poll = now
+        if limit == 0:
+            return 0
+
+        rows = self._claim(now, limit)
+        for schedule_id, run_at, influencer_id in rows:
+            lag = (now - run_at).total_seconds()
+            if self.misfire_skip_after is not None and now - run_at > self.misfire_skip_after:
+                logger.warning(f"Skipping schedule {schedule_id}: missed by {lag:.0f}s")
+                self.leases.release(schedule_id, done=True)
+                with self._lock:
+                    self._stats["skipped"] += 1
+                continue
+            with self._lock:
+                self._in_flight += 1
+                self._stats["dispatched"] += 1
+                self._lags.append(max(0.0, lag))
+            self.pool.submit(influencer_id, self.process, schedule_id).add_done_callback(
+                lambda future, schedule_id=schedule_id: self._done(schedule_id, future)
+            )
+        return len(rows)
+
+    def _claim(self, now: datetime, limit: int) -> List[Tuple[int, datetime, int]]:
+        """Leases up to `limit` due schedules as (id, run_at, influencer id), oldest first."""
+        claimed = self.leases.claim_due(now, limit)
+        if not claimed:
+            return []
+        db = get_db_session()
+        try:
+            influencers = dict(
+                db.query(Video.id, Video.influencer_id)
+                .filter(Video.id.in_({video_id for _, _, video_id, _ in claimed}))
+                .all()
+            )
+        finally:
+            db.close()
+        return [(schedule_id, run_at, influencers.get(video_id)) for schedule_id, run_at, video_id, _ in claimed]
+
+    def _done(self, schedule_id: int, future: Future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.exception() is not None:
+                self._stats["failed"] += 1
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": self._in_flight,
+                "last_poll": self._last_poll.isoformat() if self._last_poll else None,
+                "dispatch_lag_seconds": percentiles(list(self._lags)),
+            }
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+from dotenv import load_dotenv
+
+from managers.llm_metrics import percentiles
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# How many scheduled posts are processed at once across all accounts.
+EXECUTION_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+
+# Wait and run time samples kept per account for the percentiles.
+SAMPLE_WINDOW = 200
+
+_Task = Tuple[Callable[..., Any], tuple, dict, Future, float]
+
+
+class _Account:
+    def __init__(self):
+        self.queue: Deque[_Task] = deque()
+        # A worker owns the account's queue (running a task or about to).
+        self.scheduled = False
+        self.running = False
+        self.completed = 0
+        self.failed = 0
+        self.wait_times: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+        self.run_times: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+
+class AccountExecutionPool:
+    """
+    Bounded worker pool that runs different accounts in parallel but never two
+    tasks of the same account at once.
+
+    Each account has a FIFO queue, and at most one worker owns it at a time.
+    After each task the owner hands the account back to the pool's queue, so
+    an account with a long backlog takes turns with the others instead of
+    holding a worker until it is drained.
+    """
+
+    def __init__(self, workers: int = EXECUTION_WORKERS):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="post")
+        self._lock = threading.Lock()
+        self._accounts: Dict[Hashable, _Account] = {}
+
+    def submit(self, account: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queues `fn(*args, **kwargs)` behind the account's earlier tasks."""
+        future: Future = Future()
+        task = (fn, args, kwargs, future, time.monotonic())
+        with self._lock:
+            state = self._accounts.setdefault(account, _Account())
+            state.queue.append(task)
+            if state.scheduled:
+                return future
+            state.scheduled = True
+        try:
+            self._executor.submit(self._run_account, account)
+        except RuntimeError:
+            with self._lock:
+                state.queue.remove(task)
+                state.scheduled = False
+            raise
+        return future
+
+    def _run_account(self, account: Hashable):
+        state = self._accounts[account]
+        while True:
+            with self._lock:
+                fn, args, kwargs, future, enqueued_at = state.queue.popleft()
+                state.running = True
+            started = time.monotonic()
+            failed = False
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    failed = True
+                    future.set_exception(e)
+                    logger.error(f"Task for account {account} failed: {e}", exc_info=True)
+            finished = time.monotonic()
+
+            with self._lock:
+                state.running = False
+                state.wait_times.append(started - enqueued_at)
+                state.run_times.append(finished - started)
+                if failed:
+                    state.failed += 1
+                else:
+                    state.completed += 1
+                if not state.queue:
+                    state.scheduled = False
+                    return
+            try:
+                self._executor.submit(self._run_account, account)
+                return
+            except RuntimeError:
+                # Shutting down: finish the account's queue on this worker.
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            accounts = {
+                str(account): {
+                    "queued": len(state.queue),
+                    "running": state.running,
+                    "completed": state.completed,
+                    "failed": state.failed,
+                    "wait_seconds": percentiles(list(state.wait_times)),
+                    "run_seconds": percentiles(list(state.run_times)),
+                }
+                for account, state in self._accounts.items()
+            }
+        return {
+            "workers": self.workers,
+            "queued": sum(a["queued"] for a in accounts.values()),
+            "running": sum(1 for a in accounts.values() if a["running"]),
+            "accounts": accounts,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting tasks; with `wait`, returns once every queued task has run."""
+        self._executor.shutdown(wait=wait)
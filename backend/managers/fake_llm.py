@@ -0,0 +1,383 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import httpx
+from anthropic import APIStatusError, InternalServerError, RateLimitError
+from anthropic.types import Message, RawContentBlockDeltaEvent
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Response latency is lognormal around the median plus a per-output-token cost,
+# roughly the shape of real API latencies. Set the median to 0 for no waiting.
+LATENCY_MEDIAN_MS = float(os.getenv("AI_FAKE_LLM_LATENCY_MS", "800"))
+LATENCY_SIGMA = float(os.getenv("AI_FAKE_LLM_LATENCY_SIGMA", "0.5"))
+MS_PER_OUTPUT_TOKEN = float(os.getenv("AI_FAKE_LLM_MS_PER_TOKEN", "10"))
+
+# Fraction of requests answered with 429 / with a 500 or 529.
+RATE_LIMIT_RATE = float(os.getenv("AI_FAKE_LLM_RATE_LIMIT_RATE", "0"))
+ERROR_RATE = float(os.getenv("AI_FAKE_LLM_ERROR_RATE", "0"))
+
+# Emulated server-side requests-per-minute limit (0 = none). Requests over it
+# get a 429 with a retry-after, like the real API.
+SERVER_RPM = int(os.getenv("AI_FAKE_LLM_RPM", "0"))
+
+SEED = int(os.getenv("AI_FAKE_LLM_SEED", "0"))
+
+_WORDS = """morning light coffee studio city walk friends laugh quiet plan
+project sketch window rain market street music journal garden train sunset
+notebook kitchen bread dog park gallery camera ocean breeze memory family
+letter bicycle rooftop playlist bookstore candle hike river neighbor""".split()
+
+_HASHTAGS = """dailylife lifestyle behindthescenes goodvibes creative
+mindful weekend inspiration storytime realtalk smallwins community""".split()
+
+_API_URL = "https://fake-llm.local/v1/messages"
+
+
+def _error_response(status: int, retry_after: Optional[float] = None) -> httpx.Response:
+    headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else {}
+    return httpx.Response(status, headers=headers, request=httpx.Request("POST", _API_URL))
+
+
+def _estimate_tokens(value: Any) -> int:
+    return max(1, len(json.dumps(value, default=str)) // 4)
+
+
+def _first_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in messages:
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        return " ".join(
+            block.get("text", "") for block in content or [] if isinstance(block, dict)
+        )
+    return ""
+
+
+def _hints(prompt: str) -> Dict[str, Any]:
+    """What a list output should look like, read from the prompts this app sends."""
+    hints: Dict[str, Any] = {"ids": [int(i) for i in re.findall(r"- id (\d+),", prompt)]}
+    hints["concepts"] = re.findall(r"^\d+\. (\S.*)$", prompt, re.MULTILINE)
+    concept = re.search(r"\*\*Video Concept:\*\*\n(.+)", prompt)
+    if concept:
+        hints["concepts"] = [concept.group(1)]
+
+    explicit_days = re.search(r"these days: ([\d, ]+)", prompt)
+    count = re.search(r"plan for (\d+)|generate (\d+) separate", prompt)
+    if hints["ids"]:
+        hints["count"] = len(hints["ids"])
+    elif explicit_days:
+        hints["days"] = [int(d) for d in explicit_days.group(1).split(",") if d.strip()]
+        hints["count"] = len(hints["days"])
+    elif count:
+        hints["count"] = int(count.group(1) or count.group(2))
+    elif hints["concepts"]:
+        hints["count"] = len(hints["concepts"])
+    else:
+        hints["count"] = 3
+
+    horizon = re.search(r"over the next (\d+) days", prompt)
+    hints["horizon"] = int(horizon.group(1)) if horizon else 7
+    if "'tent-pole' reels" in prompt:
+        hints["content_type"] = "reel"
+    elif "casual stories" in prompt:
+        hints["content_type"] = "story"
+    return hints
+
+
+class _Generator:
+    """Builds schema-valid tool inputs and filler text from a seeded RNG."""
+
+    LENGTHS = {"description": 60, "intention": 25, "caption": 15, "post_context": 25}
+
+    def __init__(self, rng: random.Random, hints: Dict[str, Any]):
+        self.rng = rng
+        self.hints = hints
+        if "days" not in hints:
+            horizon = hints["horizon"]
+            count = min(hints["count"], horizon)
+            hints["days"] = sorted(self.rng.sample(range(1, horizon + 1), count)) or [1]
+
+    def sentence(self, words: int, position: Optional[int] = 0) -> str:
+        """Filler words, led by the post concept at `position` if there is one."""
+        concepts = self.hints.get("concepts") or []
+        lead = f"{concepts[position % len(concepts)]} " if concepts and position is not None else ""
+        body = " ".join(self.rng.choice(_WORDS) for _ in range(words))
+        return f"{lead}{body.capitalize()}."
+
+    def value(self, schema: Dict[str, Any], name: str, position: int = 0) -> Any:
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            preferred = self.hints.get(name)
+            return preferred if preferred in schema["enum"] else self.rng.choice(schema["enum"])
+        kind = schema.get("type")
+        if kind == "object":
+            return {
+                prop: self.value(sub, prop, position)
+                for prop, sub in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            if name == "hashtags":
+                return [f"#{tag}" for tag in self.rng.sample(_HASHTAGS, self.rng.randint(3, 5))]
+            return [self.value(schema.get("items", {}), name, i) for i in range(self.hints["count"])]
+        if kind == "integer":
+            if name == "day":
+                return self.hints["days"][position % len(self.hints["days"])]
+            if name == "id" and self.hints["ids"]:
+                return self.hints["ids"][position % len(self.hints["ids"])]
+            return max(int(schema.get("minimum", 0)), position)
+        if kind == "boolean":
+            return self.rng.random() > 0.25
+        if kind == "number":
+            return round(self.rng.random(), 3)
+        return self.sentence(self.LENGTHS.get(name, 10), position)
+
+    def text(self, tokens: int) -> str:
+        paragraphs, words = [], int(tokens * 0.75)
+        while words > 0:
+            size = min(words, self.rng.randint(60, 120))
+            paragraphs.append(" ".join(self.sentence(12, None) for _ in range(max(1, size // 12))))
+            words -= size
+        return "\n\n".join(paragraphs)
+
+
+class FakeMessages:
+    """Stand-in for `client.messages` (create, stream and batches)."""
+
+    def __init__(self, backend: "FakeAnthropic"):
+        self._backend = backend
+        self.batches = FakeMessageBatches(backend)
+
+    def create(self, **params) -> Message:
+        return self._backend.respond(params)
+
+    def stream(self, **params) -> "FakeStream":
+        return FakeStream(self._backend, params)
+
+
+class FakeMessageBatches:
+    """
+    Stand-in for `client.messages.batches`. Each request gets the answer
+    `create` would give it, without latency or per-minute limits, and the batch
+    has ended as soon as it is submitted.
+    """
+
+    def __init__(self, backend: "FakeAnthropic"):
+        self._backend = backend
+        self._results: Dict[str, List[Any]] = {}
+
+    def create(self, requests: List[Dict[str, Any]]) -> Any:
+        batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:24]}"
+        self._results[batch_id] = [
+            SimpleNamespace(
+                custom_id=request["custom_id"],
+                result=SimpleNamespace(type="succeeded", message=self._backend.answer(request["params"])),
+            )
+            for request in requests
+        ]
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id: str) -> Any:
+        return SimpleNamespace(id=batch_id, processing_status="ended")
+
+    def results(self, batch_id: str) -> Iterator[Any]:
+        return iter(self._results.pop(batch_id))
+
+
+class FakeStream:
+    """Context manager mirroring the SDK's MessageStream (text and tool input deltas)."""
+
+    CHUNK_CHARS = 24
+
+    def __init__(self, backend: "FakeAnthropic", params: Dict[str, Any]):
+        self._backend = backend
+        self._params = params
+        self._message: Optional[Message] = None
+
+    def __enter__(self) -> "FakeStream":
+        self._message = self._backend.respond(self._params, wait=False)
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self) -> Iterator[RawContentBlockDeltaEvent]:
+        deltas = []
+        for index, block in enumerate(self._message.content):
+            if block.type == "tool_use":
+                text, delta_type, field = json.dumps(block.input), "input_json_delta", "partial_json"
+            else:
+                text, delta_type, field = block.text, "text_delta", "text"
+            for i in range(0, len(text), self.CHUNK_CHARS):
+                deltas.append((index, {"type": delta_type, field: text[i:i + self.CHUNK_CHARS]}))
+
+        delay = self._backend.latency(self._message.usage.output_tokens) / max(len(deltas), 1)
+        for index, delta in deltas:
+            if delay:
+                time.sleep(delay)
+            yield RawContentBlockDeltaEvent.model_validate(
+                {"type": "content_block_delta", "index": index, "delta": delta}
+            )
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        for event in self:
+            if event.delta.type == "text_delta":
+                yield event.delta.text
+
+    def get_final_message(self) -> Message:
+        return self._message
+
+
+class FakeAnthropic:
+    """
+    Deterministic in-process replacement for the Anthropic client.
+
+    Answers are derived from a hash of the request, so the same request always
+    gets the same answer. Forced tool calls are answered with input generated
+    from the tool's own JSON schema, so structured outputs always validate.
+    Latency, transient errors and 429s are drawn from a seeded RNG according to
+    the AI_FAKE_LLM_* settings. Prompt caching is emulated for system blocks
+    marked with cache_control.
+    """
+
+    def __init__(
+        self,
+        latency_median_ms: float = LATENCY_MEDIAN_MS,
+        latency_sigma: float = LATENCY_SIGMA,
+        ms_per_output_token: float = MS_PER_OUTPUT_TOKEN,
+        rate_limit_rate: float = RATE_LIMIT_RATE,
+        error_rate: float = ERROR_RATE,
+        server_rpm: int = SERVER_RPM,
+        seed: int = SEED,
+    ):
+        self.latency_median_ms = latency_median_ms
+        self.latency_sigma = latency_sigma
+        self.ms_per_output_token = ms_per_output_token
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.server_rpm = server_rpm
+        self.seed = seed
+        self.messages = FakeMessages(self)
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._request_times: Deque[float] = deque()
+        self._cached_prefixes: Dict[str, int] = {}
+
+    def with_options(self, **options) -> "FakeAnthropic":
+        return self
+
+    def latency(self, output_tokens: int) -> float:
+        if self.latency_median_ms <= 0:
+            return 0.0
+        with self._lock:
+            base = self._rng.lognormvariate(math.log(self.latency_median_ms), self.latency_sigma)
+        return (base + output_tokens * self.ms_per_output_token) / 1000
+
+    def _check_limits(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.server_rpm:
+                while self._request_times and now - self._request_times[0] > 60:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.server_rpm:
+                    retry_after = 60 - (now - self._request_times[0])
+                    raise RateLimitError(
+                        "Fake rate limit exceeded", response=_error_response(429, retry_after), body=None
+                    )
+                self._request_times.append(now)
+            draw = self._rng.random()
+        if draw < self.rate_limit_rate:
+            raise RateLimitError("Fake rate limit", response=_error_response(429, 1.0), body=None)
+        if draw < self.rate_limit_rate + self.error_rate:
+            if draw < self.rate_limit_rate + self.error_rate / 2:
+                raise InternalServerError("Fake server error", response=_error_response(500), body=None)
+            raise APIStatusError("Fake overloaded", response=_error_response(529), body=None)
+
+    def respond(self, params: Dict[str, Any], wait: bool = True) -> Message:
+        self._check_limits()
+        message = self.answer(params)
+        if wait:
+            delay = self.latency(message.usage.output_tokens)
+            if delay:
+                time.sleep(delay)
+        return message
+
+    def answer(self, params: Dict[str, Any]) -> Message:
+        """The deterministic answer to a request, without limits or latency."""
+        digest = hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        generator = _Generator(
+            random.Random(f"{self.seed}:{digest}"),
+            _hints(_first_user_text(params.get("messages", []))),
+        )
+
+        tool_choice = params.get("tool_choice") or {}
+        tool = next(
+            (t for t in params.get("tools", []) if t["name"] == tool_choice.get("name")), None
+        )
+        if tool:
+            content = [{
+                "type": "tool_use",
+                "id": f"toolu_fake_{digest[:24]}",
+                "name": tool["name"],
+                "input": generator.value(tool["input_schema"], tool["name"]),
+            }]
+            stop_reason = "tool_use"
+        else:
+            target = int(params.get("max_tokens", 1024) * 0.6)
+            content = [{"type": "text", "text": generator.text(target)}]
+            stop_reason = "end_turn"
+
+        output_tokens = _estimate_tokens(content)
+        if output_tokens > params.get("max_tokens", output_tokens):
+            stop_reason = "max_tokens"
+        return Message.model_validate({
+            "id": f"msg_fake_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": params.get("model", "fake"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"output_tokens": output_tokens, **self._input_usage(params)},
+        })
+
+    def _input_usage(self, params: Dict[str, Any]) -> Dict[str, int]:
+        total = _estimate_tokens([params.get("tools"), params.get("system"), params.get("messages")])
+        system = params.get("system")
+        if not isinstance(system, list) or not any(
+            isinstance(block, dict) and block.get("cache_control") for block in system
+        ):
+            return {"input_tokens": total, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+        # Like the API, the cached prefix ends at the last cache breakpoint.
+        last = max(n for n, block in enumerate(system) if isinstance(block, dict) and block.get("cache_control"))
+        prefix = [params.get("tools"), system[: last + 1]]
+        prefix_tokens = _estimate_tokens(prefix)
+        key = hashlib.sha256(json.dumps(prefix, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        with self._lock:
+            hit = key in self._cached_prefixes
+            self._cached_prefixes[key] = prefix_tokens
+        return {
+            "input_tokens": max(total - prefix_tokens, 1),
+            "cache_read_input_tokens": prefix_tokens if hit else 0,
+            "cache_creation_input_tokens": 0 if hit else prefix_tokens,
+        }
@@ -0,0 +1,145 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Methods whose requests are hedged (comma-separated, empty = off), e.g.
+# AI_HEDGE_METHODS=generate_scene_prompt,generate_post_content. A hedged
+# request that has not answered after the method's p95 latency is sent a
+# second time, and whichever answers first wins. That costs roughly 5% extra
+# requests for those methods.
+HEDGE_METHODS = {
+    m.strip() for m in os.getenv("AI_HEDGE_METHODS", "").split(",") if m.strip()
+}
+HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+# Latency samples needed before a method is hedged, and how many are kept.
+HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = 200
+HEDGE_POOL_SIZE = 64
+
+
+class RequestHedger:
+    """
+    Hedged requests for tail latency.
+
+    Keeps a window of recent request latencies per method. Once a method has
+    enough samples, its requests run on a worker thread; if one is still
+    waiting after the configured latency percentile, an identical request is
+    sent and the first successful answer is returned. The slower request is
+    left to finish in the background and its answer is discarded.
+    """
+
+    def __init__(
+        self,
+        methods=HEDGE_METHODS,
+        percentile: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+    ):
+        self.methods = set(methods)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def enabled_for(self, method: Optional[str]) -> bool:
+        return method in self.methods
+
+    def delay(self, method: str) -> Optional[float]:
+        """Seconds to wait before hedging a request, or None while there are too few samples."""
+        with self._lock:
+            samples = sorted(self._latencies.get(method, ()))
+        if len(samples) < max(1, self.min_samples):
+            return None
+        rank = max(0, math.ceil(self.percentile * len(samples) / 100) - 1)
+        return samples[rank]
+
+    def run(
+        self,
+        method: str,
+        send: Callable[[], Any],
+        before_hedge: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """
+        Calls `send`, hedging it with a second call if it is slow. `before_hedge`
+        runs before the second call is sent, e.g. to take a rate-limit slot.
+        """
+        delay = self.delay(method)
+        self._count(method, "requests")
+        if delay is None:
+            return self._timed(method, send)
+
+        executor = self._pool()
+        primary = executor.submit(self._timed, method, send)
+        try:
+            return primary.result(timeout=delay)
+        except TimeoutError:
+            pass
+
+        def hedge():
+            if before_hedge:
+                before_hedge()
+            return self._timed(method, send)
+
+        logger.debug(f"{method}: no answer after {delay:.2f}s; sending a hedged request")
+        self._count(method, "hedged")
+        second = executor.submit(hedge)
+        pending = {primary, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count(method, "hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _timed(self, method: str, send: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        result = send()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._latencies.setdefault(method, deque(maxlen=HEDGE_WINDOW)).append(elapsed)
+        return result
+
+    def _count(self, method: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(method, {"requests": 0, "hedged": 0, "hedge_wins": 0})
+            stats[field] += 1
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=HEDGE_POOL_SIZE, thread_name_prefix="hedged-request"
+                )
+            return self._executor
+
+    def stats(self) -> Dict[str, Any]:
+        summary = {}
+        with self._lock:
+            stats = {method: dict(counts) for method, counts in self._stats.items()}
+        for method, counts in stats.items():
+            delay = self.delay(method)
+            summary[method] = {
+                **counts,
+                "hedge_rate": counts["hedged"] / counts["requests"] if counts["requests"] else 0.0,
+                "hedge_win_rate": counts["hedge_wins"] / counts["hedged"] if counts["hedged"] else 0.0,
+                "hedge_delay_seconds": round(delay, 3) if delay is not None else None,
+            }
+        return summary
+
+
+request_hedger = RequestHedger()
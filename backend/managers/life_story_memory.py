@@ -0,0 +1,154 @@
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from managers.ai_generator import ai_generator
+from managers.story_retrieval import estimate_tokens
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Upper bound on the rendered life story that goes into every prompt, and the
+# share of it reserved for verbatim recent events. Once the recent log
+# outgrows its share, the oldest events are folded into the condensed summary
+# until the log is down to half its share, so the summary is rewritten once
+# per several events rather than on every event.
+LIFE_STORY_TOKEN_BUDGET = int(os.getenv("LIFE_STORY_TOKEN_BUDGET", "4000"))
+RECENT_EVENTS_TOKEN_BUDGET = int(os.getenv("LIFE_STORY_RECENT_EVENTS_TOKENS", "800"))
+
+RECENT_EVENTS_HEADER = "Recent events:"
+
+
+def trim_to_budget(text: str, token_budget: int) -> str:
+    """
+    Cuts text down to a token budget without an AI call.
+
+    Keeps the opening paragraph (the origin story) and as many of the latest
+    paragraphs as fit, dropping the middle.
+    """
+    if estimate_tokens(text) <= token_budget:
+        return text
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    if not paragraphs:
+        return ""
+    head = paragraphs[0][: token_budget * 4]
+    kept: List[str] = []
+    remaining = token_budget - estimate_tokens(head)
+    for paragraph in reversed(paragraphs[1:]):
+        cost = estimate_tokens(paragraph) + 1
+        if cost > remaining:
+            break
+        kept.insert(0, paragraph)
+        remaining -= cost
+    return "\n\n".join([head] + kept)
+
+
+class LifeStoryMemory:
+    """
+    Bounded representation of an influencer's life story.
+
+    Holds a condensed summary and a log of recent events. `render()` produces
+    the text stored in `Influencer.life_story` and used by every prompt, which
+    stays within `token_budget` no matter how many events the account has had.
+    """
+
+    def __init__(
+        self,
+        summary: str = "",
+        events: Optional[List[Dict[str, str]]] = None,
+        condensed_events: int = 0,
+        token_budget: int = LIFE_STORY_TOKEN_BUDGET,
+        recent_events_budget: int = RECENT_EVENTS_TOKEN_BUDGET,
+    ):
+        self.summary = summary or ""
+        self.events = list(events or [])
+        self.condensed_events = condensed_events
+        self.token_budget = token_budget
+        self.recent_events_budget = min(recent_events_budget, token_budget // 2)
+
+    @classmethod
+    def load(cls, influencer) -> "LifeStoryMemory":
+        data = influencer.life_story_memory
+        if data:
+            return cls(
+                data.get("summary", ""),
+                data.get("events", []),
+                data.get("condensed_events", 0),
+            )
+        # Influencers created before the memory existed start from their story.
+        return cls(influencer.life_story or "")
+
+    @property
+    def summary_budget(self) -> int:
+        return self.token_budget - self.recent_events_budget
+
+    def add_event(self, text: str, at: Optional[datetime] = None):
+        self.events.append({"text": text.strip(), "at": (at or datetime.now()).isoformat()})
+        self.enforce_budget()
+
+    def enforce_budget(self):
+        """
+        Folds the oldest events into the summary once the recent events
+        outgrow their budget, down to half of it, and condenses an oversized
+        summary.
+        """
+        to_fold = []
+        if self._events_tokens() > self.recent_events_budget:
+            low_water = self.recent_events_budget // 2
+            while self.events and self._events_tokens() > low_water:
+                to_fold.append(self.events.pop(0))
+
+        if to_fold or estimate_tokens(self.summary) > self.summary_budget:
+            self.summary = self._condense([event["text"] for event in to_fold])
+            self.condensed_events += len(to_fold)
+            logger.info(
+                f"Condensed {len(to_fold)} events into life story summary "
+                f"(~{estimate_tokens(self.summary)} tokens)"
+            )
+
+    def _events_tokens(self) -> int:
+        return sum(estimate_tokens(event["text"]) + 2 for event in self.events)
+
+    def _condense(self, events: List[str]) -> str:
+        condensed = ai_generator.condense_life_story(self.summary, events, self.summary_budget)
+        # Allow the model a little slack over the budget before trimming its answer.
+        if condensed is None or estimate_tokens(condensed) > self.summary_budget * 1.2:
+            condensed = trim_to_budget(
+                "\n\n".join([p for p in [self.summary, *events] if p]), self.summary_budget
+            )
+        return condensed
+
+    def render(self) -> str:
+        if not self.events:
+            return self.summary
+        recent = "\n".join(f"- {event['text']}" for event in self.events)
+        return f"{self.summary}\n\n{RECENT_EVENTS_HEADER}\n{recent}".strip()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "summary": self.summary,
+            "events": self.events,
+            "condensed_events": self.condensed_events,
+        }
+
+
+def _save(influencer, memory: LifeStoryMemory) -> str:
+    influencer.life_story_memory = memory.to_dict()
+    influencer.life_story = memory.render()
+    return influencer.life_story
+
+
+def record_life_event(influencer, event_text: str) -> str:
+    """Adds an event to the influencer's life-story memory and returns the new life story."""
+    memory = LifeStoryMemory.load(influencer)
+    memory.add_event(event_text)
+    return _save(influencer, memory)
+
+
+def reset_life_story(influencer, life_story: str) -> str:
+    """Replaces the memory with a fresh (e.g. rewritten) story, condensing it if it is over budget."""
+    memory = LifeStoryMemory(life_story)
+    memory.enforce_budget()
+    return _save(influencer, memory)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from anthropic.types import Message
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+_storage_dir = pathlib.Path(__file__).parent.parent / "storage"
+
+# Methods whose responses may be served from the cache. A plan review is
+# low-temperature and re-run on identical plans when posts are replanned;
+# high-temperature generations are deliberately varied, so they are only
+# cached when explicitly listed.
+DEFAULT_CACHED_METHODS = "review_content_plan"
+
+
+class LLMResponseCache:
+    """
+    Disk-backed, content-addressed cache of Claude responses.
+
+    Entries are keyed on a hash of the full request (model, temperature,
+    max_tokens, system prompt and messages). Expired entries and, beyond
+    `max_entries`, the least recently used ones are evicted on write. The
+    limit is a number of responses, not bytes; `stats` reports the size on
+    disk. A limit of 0 stores nothing.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        methods: Optional[Set[str]] = None,
+    ):
+        self.path = path or os.getenv(
+            "AI_CACHE_PATH", str(_storage_dir / "llm_cache.db")
+        )
+        if max_entries is None:
+            max_entries = int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("AI_CACHE_TTL_HOURS", "168")) * 3600
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        if methods is None:
+            methods = {
+                m.strip()
+                for m in os.getenv("AI_CACHE_METHODS", DEFAULT_CACHED_METHODS).split(",")
+                if m.strip()
+            }
+        self.methods = methods
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_responses_last_accessed ON responses (last_accessed)"
+        )
+        self._conn.commit()
+
+    def enabled_for(self, method: str) -> bool:
+        return method in self.methods
+
+    def key(self, params: Dict[str, Any]) -> str:
+        """Content address of a Messages API request."""
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, method: str, key: str) -> Optional[Message]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            hit = row is not None and now - row[1] <= self.ttl_seconds
+            if hit:
+                self._conn.execute(
+                    "UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            self._record(method, hit)
+
+        if not hit:
+            return None
+        logger.info(f"{method}: served from LLM response cache")
+        return Message.model_validate_json(row[0])
+
+    def set(self, method: str, key: str, response: Message):
+        # A truncated response is not worth replaying.
+        if self.max_entries <= 0 or getattr(response, "stop_reason", None) == "max_tokens":
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, method, response, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, method, response.model_dump_json(), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self._conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def _record(self, method: str, hit: bool):
+        stats = self._stats.setdefault(method, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counts and hit rate per method, plus the current entry count and size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM responses"
+            ).fetchone()
+            methods = {}
+            for method, counts in self._stats.items():
+                lookups = counts["hits"] + counts["misses"]
+                methods[method] = {
+                    **counts,
+                    "hit_rate": counts["hits"] / lookups if lookups else 0.0,
+                }
+        return {"entries": entries, "bytes": size, "max_entries": self.max_entries, "methods": methods}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,308 @@
+import contextvars
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens: (input, output, cache read, cache write).
+MODEL_PRICING = {
+    "claude-3-5-sonnet-20241022": (3.00, 15.00, 0.30, 3.75),
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 0.08, 1.00),
+}
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, float("inf")]
+
+# Latency samples kept per method (and per influencer and method) for percentiles.
+MAX_SAMPLES = 2000
+
+
+class LLMCall:
+    """Measurements for one AIContentGenerator method call."""
+
+    def __init__(self, method: str, influencer_id: Optional[int]):
+        self.method = method
+        self.influencer_id = influencer_id
+        self.started_at = time.perf_counter()
+        self.wall_time = 0.0
+        self.model: Optional[str] = None
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self.retries = 0
+        self.cost = 0.0
+        self.response_cache_hit = False
+        self.fallback = False
+        self.error = False
+        # Structured outputs: items (or whole objects) that validated, that
+        # were still invalid after repair, and that only validated on repair.
+        self.items_parsed = 0
+        self.items_invalid = 0
+        self.items_repaired = 0
+        self.repair_requests = 0
+
+    def add_parse(self, parsed: int, invalid: int, repaired: int = 0, repair_requests: int = 0):
+        self.items_parsed += parsed
+        self.items_invalid += invalid
+        self.items_repaired += repaired
+        self.repair_requests += repair_requests
+
+    def add_usage(self, model: str, usage: Dict[str, int], retries: int = 0):
+        self.model = model
+        self.requests += 1
+        self.retries += retries
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        self.cached_tokens += usage.get("cache_read_input_tokens", 0)
+        self.cache_write_tokens += usage.get("cache_creation_input_tokens", 0)
+        prices = MODEL_PRICING.get(model)
+        if prices:
+            self.cost += (
+                usage.get("input_tokens", 0) * prices[0]
+                + usage.get("output_tokens", 0) * prices[1]
+                + usage.get("cache_read_input_tokens", 0) * prices[2]
+                + usage.get("cache_creation_input_tokens", 0) * prices[3]
+            ) / 1_000_000
+
+
+class _Aggregate:
+    """Running totals and a bounded latency sample for one method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.requests = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self.response_cache_hits = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.items_parsed = 0
+        self.items_invalid = 0
+        self.items_repaired = 0
+        self.repair_requests = 0
+        self.models: Dict[str, int] = {}
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.latencies: Deque[float] = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, call: LLMCall):
+        self.calls += 1
+        self.requests += call.requests
+        self.fallbacks += int(call.fallback)
+        self.errors += int(call.error)
+        self.response_cache_hits += int(call.response_cache_hit)
+        self.retries += call.retries
+        self.input_tokens += call.input_tokens
+        self.output_tokens += call.output_tokens
+        self.cached_tokens += call.cached_tokens
+        self.cost += call.cost
+        self.items_parsed += call.items_parsed
+        self.items_invalid += call.items_invalid
+        self.items_repaired += call.items_repaired
+        self.repair_requests += call.repair_requests
+        if call.model:
+            self.models[call.model] = self.models.get(call.model, 0) + 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if call.wall_time <= bound:
+                self.histogram[i] += 1
+                break
+        self.latencies.append(call.wall_time)
+
+    def summary(self) -> Dict[str, Any]:
+        items = self.items_parsed + self.items_invalid
+        return {
+            "calls": self.calls,
+            "requests": self.requests,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": self.fallbacks / self.calls if self.calls else 0.0,
+            "errors": self.errors,
+            "response_cache_hits": self.response_cache_hits,
+            "retries": self.retries,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost, 6),
+            "items_parsed": self.items_parsed,
+            "items_invalid": self.items_invalid,
+            "items_repaired": self.items_repaired,
+            "repair_requests": self.repair_requests,
+            "first_pass_failure_rate": (
+                (self.items_invalid + self.items_repaired) / items if items else 0.0
+            ),
+            "parse_failure_rate": self.items_invalid / items if items else 0.0,
+            "models": dict(self.models),
+            "latency_seconds": percentiles(list(self.latencies)),
+            "latency_histogram": {
+                ("+Inf" if bound == float("inf") else f"le_{bound}"): count
+                for bound, count in zip(LATENCY_BUCKETS, self.histogram)
+            },
+        }
+
+
+def percentiles(samples: List[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles of `samples`, plus the mean and max."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {
+        f"p{p}": round(ordered[max(0, math.ceil(p * len(ordered) / 100) - 1)], 4)
+        for p in points
+    }
+    result["mean"] = round(sum(ordered) / len(ordered), 4)
+    result["max"] = round(ordered[-1], 4)
+    return result
+
+
+class LLMMetrics:
+    """
+    Process-wide recorder for AIContentGenerator calls.
+
+    Each instrumented method call gets an `LLMCall` that is current for the
+    duration of the call. `_create_message` adds token usage to it and the
+    fallback helpers flag it, and it is aggregated per method and per
+    influencer when the call returns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods: Dict[str, _Aggregate] = {}
+        self._influencers: Dict[int, Dict[str, _Aggregate]] = {}
+        self._current: contextvars.ContextVar[Optional[LLMCall]] = contextvars.ContextVar(
+            "llm_call", default=None
+        )
+        self._influencer: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+            "llm_influencer", default=None
+        )
+
+    @contextmanager
+    def track(self, method: str, influencer_id: Optional[int] = None) -> Iterator[LLMCall]:
+        with self.track_stream(method, influencer_id) as call, self.active(call):
+            yield call
+
+    @contextmanager
+    def track_stream(self, method: str, influencer_id: Optional[int] = None) -> Iterator[LLMCall]:
+        """
+        Like `track`, but the call is not made current. For generators: a
+        context variable set across `yield` is seen by the consumer's code
+        between items. Record usage on the call directly, or wrap work that
+        does not yield in `active`.
+        """
+        if influencer_id is None:
+            influencer_id = self._influencer.get()
+        call = LLMCall(method, influencer_id)
+        try:
+            yield call
+        except Exception:
+            call.error = True
+            raise
+        finally:
+            call.wall_time = time.perf_counter() - call.started_at
+            self._record(call)
+
+    @contextmanager
+    def active(self, call: Optional[LLMCall]) -> Iterator[Optional[LLMCall]]:
+        """Makes `call` current inside the block."""
+        token = self._current.set(call)
+        try:
+            yield call
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def for_influencer(self, influencer_id: int) -> Iterator[None]:
+        """Attributes calls made inside the block that take no influencer argument."""
+        token = self._influencer.set(influencer_id)
+        try:
+            yield
+        finally:
+            self._influencer.reset(token)
+
+    def instrument(self, method: str) -> Callable:
+        """Decorator that tracks a generator method, using its `influencer` argument if any."""
+
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                influencer_id = None
+                if "influencer" in signature.parameters:
+                    influencer = signature.bind_partial(*args, **kwargs).arguments.get("influencer")
+                    influencer_id = getattr(influencer, "id", None)
+                with self.track(method, influencer_id):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def current(self) -> Optional[LLMCall]:
+        return self._current.get()
+
+    def mark_fallback(self):
+        call = self._current.get()
+        if call is not None:
+            call.fallback = True
+
+    def record_parse(self, parsed: int, invalid: int, repaired: int = 0, repair_requests: int = 0):
+        """Adds the outcome of validating a structured output to the current call."""
+        call = self._current.get()
+        if call is not None:
+            call.add_parse(parsed, invalid, repaired, repair_requests)
+
+    def _record(self, call: LLMCall):
+        with self._lock:
+            self._methods.setdefault(call.method, _Aggregate()).add(call)
+            if call.influencer_id is not None:
+                self._influencers.setdefault(call.influencer_id, {}).setdefault(
+                    call.method, _Aggregate()
+                ).add(call)
+        logger.debug(
+            f"{call.method}: {call.wall_time:.2f}s, model={call.model}, "
+            f"in={call.input_tokens} out={call.output_tokens} cached={call.cached_tokens}, "
+            f"retries={call.retries}, fallback={call.fallback}, "
+            f"items={call.items_parsed} invalid={call.items_invalid} repairs={call.repair_requests}"
+        )
+
+    def summary(self, influencer_id: Optional[int] = None) -> Dict[str, Any]:
+        """Aggregates per method, either overall with a per-influencer breakdown or for one influencer."""
+        with self._lock:
+            if influencer_id is not None:
+                methods = self._influencers.get(influencer_id, {})
+                return {
+                    "influencer_id": influencer_id,
+                    "methods": {m: agg.summary() for m, agg in methods.items()},
+                }
+            return {
+                "methods": {m: agg.summary() for m, agg in self._methods.items()},
+                "influencers": {
+                    influencer: {
+                        "calls": sum(agg.calls for agg in methods.values()),
+                        "fallbacks": sum(agg.fallbacks for agg in methods.values()),
+                        "input_tokens": sum(agg.input_tokens for agg in methods.values()),
+                        "output_tokens": sum(agg.output_tokens for agg in methods.values()),
+                        "cached_tokens": sum(agg.cached_tokens for agg in methods.values()),
+                        "cost_usd": round(sum(agg.cost for agg in methods.values()), 6),
+                    }
+                    for influencer, methods in self._influencers.items()
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._influencers.clear()
+
+
+llm_metrics = LLMMetrics()
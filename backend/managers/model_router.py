@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from anthropic import APIConnectionError, APIStatusError
+from dotenv import load_dotenv
+
+from managers.circuit_breaker import CircuitOpenError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SONNET = "claude-3-5-sonnet-20241022"
+HAIKU = "claude-3-5-haiku-20241022"
+
+# Model preference per task: the first model is used, the rest are fallbacks
+# tried in order when it fails. Override with AI_MODEL_<TASK> (comma-separated),
+# e.g. AI_MODEL_CAPTION=claude-3-5-haiku-20241022,claude-3-5-sonnet-20241022.
+DEFAULT_ROUTES: Dict[str, List[str]] = {
+    "life_story": [SONNET],
+    "rewrite": [SONNET],
+    "plan": [SONNET],
+    "scene_prompt": [SONNET],
+    "caption": [HAIKU, SONNET],
+}
+
+# Which task each AIContentGenerator method performs.
+METHOD_TASKS = {
+    "generate_life_story": "life_story",
+    "rewrite_life_story": "rewrite",
+    "condense_life_story": "rewrite",
+    "generate_reel_content_plan": "plan",
+    "generate_story_content_plan": "plan",
+    "review_content_plan": "plan",
+    "generate_replacement_plan": "plan",
+    "generate_scene_prompt": "scene_prompt",
+    "generate_post_content": "scene_prompt",
+    "generate_post_content_batch": "scene_prompt",
+    "generate_caption": "caption",
+}
+
+# Failures worth trying another model for: the model is unavailable, overloaded
+# or still rate limited after the rate limiter's retries. Bad requests and auth
+# errors would fail the same way on every model. A model whose circuit breaker
+# is open is skipped as well.
+FALLBACK_STATUSES = {404, 408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def _routes_from_env() -> Dict[str, List[str]]:
+    routes = {}
+    for task, default in DEFAULT_ROUTES.items():
+        configured = os.getenv(f"AI_MODEL_{task.upper()}")
+        models = [m.strip() for m in configured.split(",") if m.strip()] if configured else []
+        routes[task] = models or list(default)
+    return routes
+
+
+class ModelRouter:
+    """Chooses the model for each generation task, with ordered fallbacks."""
+
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None):
+        self.routes = routes or _routes_from_env()
+        self._lock = threading.Lock()
+        self._fallbacks: Dict[str, int] = {}
+
+    def task_for(self, method: str) -> str:
+        return METHOD_TASKS.get(method, method)
+
+    def model_for(self, task: str) -> str:
+        """The preferred model for a task."""
+        return self.routes.get(task, [SONNET])[0]
+
+    def chain(self, method: str, model: Optional[str] = None) -> List[str]:
+        """
+        Models to try for a method, starting with `model` (the one its request
+        was built with) followed by the task's other models.
+        """
+        route = self.routes.get(self.task_for(method), [SONNET])
+        first = model or route[0]
+        return [first] + [m for m in route if m != first]
+
+    def should_fall_back(self, error: Exception) -> bool:
+        if isinstance(error, CircuitOpenError):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code in FALLBACK_STATUSES
+        return isinstance(error, APIConnectionError)
+
+    def record_fallback(self, method: str, failed_model: str, error: Exception):
+        task = self.task_for(method)
+        logger.warning(f"{method}: {failed_model} failed ({error}); falling back to the next {task} model")
+        with self._lock:
+            self._fallbacks[task] = self._fallbacks.get(task, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                task: {"models": list(models), "fallbacks": self._fallbacks.get(task, 0)}
+                for task, models in self.routes.items()
+            }
+
+
+model_router = ModelRouter()
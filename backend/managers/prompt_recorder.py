@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Set to a file path to append every Claude request to it as JSON lines, for
+# replaying with scripts/benchmark_models.py. Off by default: the file holds
+# full prompts, including life stories.
+RECORD_PROMPTS_PATH = os.getenv("AI_RECORD_PROMPTS_PATH")
+
+
+class PromptRecorder:
+    """Appends request parameters to a JSON-lines file."""
+
+    def __init__(self, path: Optional[str] = RECORD_PROMPTS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            logger.info(f"Recording Claude prompts to {path}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, method: str, params: Dict[str, Any]):
+        if not self.path:
+            return
+        line = json.dumps(
+            {"method": method, "recorded_at": time.time(), "params": params}, default=str
+        )
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.error(f"Failed to record prompt for {method}: {e}")
+
+
+def load_recorded_prompts(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+prompt_recorder = PromptRecorder()
@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from anthropic import APIConnectionError, APIStatusError
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Account-wide limits to stay under. 0 (the default) disables a limit; set them
+# to the organisation's actual limits to pace requests before the API has to.
+REQUESTS_PER_MINUTE = int(os.getenv("AI_RATE_LIMIT_RPM", "0"))
+TOKENS_PER_MINUTE = int(os.getenv("AI_RATE_LIMIT_TPM", "0"))
+
+# Output tokens reserved per request (capped at its max_tokens). Most responses
+# are far below max_tokens; the difference is settled once the usage is known.
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("AI_RATE_LIMIT_EXPECTED_OUTPUT_TOKENS", "1024"))
+
+# Retries for throttled, overloaded and transient failures (exponential backoff
+# with full jitter, or the server's retry-after when it sends one).
+MAX_RETRIES = int(os.getenv("AI_RATE_LIMIT_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# 429 (rate limited) and 529 (overloaded) mean we are sending too fast: slow
+# every caller down. Other statuses here are retried without slowing down.
+THROTTLE_STATUSES = {429, 529}
+RETRYABLE_STATUSES = THROTTLE_STATUSES | {408, 409, 500, 502, 503, 504}
+
+# After a throttle the allowed rate is multiplied by this, then recovers by
+# RATE_RECOVERY_STEP per successful request.
+RATE_DECREASE_FACTOR = 0.5
+RATE_RECOVERY_STEP = 0.02
+MIN_RATE_SCALE = 0.1
+
+
+class TokenBucket:
+    """Classic token bucket holding up to one minute of capacity."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (after `refill`)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for outbound model requests.
+
+    Every request waits for room in a requests-per-minute and a
+    tokens-per-minute bucket. Waiting requests are served round-robin across
+    keys (influencers), so one influencer's big planning job cannot starve
+    another's. When the API answers 429 or 529, all callers pause and the
+    allowed rate is cut, then it recovers gradually as requests succeed.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.max_retries = max_retries
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._base_rates = {
+            bucket: bucket.rate for bucket in (self._requests, self._tokens) if bucket
+        }
+        self._scale = 1.0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._queues: Dict[Hashable, Deque[object]] = {}
+        self._turns: Deque[Hashable] = deque()
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "wait_seconds": 0.0,
+        }
+
+    @staticmethod
+    def estimate_tokens(params: Dict[str, Any]) -> int:
+        """
+        Rough token cost of a request: its prompt (about 4 chars per token) plus
+        the expected output, at most max_tokens.
+        """
+        prompt = json.dumps(
+            [params.get("system"), params.get("messages"), params.get("tools")], default=str
+        )
+        return len(prompt) // 4 + min(int(params.get("max_tokens", 0)), EXPECTED_OUTPUT_TOKENS)
+
+    def acquire(self, key: Optional[Hashable], tokens: int):
+        """Blocks until this request may be sent."""
+        started = time.monotonic()
+        ticket = object()
+        with self._condition:
+            queue = self._queues.setdefault(key, deque())
+            if not queue:
+                self._turns.append(key)
+            queue.append(ticket)
+            while True:
+                wait = None
+                if self._turns[0] == key and queue[0] is ticket:
+                    wait = self._wait_time(tokens)
+                    if wait <= 0:
+                        break
+                self._condition.wait(timeout=wait)
+
+            for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+                if bucket:
+                    bucket.take(amount)
+            queue.popleft()
+            self._turns.popleft()
+            if queue:
+                self._turns.append(key)
+            else:
+                del self._queues[key]
+            self._stats["requests"] += 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+            self._condition.notify_all()
+
+    def _wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+            if bucket:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Returns over-reserved tokens to the bucket (or charges the shortfall)."""
+        if not self._tokens:
+            return
+        with self._condition:
+            self._tokens.refill(time.monotonic())
+            self._tokens.tokens = min(
+                self._tokens.capacity,
+                self._tokens.tokens + estimated_tokens - actual_tokens,
+            )
+            self._condition.notify_all()
+
+    def retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        How long to wait before retrying after `error` on the given attempt
+        (0-based), or None if it should not be retried. Throttling errors also
+        pause and slow down every other caller.
+        """
+        status = getattr(error, "status_code", None)
+        if isinstance(error, APIStatusError):
+            if status not in RETRYABLE_STATUSES:
+                return None
+        elif not isinstance(error, APIConnectionError):
+            return None
+        if attempt >= self.max_retries:
+            return None
+
+        delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        with self._condition:
+            self._stats["retries"] += 1
+            if status in THROTTLE_STATUSES:
+                self._stats["throttled"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._set_scale(max(MIN_RATE_SCALE, self._scale * RATE_DECREASE_FACTOR))
+                logger.warning(
+                    f"Model API returned {status}; pausing requests for {delay:.1f}s "
+                    f"and limiting to {self._scale:.0%} of the configured rate"
+                )
+        return delay
+
+    def record_success(self):
+        if self._scale < 1.0:
+            with self._condition:
+                self._set_scale(min(1.0, self._scale + RATE_RECOVERY_STEP))
+
+    def _set_scale(self, scale: float):
+        now = time.monotonic()
+        self._scale = scale
+        for bucket, base_rate in self._base_rates.items():
+            bucket.refill(now)
+            bucket.rate = base_rate * scale
+
+    def run(
+        self, send: Callable[[], Any], key: Optional[Hashable], tokens: int
+    ) -> Tuple[Any, int]:
+        """Calls `send` once allowed, retrying retryable failures. Returns (result, retries)."""
+        attempt = 0
+        while True:
+            self.acquire(key, tokens)
+            try:
+                result = send()
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                # The failed request's reservation is not refunded: a throttled
+                # request still counted against the provider's limits.
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.record_success()
+            return result, attempt
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                **self._stats,
+                "wait_seconds": round(self._stats["wait_seconds"], 3),
+                "rate_scale": round(self._scale, 3),
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "requests_per_minute": self._requests.capacity if self._requests else None,
+                "tokens_per_minute": self._tokens.capacity if self._tokens else None,
+            }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from database.models import get_db_session, Video
+from managers.story_retrieval import MAX_CACHED_INDEXES, tokenize
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Scene prompts whose estimated word-shingle Jaccard similarity to one of the
+# influencer's recent scenes reaches the threshold count as near-duplicates
+# and are regenerated up to AI_SCENE_DEDUP_RETRIES times with a request to
+# differ from the scene they resemble.
+SCENE_DEDUP_ENABLED = os.getenv("AI_SCENE_DEDUP", "true").lower() in ("1", "true", "yes")
+SIMILARITY_THRESHOLD = float(os.getenv("AI_SCENE_DEDUP_THRESHOLD", "0.5"))
+SCENE_WINDOW = int(os.getenv("AI_SCENE_DEDUP_WINDOW", "200"))
+DEDUP_RETRIES = int(os.getenv("AI_SCENE_DEDUP_RETRIES", "1"))
+
+SHINGLE_SIZE = 2
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: scenes with a Jaccard similarity around 0.5 share at
+# least one band with high probability, and unrelated scenes rarely do.
+NUM_BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Overlapping word n-grams of a text, ignoring stopwords and case."""
+    words = tokenize(text)
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures over word shingles."""
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_permutations)
+        ]
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big")
+            for s in shingles(text)
+        ]
+        if not hashes:
+            return None
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._permutations
+        )
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+class SceneIndex:
+    """
+    Locality-sensitive hashing index over one influencer's most recent scenes.
+
+    Only scenes sharing a band of their MinHash signature are compared, so a
+    lookup stays cheap however many scenes are indexed. The oldest scenes
+    are dropped beyond `window`.
+    """
+
+    def __init__(self, hasher: MinHasher, window: int = SCENE_WINDOW, bands: int = NUM_BANDS):
+        self.hasher = hasher
+        self.window = window
+        self.bands = bands
+        self._next_id = 0
+        self._entries: "OrderedDict[int, Tuple[str, Tuple[int, ...]]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        rows = len(signature) // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, text: str):
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (text, signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        while len(self._entries) > self.window:
+            old_id, (_, old_signature) = self._entries.popitem(last=False)
+            for key in self._band_keys(old_signature):
+                bucket = self._buckets.get(key)
+                if bucket:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def nearest(self, text: str) -> Optional[Tuple[float, str]]:
+        """The most similar indexed scene as (similarity, text), or None."""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        candidates: Set[int] = set()
+        for key in self._band_keys(signature):
+            candidates |= self._buckets.get(key, set())
+        best = None
+        for entry_id in candidates:
+            other_text, other_signature = self._entries[entry_id]
+            score = similarity(signature, other_signature)
+            if best is None or score > best[0]:
+                best = (score, other_text)
+        return best
+
+
+class SceneDeduplicator:
+    """
+    Per-influencer near-duplicate detection for generated scene prompts.
+
+    Each influencer's index is seeded from the scene descriptions of their
+    most recent videos on first use and then kept up to date with every scene
+    accepted at generation time. Everything is computed locally.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        window: int = SCENE_WINDOW,
+        max_indexes: int = MAX_CACHED_INDEXES,
+    ):
+        self.threshold = threshold
+        self.window = window
+        self.max_indexes = max_indexes
+        self.hasher = MinHasher()
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[int, SceneIndex]" = OrderedDict()
+        self._stats = {"checked": 0, "duplicates": 0, "regenerated": 0, "kept_duplicates": 0}
+
+    def _index_for(self, influencer_id: int) -> SceneIndex:
+        """
+        Returns the influencer's index, loading it from the database first. The
+        query runs without `_lock`, so loading one influencer does not hold up
+        the others; if two threads load the same index, the first one wins.
+        """
+        with self._lock:
+            index = self._indexes.get(influencer_id)
+            if index is not None:
+                self._indexes.move_to_end(influencer_id)
+                return index
+
+        loaded = SceneIndex(self.hasher, window=self.window)
+        for description in reversed(self._recent_descriptions(influencer_id)):
+            loaded.add(description)
+
+        with self._lock:
+            index = self._indexes.get(influencer_id)
+            if index is not None:
+                self._indexes.move_to_end(influencer_id)
+                return index
+            self._indexes[influencer_id] = loaded
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+            return loaded
+
+    def _recent_descriptions(self, influencer_id: int) -> List[str]:
+        db = get_db_session()
+        try:
+            rows = (
+                db.query(Video.generation_prompt)
+                .filter(Video.influencer_id == influencer_id)
+                .filter(Video.generation_prompt.isnot(None))
+                .order_by(Video.created_at.desc())
+                .limit(self.window)
+                .all()
+            )
+        except Exception as e:
+            logger.error(f"Could not load recent scenes of influencer {influencer_id}: {e}")
+            return []
+        finally:
+            db.close()
+        return [
+            prompt["description"]
+            for (prompt,) in rows
+            if isinstance(prompt, dict) and prompt.get("description")
+        ]
+
+    def check_and_add(
+        self, influencer_id: int, description: str, keep_duplicate: bool = False
+    ) -> Optional[Tuple[float, str]]:
+        """
+        Checks `description` against the influencer's recent scenes and adds it
+        to them unless it nearly duplicates one (with `keep_duplicate`, it is
+        added either way). Both happen under one lock, so concurrent
+        generations cannot each accept the same scene. Returns the similar
+        scene as (similarity, text), if any.
+        """
+        index = self._index_for(influencer_id)
+        with self._lock:
+            nearest = index.nearest(description)
+            self._stats["checked"] += 1
+            duplicate = nearest is not None and nearest[0] >= self.threshold
+            if duplicate:
+                self._stats["duplicates"] += 1
+            if keep_duplicate or not duplicate:
+                index.add(description)
+            return nearest if duplicate else None
+
+    def record(self, outcome: str):
+        """Counts how a duplicate was resolved: 'regenerated' or 'kept_duplicates'."""
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def forget(self, influencer_id: int):
+        """Drops an influencer's index, e.g. after their planned posts were replaced."""
+        with self._lock:
+            self._indexes.pop(influencer_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checked = self._stats["checked"]
+            return {
+                **self._stats,
+                "duplicate_rate": self._stats["duplicates"] / checked if checked else 0.0,
+                "indexed_influencers": len(self._indexes),
+                "threshold": self.threshold,
+            }
+
+
+scene_deduplicator = SceneDeduplicator()
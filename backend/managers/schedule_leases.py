@@ -0,0 +1,220 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select, update
+
+from database.models import Schedule, Video, VideoStatus, get_db_session
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# A claimed schedule belongs to its owner until the lease expires. Owners
+# renew their leases every third of the lease, so only a process that died or
+# hung for a whole lease loses its posts to another process. After
+# SCHEDULER_MAX_ATTEMPTS claims a schedule is given up on.
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "3"))
+
+# (schedule id, run_at, video id, attempts)
+ClaimedRow = Tuple[int, datetime, int, int]
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ScheduleLeases:
+    """
+    Row leases on `schedules`, so that several processes sharing one database
+    run each due post exactly once.
+
+    Claiming is a single conditional `UPDATE ... RETURNING` that only matches
+    active rows whose lease is free or expired, so two processes can never
+    both claim a row. Every claim increments `attempts`. Leases held by this
+    process are renewed in the background until they are released.
+    """
+
+    def __init__(
+        self,
+        owner: Optional[str] = None,
+        lease_seconds: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._held: Set[int] = set()
+        self._stats = {"claimed": 0, "renewed": 0, "lost": 0, "released": 0, "abandoned": 0}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _claimable(self, now: datetime):
+        return (
+            Schedule.is_active == True,
+            or_(Schedule.lease_expires_at.is_(None), Schedule.lease_expires_at < now),
+        )
+
+    def claim_due(self, now: datetime, limit: int, retries_only: bool = False) -> List[ClaimedRow]:
+        """
+        Claims up to `limit` due schedules, oldest first. With `retries_only`,
+        only schedules claimed before whose lease expired or was given back.
+        """
+        due = (
+            select(Schedule.id)
+            .where(*self._claimable(now))
+            .where(Schedule.run_at <= now)
+            .order_by(Schedule.run_at)
+            .limit(limit)
+        )
+        if retries_only:
+            due = due.where(Schedule.attempts > 0)
+        rows = self._claim(Schedule.id.in_(due.scalar_subquery()), now)
+        return sorted(rows, key=lambda row: row[1])
+
+    def claim(self, schedule_id: int) -> Optional[ClaimedRow]:
+        """Claims one schedule, whether due or not; None if it is inactive or leased."""
+        rows = self._claim(Schedule.id == schedule_id, datetime.now())
+        return rows[0] if rows else None
+
+    def _claim(self, condition, now: datetime) -> List[ClaimedRow]:
+        statement = (
+            update(Schedule)
+            .where(condition)
+            .where(*self._claimable(now))
+            .values(
+                lease_owner=self.owner,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                attempts=Schedule.attempts + 1,
+                updated_at=now,
+            )
+            .returning(Schedule.id, Schedule.run_at, Schedule.video_id, Schedule.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        db = get_db_session()
+        try:
+            rows = [tuple(row) for row in db.execute(statement).all()]
+            abandoned = [row for row in rows if row[3] > self.max_attempts]
+            if abandoned:
+                # Deactivate the schedule and fail its post together, so a
+                # given-up post is never left pending with no schedule.
+                db.execute(
+                    update(Schedule)
+                    .where(Schedule.id.in_([row[0] for row in abandoned]))
+                    .values(is_active=False, lease_owner=None, lease_expires_at=None, updated_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                db.execute(
+                    update(Video)
+                    .where(Video.id.in_([row[2] for row in abandoned]))
+                    .values(status=VideoStatus.FAILED, updated_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        finally:
+            db.close()
+
+        claimed = []
+        for row in rows:
+            schedule_id, _, video_id, attempts = row
+            if attempts > self.max_attempts:
+                logger.error(
+                    f"Giving up on schedule {schedule_id} after {attempts - 1} attempts; marked video {video_id} failed"
+                )
+                with self._lock:
+                    self._stats["claimed"] += 1
+                    self._stats["abandoned"] += 1
+                continue
+            with self._lock:
+                self._held.add(schedule_id)
+                self._stats["claimed"] += 1
+            if attempts > 1:
+                logger.warning(f"Reclaimed schedule {schedule_id} (attempt {attempts}); its lease had expired")
+            claimed.append(row)
+        return claimed
+
+    def renew(self) -> int:
+        """Extends every lease this process holds; returns how many were renewed."""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return 0
+        now = datetime.now()
+        statement = (
+            update(Schedule)
+            .where(Schedule.id.in_(held))
+            .where(Schedule.lease_owner == self.owner)
+            .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            .returning(Schedule.id)
+            .execution_options(synchronize_session=False)
+        )
+        db = get_db_session()
+        try:
+            renewed = {schedule_id for (schedule_id,) in db.execute(statement).all()}
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            # Released while renewing; not lost.
+            lost = [schedule_id for schedule_id in held if schedule_id not in renewed and schedule_id in self._held]
+            self._held.difference_update(lost)
+            self._stats["renewed"] += len(renewed)
+            self._stats["lost"] += len(lost)
+        if lost:
+            logger.error(f"Lost the leases of schedules {lost}; another process may run them")
+        return len(renewed)
+
+    def release(self, schedule_id: int, done: bool = True):
+        """
+        Gives up the lease. A `done` schedule is also deactivated; otherwise it
+        can be claimed again right away.
+        """
+        values: Dict[str, Any] = {"lease_owner": None, "lease_expires_at": None, "updated_at": datetime.now()}
+        if done:
+            values["is_active"] = False
+        db = get_db_session()
+        try:
+            db.execute(
+                update(Schedule)
+                .where(Schedule.id == schedule_id)
+                .where(Schedule.lease_owner == self.owner)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._held.discard(schedule_id)
+            self._stats["released"] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._renew_loop, name="schedule-leases", daemon=True)
+        self._thread.start()
+
+    def _renew_loop(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.renew()
+            except Exception as e:
+                logger.error(f"Renewing schedule leases failed: {e}", exc_info=True)
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "owner": self.owner,
+                "held": len(self._held),
+                "lease_seconds": self.lease_seconds,
+            }
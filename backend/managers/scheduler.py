@@ -1,85 +1,567 @@
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.job import Job
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.date import DateTrigger
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import logging
-from database.models import Schedule, Video, VideoStatus, get_db_session
+import os
+import pickle
+import threading
+import time
+from dotenv import load_dotenv
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp
+from sqlalchemy import String, cast, delete, literal, select, update
+from database.models import Schedule, Video, VideoStatus, engine, get_db_session
+from managers.dispatcher import PollingDispatcher
+from managers.execution_pool import AccountExecutionPool
+from managers.schedule_leases import ScheduleLeases
+from utils.lazy_generation import MATERIALIZER_EXECUTOR, is_unmaterialized, materialize_video
 
+load_dotenv()
 logger = logging.getLogger(__name__)
 
+# "memory" keeps APScheduler jobs in process memory only; "sqlalchemy" also
+# persists them in the app database (table apscheduler_jobs).
+JOBSTORE = os.getenv("SCHEDULER_JOBSTORE", "memory").lower()
+
+# "apscheduler" gives every scheduled post its own APScheduler job. "polling"
+# leaves posts in the schedules table and has a PollingDispatcher claim the
+# due ones in batches, so memory does not grow with the number of planned posts.
+ENGINE = os.getenv("SCHEDULER_ENGINE", "apscheduler").lower()
+
+# On startup, jobs are rebuilt from active Schedule rows in a background
+# thread, in chunks, so the API is up before rehydration finishes.
+REHYDRATE_ON_STARTUP = os.getenv("SCHEDULER_REHYDRATE", "true").lower() in ("1", "true", "yes")
+REHYDRATE_CHUNK_SIZE = int(os.getenv("SCHEDULER_REHYDRATE_CHUNK_SIZE", "5000"))
+
+# What happens to posts whose run time passed while the app was down:
+# "catch_up" runs all of them, "skip" runs only those missed by at most
+# SCHEDULER_MISFIRE_GRACE_SECONDS and deactivates the rest. Catch-up runs are
+# spread SCHEDULER_CATCH_UP_SPACING_SECONDS apart so a long outage does not
+# fire every missed post at once.
+MISFIRE_POLICY = os.getenv("SCHEDULER_MISFIRE_POLICY", "catch_up").lower()
+MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "3600"))
+CATCH_UP_SPACING_SECONDS = float(os.getenv("SCHEDULER_CATCH_UP_SPACING_SECONDS", "1"))
+
+JOB_ID_PREFIX = "video_schedule_"
+LEASE_RECOVERY_JOB_ID = "schedule_lease_recovery"
+
+# Rehydration applies the misfire policy to posts missed while the app was
+# down; the grace time covers jobs that fire late while it is up.
+JOB_DEFAULTS = {"misfire_grace_time": MISFIRE_GRACE_SECONDS, "coalesce": True, "max_instances": 1}
+
+# Jobs written to a persistent job store per statement.
+JOB_INSERT_BATCH_SIZE = 500
+LEASE_RECOVERY_BATCH_SIZE = 100
+
+
+def job_id_for(schedule_id: int) -> str:
+    return f"{JOB_ID_PREFIX}{schedule_id}"
+
+
+def process_scheduled_video(schedule_id: int):
+    """
+    APScheduler job for a scheduled post: queues it on the execution pool.
+
+    A module-level function (rather than a method) so that persistent job
+    stores can serialise a reference to it.
+    """
+    video_scheduler.submit(schedule_id)
+
+
+def recover_expired_leases():
+    """APScheduler job re-running posts whose earlier run lost its lease."""
+    video_scheduler.recover_expired_leases()
+
+
+def post_scheduled_video(schedule_id: int, claimed: bool = False):
+    """
+    Process a scheduled video when its time comes.
+
+    Runs on the execution pool, never concurrently with another post of the
+    same influencer. With `claimed`, the caller holds the schedule's lease and
+    releases it afterwards.
+    """
+    db = get_db_session()
+    video = None
+    try:
+        schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
+        if not schedule or not (schedule.is_active or claimed):
+            logger.warning(f"Schedule {schedule_id} not found or inactive")
+            return
+        
+        video = db.query(Video).filter(Video.id == schedule.video_id).first()
+        if not video:
+            logger.error(f"Video {schedule.video_id} not found for schedule {schedule_id}")
+            return
+
+        if claimed and video.status == VideoStatus.PROCESSING and schedule.attempts > 1:
+            # The previous lease holder died mid-post; posting again could duplicate it.
+            logger.error(f"Video {video.id} was left processing by an expired lease, marking it failed")
+            video.status = VideoStatus.FAILED
+            db.commit()
+            return
+        
+        if video.status != VideoStatus.PENDING:
+            logger.warning(f"Video {video.id} is not in pending status, skipping")
+            return
+        
+        if is_unmaterialized(video):
+            materialize_video(db, video)
+
+        video.status = VideoStatus.PROCESSING
+        db.commit()
+        
+        logger.info(f"Processing video {video.id} for schedule {schedule_id}")
+        
+        # Simulate processing (in real implementation, this would be async)
+        # video_url = generate_video(video)
+        # social_api.post(video)
+        
+        video.status = VideoStatus.POSTED
+        db.commit()
+        
+        logger.info(f"Successfully processed video {video.id}")
+                
+    except Exception as e:
+        logger.error(f"Error processing scheduled video: {e}")
+        if video:
+            video.status = VideoStatus.FAILED
+            db.commit()
+    finally:
+        db.close()
+
+
+def _set_job_ids(schedule_ids: List[int], only_missing: bool = False):
+    """A single UPDATE giving each schedule its job id."""
+    statement = (
+        update(Schedule)
+        .where(Schedule.id.in_(schedule_ids))
+        .values(job_id=literal(JOB_ID_PREFIX).concat(cast(Schedule.id, String)))
+        .execution_options(synchronize_session=False)
+    )
+    if only_missing:
+        statement = statement.where(Schedule.job_id.is_(None))
+    return statement
+
+
 class VideoScheduler:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
+    def __init__(self, jobstore: str = JOBSTORE, engine_name: str = ENGINE):
+        self.engine_name = engine_name
+        self.jobstore = jobstore
+        self._persistent_store = None
+        jobstores = {}
+        if jobstore == "sqlalchemy":
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+
+            self._persistent_store = SQLAlchemyJobStore(engine=engine)
+            jobstores["default"] = self._persistent_store
+        self.scheduler = BackgroundScheduler(
+            jobstores=jobstores,
+            # Post jobs only queue their post on the execution pool, and a
+            # single thread queues them in the order they fall due. The
+            # materializer makes model calls for minutes at a time, so it gets
+            # its own thread instead of holding up due posts.
+            executors={"default": ThreadPoolExecutor(1), MATERIALIZER_EXECUTOR: ThreadPoolExecutor(1)},
+            job_defaults=JOB_DEFAULTS,
+        )
         self.scheduler.start()
-        logger.info("Video scheduler initialized and started")
+        self.pool = AccountExecutionPool()
+        self.leases = ScheduleLeases()
+        self.leases.start()
+        self._rehydration_lock = threading.Lock()
+        self.rehydration: Dict[str, Any] = {"state": "not_started"}
+        self.dispatcher: Optional[PollingDispatcher] = None
+        if self.engine_name == "polling":
+            self.dispatcher = PollingDispatcher(
+                self._run_claimed,
+                self.pool,
+                self.leases,
+                misfire_skip_after=(
+                    timedelta(seconds=MISFIRE_GRACE_SECONDS) if MISFIRE_POLICY == "skip" else None
+                ),
+            )
+            self.dispatcher.start()
+            logger.info("Video scheduler initialized with the polling dispatcher")
+        else:
+            # A post's job fires once. If the process that won its lease dies,
+            # the other processes' jobs have already fired, so posts whose
+            # lease expired are picked up here instead.
+            self.scheduler.add_job(
+                func=recover_expired_leases,
+                trigger="interval",
+                seconds=self.leases.lease_seconds,
+                id=LEASE_RECOVERY_JOB_ID,
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            logger.info(f"Video scheduler initialized and started ({jobstore} job store)")
 
     def schedule_video(self, schedule_id: int, run_at: datetime) -> str:
         """Schedule a video for processing at a specific time."""
-        job_id = f"video_schedule_{schedule_id}"
-        
-        trigger = DateTrigger(run_date=run_at)
-        
-        job = self.scheduler.add_job(
-            func=self.process_scheduled_video,
-            trigger=trigger,
-            args=[schedule_id],
-            id=job_id,
-            replace_existing=True
-        )
-        
+        job_id = job_id_for(schedule_id)
+        if self.dispatcher:
+            # The active Schedule row is the job; the dispatcher finds it when due.
+            if run_at <= datetime.now():
+                self.dispatcher.wakeup()
+            return job_id
+        self._add_job(schedule_id, run_at)
         logger.info(f"Scheduled video job {job_id} at {run_at}")
         return job_id
 
     def process_scheduled_video(self, schedule_id: int):
         """Process a scheduled video when its time comes."""
+        post_scheduled_video(schedule_id)
+
+    def submit(self, schedule_id: int):
+        """
+        Queues a due post on the execution pool under its influencer, so posts
+        of one account run one at a time and in the order they fell due.
+
+        The schedule is leased first, so when several processes fire the same
+        job only one of them runs the post.
+        """
+        if self.leases.claim(schedule_id) is None:
+            logger.info(f"Schedule {schedule_id} is inactive or being run by another process")
+            return
+        self._submit_claimed([schedule_id])
+
+    def recover_expired_leases(self) -> int:
+        """
+        Claims due schedules that were claimed before but whose lease expired
+        (their process died) or was given back after an error, and runs them.
+        Schedules never claimed are left to their own jobs.
+        """
+        rows = self.leases.claim_due(datetime.now(), LEASE_RECOVERY_BATCH_SIZE, retries_only=True)
+        if rows:
+            logger.warning(f"Recovering {len(rows)} schedules whose earlier run lost its lease")
+            self._submit_claimed([schedule_id for schedule_id, _, _, _ in rows])
+        return len(rows)
+
+    def _submit_claimed(self, schedule_ids: List[int]):
+        """Queues leased schedules on the execution pool under their influencers."""
+        db = get_db_session()
+        try:
+            influencers = dict(
+                db.query(Schedule.id, Video.influencer_id)
+                .join(Video, Schedule.video_id == Video.id)
+                .filter(Schedule.id.in_(schedule_ids))
+                .all()
+            )
+        finally:
+            db.close()
+        for schedule_id in schedule_ids:
+            try:
+                self.pool.submit(influencers.get(schedule_id), self._run_claimed, schedule_id)
+            except RuntimeError:
+                self.leases.release(schedule_id, done=False)
+                raise
+
+    def _run_claimed(self, schedule_id: int):
+        """Runs a post whose lease this process holds, then releases the lease."""
+        try:
+            post_scheduled_video(schedule_id, claimed=True)
+        except Exception:
+            self.leases.release(schedule_id, done=False)
+            raise
+        self.leases.release(schedule_id, done=True)
+
+    def rehydrate_in_background(self) -> Optional[threading.Thread]:
+        """Starts `rehydrate` on a daemon thread, unless disabled or already running."""
+        if not REHYDRATE_ON_STARTUP or self.dispatcher:
+            # The polling dispatcher reads the schedules table directly.
+            return None
+        thread = threading.Thread(target=self.rehydrate, name="scheduler-rehydration", daemon=True)
+        thread.start()
+        return thread
+
+    def rehydrate(self, chunk_size: int = REHYDRATE_CHUNK_SIZE):
+        """
+        Rebuilds jobs for every active Schedule row of a pending video.
+
+        Rows are read in id order in chunks, each with a single query. Future
+        jobs that already exist in a persistent job store are left alone. Rows
+        whose run time has passed are handled according to
+        SCHEDULER_MISFIRE_POLICY.
+        Progress is kept in `self.rehydration`.
+        """
+        if not self._rehydration_lock.acquire(blocking=False):
+            logger.info("Scheduler rehydration is already running")
+            return
+        started = time.monotonic()
+        stats = {
+            "state": "running",
+            "rows": 0,
+            "scheduled": 0,
+            "existing": 0,
+            "caught_up": 0,
+            "skipped": 0,
+            "seconds": 0.0,
+        }
+        self.rehydration = stats
+        try:
+            existing = self._persisted_job_ids()
+            now = datetime.now()
+            grace = timedelta(seconds=MISFIRE_GRACE_SECONDS)
+            catch_up_at = now
+            last_id = 0
+            while True:
+                db = get_db_session()
+                try:
+                    rows = (
+                        db.query(Schedule.id, Schedule.run_at)
+                        .join(Video, Video.id == Schedule.video_id)
+                        .filter(Schedule.is_active == True)
+                        .filter(Video.status == VideoStatus.PENDING)
+                        .filter(Schedule.id > last_id)
+                        .order_by(Schedule.id)
+                        .limit(chunk_size)
+                        .all()
+                    )
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+
+                    skipped = []
+                    to_add = []
+                    for schedule_id, run_at in rows:
+                        stats["rows"] += 1
+                        if run_at >= now and job_id_for(schedule_id) in existing:
+                            stats["existing"] += 1
+                            continue
+                        # Missed persisted jobs may already have been dropped by
+                        # APScheduler's own misfire handling, so they are
+                        # always rescheduled here.
+                        if run_at < now:
+                            if MISFIRE_POLICY == "skip" and now - run_at > grace:
+                                skipped.append(schedule_id)
+                                continue
+                            catch_up_at += timedelta(seconds=CATCH_UP_SPACING_SECONDS)
+                            run_at = catch_up_at
+                            stats["caught_up"] += 1
+                        to_add.append((schedule_id, run_at))
+                    self._add_jobs(to_add)
+                    stats["scheduled"] += len(to_add)
+
+                    db.execute(_set_job_ids([schedule_id for schedule_id, _ in rows], only_missing=True))
+                    if skipped:
+                        db.query(Schedule).filter(Schedule.id.in_(skipped)).update(
+                            {Schedule.is_active: False}, synchronize_session=False
+                        )
+                        stats["skipped"] += len(skipped)
+                    db.commit()
+                finally:
+                    db.close()
+            stats["state"] = "done"
+        except Exception as e:
+            stats["state"] = "failed"
+            stats["error"] = str(e)
+            logger.error(f"Scheduler rehydration failed: {e}", exc_info=True)
+        finally:
+            stats["seconds"] = round(time.monotonic() - started, 3)
+            self._rehydration_lock.release()
+        logger.info(
+            f"Rehydrated {stats['scheduled']} scheduled posts from {stats['rows']} schedules "
+            f"in {stats['seconds']}s ({stats['caught_up']} caught up, {stats['skipped']} skipped, "
+            f"{stats['existing']} already in the job store)"
+        )
+
+    def _add_job(self, schedule_id: int, run_at: datetime) -> str:
+        job_id = job_id_for(schedule_id)
+        self.scheduler.add_job(
+            func=process_scheduled_video,
+            trigger=DateTrigger(run_date=run_at),
+            args=[schedule_id],
+            id=job_id,
+            replace_existing=True,
+        )
+        return job_id
+
+    def _add_jobs(self, schedules: List[Tuple[int, datetime]]):
+        """
+        Adds (or replaces) the jobs of many schedules. A persistent store gets
+        them in one transaction of batched INSERTs instead of one INSERT per
+        job; the memory store takes them one by one, which is cheap.
+        """
+        if not schedules:
+            return
+        store = self._persistent_store
+        if store is None:
+            for schedule_id, run_at in schedules:
+                self._add_job(schedule_id, run_at)
+            return
+
+        now = datetime.now(self.scheduler.timezone)
+        rows = []
+        for schedule_id, run_at in schedules:
+            trigger = DateTrigger(run_date=run_at)
+            job = Job(
+                self.scheduler,
+                id=job_id_for(schedule_id),
+                func=process_scheduled_video,
+                trigger=trigger,
+                executor="default",
+                args=(schedule_id,),
+                kwargs={},
+                name=process_scheduled_video.__name__,
+                next_run_time=trigger.get_next_fire_time(None, now),
+                **JOB_DEFAULTS,
+            )
+            rows.append({
+                "id": job.id,
+                "next_run_time": datetime_to_utc_timestamp(job.next_run_time),
+                "job_state": pickle.dumps(job.__getstate__(), store.pickle_protocol),
+            })
+        with store.engine.begin() as connection:
+            for start in range(0, len(rows), JOB_INSERT_BATCH_SIZE):
+                batch = rows[start:start + JOB_INSERT_BATCH_SIZE]
+                # Replaces existing jobs, like add_job(replace_existing=True).
+                connection.execute(delete(store.jobs_t).where(store.jobs_t.c.id.in_([row["id"] for row in batch])))
+                connection.execute(store.jobs_t.insert(), batch)
+        # The scheduler only looks at the store again when woken.
+        self.scheduler.wakeup()
+
+    def _persisted_job_ids(self) -> set:
+        """Ids of the video jobs already in a persistent job store (one query)."""
+        store = self._persistent_store
+        if store is None:
+            return set()
+        with store.engine.connect() as connection:
+            return {
+                job_id
+                for (job_id,) in connection.execute(select(store.jobs_t.c.id))
+                if job_id.startswith(JOB_ID_PREFIX)
+            }
+
+    def schedule_many(self, schedules: Iterable[Tuple[int, datetime]]) -> int:
+        """
+        Schedules many committed Schedule rows at once, given as (id, run_at).
+
+        A persistent job store gets the jobs in one transaction (see
+        `_add_jobs`), and every row's job_id is set with a single UPDATE.
+        Returns how many posts were scheduled.
+        """
+        schedules = list(schedules)
+        if not schedules:
+            return 0
+        if self.dispatcher:
+            if any(run_at <= datetime.now() for _, run_at in schedules):
+                self.dispatcher.wakeup()
+        else:
+            self._add_jobs(schedules)
         db = get_db_session()
         try:
-            schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
-            if not schedule or not schedule.is_active:
-                logger.warning(f"Schedule {schedule_id} not found or inactive")
-                return
-            
-            video = db.query(Video).filter(Video.id == schedule.video_id).first()
-            if not video:
-                logger.error(f"Video {schedule.video_id} not found for schedule {schedule_id}")
-                return
-            
-            if video.status != VideoStatus.PENDING:
-                logger.warning(f"Video {video.id} is not in pending status, skipping")
-                return
-            
-            video.status = VideoStatus.PROCESSING
+            db.execute(_set_job_ids([schedule_id for schedule_id, _ in schedules]))
             db.commit()
-            
-            logger.info(f"Processing video {video.id} for schedule {schedule_id}")
-            
-            # Simulate processing (in real implementation, this would be async)
-            # video_url = generate_video(video)
-            # social_api.post(video)
-            
-            video.status = VideoStatus.POSTED
+        finally:
+            db.close()
+        logger.info(f"Scheduled {len(schedules)} video jobs")
+        return len(schedules)
+
+    def cancel_many(self, schedule_ids: Iterable[int]) -> int:
+        """
+        Cancels the jobs of many schedules and deactivates the rows with a
+        single UPDATE. Returns how many rows were deactivated.
+        """
+        schedule_ids = list(schedule_ids)
+        if not schedule_ids:
+            return 0
+        db = get_db_session()
+        try:
+            cancelled = db.execute(
+                update(Schedule)
+                .where(Schedule.id.in_(schedule_ids))
+                .values(is_active=False, job_id=None, updated_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            ).rowcount
             db.commit()
-            
-            logger.info(f"Successfully processed video {video.id}")
-                    
-        except Exception as e:
-            logger.error(f"Error processing scheduled video: {e}")
-            if video:
-                video.status = VideoStatus.FAILED
-                db.commit()
         finally:
             db.close()
+        self._remove_jobs([job_id_for(schedule_id) for schedule_id in schedule_ids])
+        return cancelled
+
+    def cancel_for_influencer(
+        self,
+        influencer_id: int,
+        after: Optional[datetime] = None,
+        exclude_video_ids: Iterable[int] = (),
+    ) -> List[Tuple[int, int]]:
+        """
+        Cancels an influencer's active schedules of pending videos running
+        after `after` (default: now), with one UPDATE ... RETURNING.
+
+        Returns the cancelled (schedule id, video id) pairs.
+        """
+        pending_videos = select(Video.id).where(Video.influencer_id == influencer_id).where(
+            Video.status == VideoStatus.PENDING
+        )
+        exclude_video_ids = list(exclude_video_ids)
+        if exclude_video_ids:
+            pending_videos = pending_videos.where(Video.id.notin_(exclude_video_ids))
+        db = get_db_session()
+        try:
+            rows = db.execute(
+                update(Schedule)
+                .where(Schedule.video_id.in_(pending_videos.scalar_subquery()))
+                .where(Schedule.is_active == True)
+                .where(Schedule.run_at > (after or datetime.now()))
+                .values(is_active=False, job_id=None, updated_at=datetime.now())
+                .returning(Schedule.id, Schedule.video_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+        finally:
+            db.close()
+        self._remove_jobs([job_id_for(schedule_id) for schedule_id, _ in rows])
+        logger.info(f"Cancelled {len(rows)} scheduled posts of influencer {influencer_id}")
+        return [tuple(row) for row in rows]
+
+    def _remove_jobs(self, job_ids: List[str]):
+        """Removes jobs that may or may not exist: one DELETE for a persistent store."""
+        if self.dispatcher or not job_ids:
+            # Nothing is queued in memory for the polling engine.
+            return
+        store = self._persistent_store
+        if store is not None:
+            with store.engine.begin() as connection:
+                connection.execute(delete(store.jobs_t).where(store.jobs_t.c.id.in_(job_ids)))
+            self.scheduler.wakeup()
+            return
+        for job_id in job_ids:
+            try:
+                self.scheduler.remove_job(job_id)
+            except JobLookupError:
+                pass
 
     def cancel_schedule(self, job_id: str):
         """Cancel a scheduled job."""
+        if self.dispatcher:
+            # Nothing is queued in memory; callers delete or deactivate the row.
+            return
         try:
             self.scheduler.remove_job(job_id)
             logger.info(f"Cancelled job {job_id}")
         except Exception as e:
             logger.error(f"Error cancelling job {job_id}: {e}")
 
+    def status(self) -> Dict[str, Any]:
+        status = {"engine": self.engine_name, "jobstore": self.jobstore, "rehydration": self.rehydration}
+        if self.dispatcher:
+            status["dispatcher"] = self.dispatcher.stats()
+        status["execution"] = self.pool.stats()
+        status["leases"] = self.leases.stats()
+        return status
+
     def shutdown(self):
         """Shutdown the scheduler."""
+        if self.dispatcher:
+            self.dispatcher.shutdown()
         self.scheduler.shutdown()
+        self.pool.shutdown()
+        self.leases.shutdown()
         logger.info("Video scheduler shutdown")
 
 video_scheduler = VideoScheduler()
\ No newline at end of file
@@ -0,0 +1,160 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple
+
+# Paragraphs longer than this are split on sentence boundaries so one long
+# paragraph cannot swallow the whole excerpt budget.
+MAX_CHUNK_TOKENS = 160
+
+# Number of per-influencer indexes kept in memory.
+MAX_CACHED_INDEXES = 512
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset(
+    """a about after again all also am an and any are as at be because been before
+    being both but by can could did do does doing down during each few for from
+    further had has have having he her here hers herself him himself his how i if
+    in into is it its itself just me more most my myself no nor not now of off on
+    once only or other our ours out over own same she should so some such than
+    that the their theirs them themselves then there these they this those
+    through to too under until up very was we were what when where which while
+    who whom why will with would you your yours yourself""".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English prose)."""
+    return (len(text or "") + 3) // 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens without stopwords, with plural 's' stripped."""
+    tokens = []
+    for word in _WORD_RE.findall((text or "").lower()):
+        word = word.strip("'")
+        if not word or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def chunk_story(text: str) -> List[str]:
+    """Splits a life story into paragraph chunks of bounded size."""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= MAX_CHUNK_TOKENS:
+            chunks.append(paragraph)
+            continue
+        current = ""
+        for sentence in _SENTENCE_RE.split(paragraph):
+            candidate = f"{current} {sentence}".strip()
+            if current and estimate_tokens(candidate) > MAX_CHUNK_TOKENS:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = candidate
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of text chunks."""
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(chunks)) if chunks else 0.0
+        document_freqs: Counter = Counter()
+        for tf in self._term_freqs:
+            document_freqs.update(tf.keys())
+        n = len(chunks)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_freqs.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        scores = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self._avg_length or 1.0))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def select(self, query: str, token_budget: int) -> List[str]:
+        """
+        The highest-scoring chunks that fit in `token_budget`, in story order.
+
+        Chunks that share no terms with the query are only used to fill budget
+        left over after all matching chunks.
+        """
+        scores = self.scores(query)
+        ranked = sorted(range(len(self.chunks)), key=lambda i: (-scores[i], i))
+        chosen = []
+        remaining = token_budget
+        for i in ranked:
+            cost = estimate_tokens(self.chunks[i])
+            if cost <= remaining:
+                chosen.append(i)
+                remaining -= cost
+        return [self.chunks[i] for i in sorted(chosen)]
+
+
+class StoryRetriever:
+    """
+    Per-influencer BM25 indexes over life-story chunks.
+
+    An index is built on first use and rebuilt whenever the influencer's
+    `life_story` text changes. Everything runs locally; there is no embedding
+    service involved.
+    """
+
+    def __init__(self, max_indexes: int = MAX_CACHED_INDEXES):
+        self.max_indexes = max_indexes
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[int, Tuple[str, BM25Index]]" = OrderedDict()
+
+    def index_for(self, influencer_id: int, life_story: str) -> BM25Index:
+        digest = hashlib.sha1((life_story or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._indexes.get(influencer_id)
+            if cached and cached[0] == digest:
+                self._indexes.move_to_end(influencer_id)
+                return cached[1]
+
+        index = BM25Index(chunk_story(life_story))
+        with self._lock:
+            self._indexes[influencer_id] = (digest, index)
+            self._indexes.move_to_end(influencer_id)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def relevant_excerpts(
+        self, influencer, query: Optional[str], token_budget: int
+    ) -> List[str]:
+        """Life-story chunks most relevant to `query`, within `token_budget` tokens."""
+        index = self.index_for(influencer.id, influencer.life_story or "")
+        return index.select(query or "", token_budget)
+
+
+story_retriever = StoryRetriever()
@@ -0,0 +1,167 @@
+import copy
+import json
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+
+class StructuredOutputError(Exception):
+    """Raised when a model response does not contain a valid structured output."""
+
+    def __init__(self, message: str, data: Any = None):
+        super().__init__(message)
+        self.data = data
+
+
+def _inline_refs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolves pydantic's `$defs`/`$ref` so the tool schema is self-contained."""
+    definitions = schema.get("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                name = node["$ref"].rsplit("/", 1)[-1]
+                return resolve(copy.deepcopy(definitions[name]))
+            return {key: resolve(value) for key, value in node.items() if key != "$defs"}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+
+    return resolve(schema)
+
+
+class StructuredOutput:
+    """
+    A tool-use output contract built from a pydantic model.
+
+    The model is forced to answer by calling the tool, so its reply arrives as
+    schema-shaped JSON instead of free text. For list outputs, `items_field`
+    names the list on the model and each element is validated on its own, so
+    one bad item does not discard the rest.
+    """
+
+    def __init__(
+        self,
+        tool_name: str,
+        description: str,
+        model: Type[BaseModel],
+        items_field: Optional[str] = None,
+    ):
+        self.tool_name = tool_name
+        self.description = description
+        self.model = model
+        self.items_field = items_field
+        self.item_model: Optional[Type[BaseModel]] = None
+        self._definition: Optional[Dict[str, Any]] = None
+        if items_field:
+            self.item_model = model.model_fields[items_field].annotation.__args__[0]
+
+    def tool_definition(self) -> Dict[str, Any]:
+        if self._definition is None:
+            self._definition = {
+                "name": self.tool_name,
+                "description": self.description,
+                "input_schema": _inline_refs(self.model.model_json_schema()),
+            }
+        return self._definition
+
+    def tool_params(self, toolset: Optional[List["StructuredOutput"]] = None) -> Dict[str, Any]:
+        """
+        `tools` and `tool_choice` parameters that force this output.
+
+        Requests that share a cached prompt prefix should pass the same
+        `toolset`, since tool definitions are part of that prefix; only the
+        forced `tool_choice` then differs between them.
+        """
+        return {
+            "tools": [output.tool_definition() for output in (toolset or [self])],
+            "tool_choice": {"type": "tool", "name": self.tool_name},
+        }
+
+    def tool_use(self, response: Any) -> Optional[Any]:
+        """The tool_use block for this output in a response, if there is one."""
+        for block in getattr(response, "content", None) or []:
+            if getattr(block, "type", None) == "tool_use" and block.name == self.tool_name:
+                return block
+        return None
+
+    def validate(self, data: Any) -> BaseModel:
+        """Validates a single-object output."""
+        try:
+            return self.model.model_validate(data)
+        except ValidationError as e:
+            raise StructuredOutputError(f"{self.tool_name} output is invalid: {e}", data)
+
+    def validate_items(self, data: Any) -> Tuple[List[BaseModel], List[Tuple[Any, str]]]:
+        """Validates each element of a list output; returns (valid, [(raw, error), ...])."""
+        raw_items = data.get(self.items_field) if isinstance(data, dict) else None
+        if not isinstance(raw_items, list):
+            raise StructuredOutputError(
+                f"{self.tool_name} output has no '{self.items_field}' list", data
+            )
+        valid, invalid = [], []
+        for raw in raw_items:
+            try:
+                valid.append(self.validate_item(raw))
+            except StructuredOutputError as e:
+                invalid.append((raw, str(e)))
+        return valid, invalid
+
+    def validate_item(self, raw: Any) -> BaseModel:
+        """Validates one element of a list output, e.g. one parsed from a stream."""
+        try:
+            return self.item_model.model_validate(raw)
+        except ValidationError as e:
+            raise StructuredOutputError(_error_summary(e), raw)
+
+    def repair_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        tool_use: Any,
+        problems: str,
+    ) -> List[Dict[str, Any]]:
+        """Continues a conversation by returning the validation errors as a failed tool result."""
+        return messages + [
+            {
+                "role": "assistant",
+                "content": [
+                    {
+                        "type": "tool_use",
+                        "id": tool_use.id,
+                        "name": tool_use.name,
+                        "input": tool_use.input,
+                    }
+                ],
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": tool_use.id,
+                        "is_error": True,
+                        "content": problems,
+                    }
+                ],
+            },
+        ]
+
+    def item_repair_prompt(self, invalid: List[Tuple[Any, str]]) -> str:
+        details = json.dumps(
+            [{"item": raw, "error": error} for raw, error in invalid], indent=2, default=str
+        )
+        return (
+            f"{len(invalid)} of the submitted {self.items_field} failed validation. "
+            f"Call {self.tool_name} again with corrected versions of ONLY these "
+            f"{self.items_field}; the others were accepted.\n{details}"
+        )
+
+    def object_repair_prompt(self, error: str) -> str:
+        return f"The submitted output failed validation. Call {self.tool_name} again with a corrected, complete output.\n{error}"
+
+
+def _error_summary(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'item'}: {e['msg']}"
+        for e in error.errors()
+    )
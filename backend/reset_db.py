@@ -10,6 +10,10 @@ from database.models import Base, engine, DATABASE_URL
 # We need to parse this to get the file path for os.remove
 db_path = DATABASE_URL.split("///")[-1]
 
+# Importing the models already opened the old database; drop those connections
+# so the new schema is written to the new file.
+engine.dispose()
+
 if os.path.exists(db_path):
     os.remove(db_path)
     print(f"✓ Deleted old database: {db_path}")
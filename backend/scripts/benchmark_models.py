@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark model routes against recorded prompts.
+
+Record real traffic first by starting the backend with
+AI_RECORD_PROMPTS_PATH=./storage/prompts.jsonl, then replay it against each
+task's models:
+
+    python scripts/benchmark_models.py --prompts storage/prompts.jsonl
+    python scripts/benchmark_models.py --prompts storage/prompts.jsonl \\
+        --route caption=claude-3-5-haiku-20241022,claude-3-5-sonnet-20241022
+
+Reports latency percentiles, throughput and output-validity rate per
+(task, model). Outputs are valid when the forced tool call passes schema
+validation (or, for free-text tasks, when there is non-empty text) and the
+response was not cut off at max_tokens.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.ai_generator import (  # noqa: E402
+    CAPTION_OUTPUT,
+    CONTENT_PLAN_OUTPUT,
+    POST_BATCH_OUTPUT,
+    POST_OUTPUT,
+    SCENE_PROMPT_OUTPUT,
+    ai_generator,
+)
+from managers.llm_metrics import percentiles  # noqa: E402
+from managers.model_router import model_router  # noqa: E402
+from managers.prompt_recorder import RECORD_PROMPTS_PATH, load_recorded_prompts  # noqa: E402
+from managers.rate_limiter import rate_limiter  # noqa: E402
+from managers.structured_output import StructuredOutputError  # noqa: E402
+
+STRUCTURED_OUTPUTS = {
+    "generate_reel_content_plan": CONTENT_PLAN_OUTPUT,
+    "generate_story_content_plan": CONTENT_PLAN_OUTPUT,
+    "generate_scene_prompt": SCENE_PROMPT_OUTPUT,
+    "generate_caption": CAPTION_OUTPUT,
+    "generate_post_content": POST_OUTPUT,
+    "generate_post_content_batch": POST_BATCH_OUTPUT,
+}
+
+
+def is_repair_request(params: Dict[str, Any]) -> bool:
+    """Repair turns replay a conversation, not an original prompt."""
+    last = (params.get("messages") or [{}])[-1].get("content")
+    return isinstance(last, list) and any(
+        isinstance(block, dict) and block.get("type") == "tool_result" for block in last
+    )
+
+
+def is_valid(method: str, response: Any) -> bool:
+    if getattr(response, "stop_reason", None) == "max_tokens":
+        return False
+    output = STRUCTURED_OUTPUTS.get(method)
+    if output is None:
+        return any(getattr(block, "text", "").strip() for block in response.content)
+    tool_use = output.tool_use(response)
+    if tool_use is None:
+        return False
+    try:
+        if output.items_field:
+            valid, invalid = output.validate_items(tool_use.input)
+            return bool(valid) and not invalid
+        output.validate(tool_use.input)
+        return True
+    except StructuredOutputError:
+        return False
+
+
+def run_one(method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def send():
+        started = time.perf_counter()
+        response = ai_generator.client.messages.create(**params)
+        return response, time.perf_counter() - started
+
+    try:
+        (response, latency), retries = rate_limiter.run(
+            send, None, rate_limiter.estimate_tokens(params)
+        )
+    except Exception as e:
+        return {"error": str(e)}
+    return {
+        "latency": latency,
+        "retries": retries,
+        "output_tokens": response.usage.output_tokens,
+        "valid": is_valid(method, response),
+    }
+
+
+def benchmark(
+    prompts: List[Dict[str, Any]], model: str, concurrency: int
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda record: run_one(record["method"], {**record["params"], "model": model}),
+                prompts,
+            )
+        )
+    wall_time = time.perf_counter() - started
+
+    succeeded = [r for r in results if "error" not in r]
+    output_tokens = sum(r["output_tokens"] for r in succeeded)
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "retries": sum(r["retries"] for r in succeeded),
+        "validity_rate": (
+            sum(r["valid"] for r in succeeded) / len(results) if results else 0.0
+        ),
+        "latency_seconds": percentiles([r["latency"] for r in succeeded]),
+        "requests_per_second": round(len(results) / wall_time, 3) if wall_time else 0.0,
+        "output_tokens_per_second": round(output_tokens / wall_time, 1) if wall_time else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model routes against recorded prompts.")
+    parser.add_argument("--prompts", default=RECORD_PROMPTS_PATH, help="JSON-lines file written by the prompt recorder.")
+    parser.add_argument("--task", action="append", help="Only benchmark these tasks.")
+    parser.add_argument(
+        "--route",
+        action="append",
+        default=[],
+        help="Models to compare for a task, as task=model1,model2 (default: the configured route).",
+    )
+    parser.add_argument("--limit", type=int, default=50, help="Prompts per task.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    if not args.prompts:
+        parser.error("--prompts is required when AI_RECORD_PROMPTS_PATH is not set")
+    if not ai_generator.client:
+        parser.error("ANTHROPIC_API_KEY is not configured")
+
+    routes = {task: list(models) for task, models in model_router.routes.items()}
+    for route in args.route:
+        task, _, models = route.partition("=")
+        routes[task] = [m.strip() for m in models.split(",") if m.strip()]
+
+    by_task: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for record in load_recorded_prompts(args.prompts):
+        if is_repair_request(record["params"]):
+            continue
+        task = model_router.task_for(record["method"])
+        if (not args.task or task in args.task) and len(by_task[task]) < args.limit:
+            by_task[task].append(record)
+
+    report = {}
+    for task, prompts in sorted(by_task.items()):
+        for model in routes.get(task, []):
+            print(f"Benchmarking {task} on {model} ({len(prompts)} prompts)...", file=sys.stderr)
+            report.setdefault(task, {})[model] = benchmark(prompts, model, args.concurrency)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'task':<14} {'model':<30} {'n':>4} {'err':>4} {'valid':>6} {'p50 s':>7} {'p95 s':>7} {'req/s':>7} {'tok/s':>7}")
+    for task, models in report.items():
+        for model, r in models.items():
+            latency = r["latency_seconds"]
+            print(
+                f"{task:<14} {model:<30} {r['requests']:>4} {r['errors']:>4} "
+                f"{r['validity_rate']:>6.1%} {latency.get('p50', 0):>7.2f} {latency.get('p95', 0):>7.2f} "
+                f"{r['requests_per_second']:>7.2f} {r['output_tokens_per_second']:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
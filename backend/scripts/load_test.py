@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end load test of the content pipeline.
+
+Runs the real scheduling code paths (planning, parsing, database writes and
+job scheduling) against the fake LLM backend and a throwaway database, then
+reports throughput, latency, retries and fallbacks:
+
+    python scripts/load_test.py --influencers 20 --workload interval
+    python scripts/load_test.py --workload life-story --latency-ms 1200 --rate-limit-rate 0.05
+    python scripts/load_test.py --workload all --server-rpm 200 --rpm 150
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKLOADS = ["interval", "life-story", "dated"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the content pipeline against the fake LLM backend.")
+    parser.add_argument("--influencers", type=int, default=10)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--workload", choices=WORKLOADS + ["all"], default="all")
+    parser.add_argument("--concurrency", type=int, default=4, help="Influencers processed in parallel.")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Median fake response latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--ms-per-token", type=float, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 500/529 responses.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of 429 responses.")
+    parser.add_argument("--server-rpm", type=int, default=0, help="Emulated server-side request limit.")
+    parser.add_argument("--rpm", type=int, help="Client rate limiter RPM (0 = unlimited, default from env).")
+    parser.add_argument("--tpm", type=int, help="Client rate limiter TPM (0 = unlimited, default from env).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp directory.")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Settings are read at import time, so they must be in place before the app modules load."""
+    os.environ["AI_BACKEND"] = "fake"
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='aifluence-load-'), 'load.db')}"
+    )
+    os.environ["AI_CACHE_METHODS"] = ""
+    os.environ["AI_FAKE_LLM_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["AI_FAKE_LLM_LATENCY_SIGMA"] = str(args.latency_sigma)
+    os.environ["AI_FAKE_LLM_MS_PER_TOKEN"] = str(args.ms_per_token)
+    os.environ["AI_FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["AI_FAKE_LLM_RATE_LIMIT_RATE"] = str(args.rate_limit_rate)
+    os.environ["AI_FAKE_LLM_RPM"] = str(args.server_rpm)
+    os.environ["AI_FAKE_LLM_SEED"] = str(args.seed)
+    if args.rpm is not None:
+        os.environ["AI_RATE_LIMIT_RPM"] = str(args.rpm)
+    if args.tpm is not None:
+        os.environ["AI_RATE_LIMIT_TPM"] = str(args.tpm)
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+
+    from database.models import (
+        Base, engine, get_db_session, Influencer, InfluencerMode, Video, Schedule,
+    )
+    from managers.ai_generator import ai_generator
+    from managers.llm_metrics import llm_metrics
+    from managers.rate_limiter import rate_limiter
+    from managers.scheduler import video_scheduler
+    from utils.background_tasks import (
+        plan_and_schedule_from_life_story,
+        process_dated_schedule,
+        process_interval_schedule,
+    )
+
+    Base.metadata.create_all(bind=engine)
+    print(f"Database: {os.environ['DATABASE_URL']}")
+
+    db = get_db_session()
+    influencer_ids = []
+    for n in range(args.influencers):
+        persona = {
+            "background": f"Load test influencer {n}, a designer who loves city walks.",
+            "goals": ["share daily life", "grow a community"],
+            "tone": "casual",
+        }
+        influencer = Influencer(
+            name=f"Load Test {n}",
+            persona=persona,
+            mode=InfluencerMode.LIFESTYLE,
+            audience_targeting={"interests": ["design", "city life"]},
+            life_story=ai_generator.generate_life_story(f"Load Test {n}", persona),
+        )
+        db.add(influencer)
+        db.commit()
+        influencer_ids.append(influencer.id)
+    db.close()
+
+    def dated_posts():
+        start = datetime.now() + timedelta(hours=1)
+        return [
+            {
+                "post_datetime": (start + timedelta(days=day)).isoformat(),
+                "content_type": "reel" if day % 3 == 0 else "story",
+                "prompt": f"Day {day + 1} of the week's routine.",
+            }
+            for day in range(args.days)
+        ]
+
+    runners = {
+        "interval": lambda i: process_interval_schedule(i, args.days, 48, 12),
+        "life-story": lambda i: plan_and_schedule_from_life_story(i, days_to_plan=args.days),
+        "dated": lambda i: process_dated_schedule(i, dated_posts()),
+    }
+
+    try:
+        for workload in (WORKLOADS if args.workload == "all" else [args.workload]):
+            llm_metrics.reset()
+            db = get_db_session()
+            before = db.query(Video).count()
+            db.close()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                list(executor.map(runners[workload], influencer_ids))
+            wall_time = time.perf_counter() - started
+
+            db = get_db_session()
+            created = db.query(Video).count() - before
+            unscheduled = (
+                db.query(Schedule).filter(Schedule.job_id.is_(None)).count()
+            )
+            db.close()
+            report(workload, wall_time, created, unscheduled, llm_metrics.summary())
+        print(f"\nRate limiter: {rate_limiter.stats()}")
+    finally:
+        video_scheduler.shutdown()
+
+
+def report(workload, wall_time, created, unscheduled, metrics):
+    print(f"\n=== {workload} ===")
+    print(
+        f"{created} posts in {wall_time:.1f}s ({created / wall_time:.2f} posts/s), "
+        f"{unscheduled} schedules without a job"
+    )
+    print(f"{'method':<30} {'calls':>6} {'reqs':>6} {'retry':>6} {'fallbk':>6} {'invalid':>7} {'p50 s':>7} {'p95 s':>7}")
+    for method, m in sorted(metrics["methods"].items()):
+        latency = m["latency_seconds"]
+        print(
+            f"{method:<30} {m['calls']:>6} {m['requests']:>6} {m['retries']:>6} "
+            f"{m['fallbacks']:>6} {m['items_invalid']:>7} "
+            f"{latency.get('p50', 0):>7.2f} {latency.get('p95', 0):>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
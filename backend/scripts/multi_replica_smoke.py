@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Multi-process smoke test of scheduled post dispatch.
+
+Seeds a throwaway database with due posts, starts several scheduler
+processes against it and checks that every post ran exactly once:
+
+    python scripts/multi_replica_smoke.py --replicas 4 --posts 300
+    python scripts/multi_replica_smoke.py --engine apscheduler
+    python scripts/multi_replica_smoke.py --kill-after 3 --lease-seconds 4
+
+With --kill-after, one replica is killed mid-run; the posts it had leased are
+picked up by the others once their leases expire.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run several scheduler processes against one database.")
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--influencers", type=int, default=10)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--spread-seconds", type=float, default=5, help="Posts fall due over this period.")
+    parser.add_argument("--engine", choices=["polling", "apscheduler"], default="polling")
+    parser.add_argument("--workers", type=int, default=4, help="Execution pool size per replica.")
+    parser.add_argument("--lease-seconds", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Fake LLM latency when a post is generated.")
+    parser.add_argument("--kill-after", type=float, help="Kill one replica this many seconds in.")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp directory.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Settings are read at import time, so they must be in place before the app modules load."""
+    os.environ["AI_BACKEND"] = "fake"
+    os.environ["AI_CACHE_METHODS"] = ""
+    os.environ["AI_FAKE_LLM_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["AI_FAKE_LLM_MS_PER_TOKEN"] = "0"
+    os.environ["SCHEDULER_ENGINE"] = args.engine
+    os.environ["SCHEDULER_WORKERS"] = str(args.workers)
+    os.environ["SCHEDULER_LEASE_SECONDS"] = str(args.lease_seconds)
+    os.environ["SCHEDULER_POLL_INTERVAL_SECONDS"] = "0.5"
+    # Posts may fall due before a replica has started; run them all right away.
+    os.environ["SCHEDULER_CATCH_UP_SPACING_SECONDS"] = "0"
+    os.environ["DATABASE_URL"] = args.database_url or os.environ.get("DATABASE_URL") or (
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='aifluence-replicas-'), 'replicas.db')}"
+    )
+
+
+def run_worker(args):
+    """One replica: dispatches posts until none are active, then prints its stats."""
+    from database.models import Schedule, get_db_session
+    from managers.scheduler import video_scheduler
+
+    if args.engine == "apscheduler":
+        video_scheduler.rehydrate()
+
+    deadline = time.monotonic() + args.timeout
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            db = get_db_session()
+            try:
+                remaining = db.query(Schedule).filter(Schedule.is_active == True).count()
+            finally:
+                db.close()
+            if remaining == 0:
+                break
+    finally:
+        status = video_scheduler.status()
+        video_scheduler.shutdown()
+    print(json.dumps({"leases": status["leases"], "completed": sum(
+        account["completed"] for account in status["execution"]["accounts"].values()
+    )}))
+
+
+def seed(args):
+    from database.models import Base, engine, get_db_session, Influencer, InfluencerMode, Video, Schedule
+
+    Base.metadata.create_all(bind=engine)
+    db = get_db_session()
+    try:
+        influencers = []
+        for n in range(args.influencers):
+            influencer = Influencer(
+                name=f"Replica Test {n}",
+                persona={"background": f"Replica test influencer {n}", "tone": "casual"},
+                mode=InfluencerMode.LIFESTYLE,
+            )
+            db.add(influencer)
+            influencers.append(influencer)
+        db.flush()
+
+        start = datetime.now() + timedelta(seconds=2)
+        for n in range(args.posts):
+            run_at = start + timedelta(seconds=args.spread_seconds * n / max(1, args.posts))
+            # Planned but not generated, so each run makes a (fake) model call.
+            video = Video(
+                influencer_id=influencers[n % len(influencers)].id,
+                scheduled_time=run_at,
+                content_type="story",
+                post_context=f"Post {n}: an afternoon walk through the city.",
+            )
+            db.add(video)
+            db.flush()
+            db.add(Schedule(video_id=video.id, run_at=run_at))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    if args.worker:
+        run_worker(args)
+        return
+
+    seed(args)
+    print(f"Database: {os.environ['DATABASE_URL']}")
+    print(f"{args.posts} posts, {args.replicas} {args.engine} replicas")
+
+    command = [sys.executable, os.path.abspath(__file__), "--worker"] + [
+        arg for arg in sys.argv[1:] if arg != "--worker"
+    ]
+    started = time.monotonic()
+    replicas = [
+        subprocess.Popen(command, env=os.environ.copy(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(args.replicas)
+    ]
+    killed = None
+    if args.kill_after is not None:
+        time.sleep(args.kill_after)
+        killed = replicas[0]
+        killed.send_signal(signal.SIGKILL)
+        print(f"Killed replica 0 after {args.kill_after}s")
+
+    for n, replica in enumerate(replicas):
+        output, _ = replica.communicate(timeout=args.timeout + 30)
+        if replica is killed:
+            continue
+        lines = output.strip().splitlines()
+        stats = json.loads(lines[-1]) if lines else {}
+        leases = stats.get("leases", {})
+        print(
+            f"replica {n}: claimed {leases.get('claimed', 0)}, completed {stats.get('completed', 0)}, "
+            f"lost {leases.get('lost', 0)}, abandoned {leases.get('abandoned', 0)}"
+        )
+    wall_time = time.monotonic() - started
+
+    from sqlalchemy import func
+    from database.models import Schedule, Video, VideoStatus, get_db_session
+
+    db = get_db_session()
+    try:
+        statuses = dict(db.query(Video.status, func.count(Video.id)).group_by(Video.status).all())
+        attempts = dict(db.query(Schedule.attempts, func.count(Schedule.id)).group_by(Schedule.attempts).all())
+        active = db.query(Schedule).filter(Schedule.is_active == True).count()
+    finally:
+        db.close()
+
+    posted = statuses.get(VideoStatus.POSTED, 0)
+    print(f"\n{posted}/{args.posts} posted in {wall_time:.1f}s")
+    print(f"Video statuses: { {status.value: count for status, count in statuses.items()} }")
+    print(f"Claims per schedule: {attempts}")
+    print(f"Schedules still active: {active}")
+
+    reclaimed = sum(count for attempt, count in attempts.items() if attempt > 1)
+    ok = active == 0 and posted + statuses.get(VideoStatus.FAILED, 0) == args.posts
+    if killed is None:
+        ok = ok and posted == args.posts and reclaimed == 0
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
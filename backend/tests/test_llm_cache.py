@@ -0,0 +1,106 @@
+"""
+Response cache on the content generator's request path, against the fake LLM backend:
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# Settings are read at import time, so they must be in place before the app modules load.
+os.environ["AI_BACKEND"] = "fake"
+os.environ["AI_CACHE_METHODS"] = ""
+os.environ["AI_FAKE_LLM_LATENCY_MS"] = "0"
+os.environ["AI_FAKE_LLM_MS_PER_TOKEN"] = "0"
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='aifluence-tests-'), 'tests.db')}",
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anthropic.types import Message  # noqa: E402
+
+from managers.ai_generator import ai_generator  # noqa: E402
+from managers.llm_cache import DEFAULT_CACHED_METHODS, LLMResponseCache  # noqa: E402
+
+INFLUENCER = SimpleNamespace(
+    id=1,
+    name="Cache Test",
+    persona={"background": "Cache test influencer", "tone": "casual"},
+    audience_targeting=None,
+    life_story="Grew up by the sea and now runs a small bakery.",
+)
+ITEMS = [
+    {"id": 1, "day": 1, "content_type": "story", "post_context": "Morning bake"},
+    {"id": 2, "day": 2, "content_type": "reel", "post_context": "Beach run"},
+]
+
+
+def review():
+    return ai_generator.review_content_plan(INFLUENCER, "Moved to the mountains.", "Relocation", ITEMS)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        methods = {m.strip() for m in DEFAULT_CACHED_METHODS.split(",") if m.strip()}
+        self.cache = LLMResponseCache(
+            path=os.path.join(tempfile.mkdtemp(prefix="aifluence-cache-"), "cache.db"),
+            methods=methods,
+        )
+        patcher = mock.patch.object(ai_generator, "response_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_method_is_served_from_cache(self):
+        with mock.patch.object(
+            ai_generator.client.messages, "create", wraps=ai_generator.client.messages.create
+        ) as create:
+            first = review()
+            second = review()
+
+        self.assertEqual(first, second)
+        self.assertEqual(create.call_count, 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["methods"]["review_content_plan"]["hits"], 1)
+
+    def test_streamed_plan_is_served_from_cache(self):
+        self.cache.methods = {"generate_reel_content_plan"}
+        with mock.patch.object(
+            ai_generator.client.messages, "stream", wraps=ai_generator.client.messages.stream
+        ) as stream:
+            first = list(ai_generator.stream_reel_content_plan(INFLUENCER, 30))
+            second = list(ai_generator.stream_reel_content_plan(INFLUENCER, 30))
+
+        self.assertTrue(first)
+        self.assertEqual(first, second)
+        self.assertEqual(stream.call_count, 1)
+        self.assertEqual(self.cache.stats()["methods"]["generate_reel_content_plan"]["hits"], 1)
+
+    def test_reply_without_tool_call_is_not_cached(self):
+        text_only = Message.model_validate(
+            {
+                "id": "msg_text_only",
+                "type": "message",
+                "role": "assistant",
+                "model": "fake",
+                "content": [{"type": "text", "text": "All posts look fine."}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": 10, "output_tokens": 5},
+            }
+        )
+        with mock.patch.object(ai_generator.client.messages, "create", return_value=text_only) as create:
+            self.assertIsNone(review())
+            self.assertIsNone(review())
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Schedule lease expiry and reclaiming, against a throwaway SQLite database:
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+# Settings are read at import time, so they must be in place before the app modules load.
+os.environ["AI_BACKEND"] = "fake"
+os.environ["AI_CACHE_METHODS"] = ""
+os.environ["SCHEDULER_ENGINE"] = "apscheduler"
+os.environ["SCHEDULER_REHYDRATE"] = "false"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='aifluence-tests-'), 'tests.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Influencer, InfluencerMode, Schedule, Video, VideoStatus, get_db_session  # noqa: E402
+from managers.schedule_leases import ScheduleLeases  # noqa: E402
+
+LEASE_SECONDS = 0.2
+
+
+def create_due_post():
+    """A pending post with an active schedule that is already due; returns (schedule id, video id)."""
+    db = get_db_session()
+    try:
+        influencer = Influencer(
+            name="Lease Test",
+            persona={"background": "Lease test influencer", "tone": "casual"},
+            mode=InfluencerMode.LIFESTYLE,
+        )
+        db.add(influencer)
+        db.flush()
+        video = Video(
+            influencer_id=influencer.id,
+            scheduled_time=datetime.now() - timedelta(seconds=1),
+            content_type="story",
+            caption="Afternoon walk",
+        )
+        db.add(video)
+        db.flush()
+        schedule = Schedule(video_id=video.id, run_at=video.scheduled_time)
+        db.add(schedule)
+        db.commit()
+        return schedule.id, video.id
+    finally:
+        db.close()
+
+
+def load(schedule_id, video_id):
+    db = get_db_session()
+    try:
+        return (
+            db.query(Schedule).filter(Schedule.id == schedule_id).one(),
+            db.query(Video).filter(Video.id == video_id).one(),
+        )
+    finally:
+        db.close()
+
+
+class ScheduleLeaseTest(unittest.TestCase):
+    def test_expired_lease_is_reclaimed(self):
+        schedule_id, video_id = create_due_post()
+        dead = ScheduleLeases(owner="dead", lease_seconds=LEASE_SECONDS)
+        live = ScheduleLeases(owner="live", lease_seconds=LEASE_SECONDS)
+
+        first = dead.claim(schedule_id)
+        self.assertIsNotNone(first)
+        self.assertEqual(first[3], 1)
+        self.assertIsNone(live.claim(schedule_id), "a held lease must not be claimed")
+
+        time.sleep(LEASE_SECONDS * 1.5)
+        rows = live.claim_due(datetime.now(), 10, retries_only=True)
+        self.assertEqual([(row[0], row[3]) for row in rows], [(schedule_id, 2)])
+
+        schedule, _ = load(schedule_id, video_id)
+        self.assertEqual((schedule.lease_owner, schedule.attempts), ("live", 2))
+        # The old owner finds out when it next renews.
+        self.assertEqual(dead.renew(), 0)
+        self.assertEqual(dead.stats()["lost"], 1)
+
+        live.release(schedule_id, done=True)
+        schedule, _ = load(schedule_id, video_id)
+        self.assertFalse(schedule.is_active)
+        self.assertIsNone(schedule.lease_owner)
+
+    def test_never_claimed_schedule_is_not_a_retry(self):
+        schedule_id, _ = create_due_post()
+        leases = ScheduleLeases(owner="live", lease_seconds=LEASE_SECONDS)
+        claimed = [row[0] for row in leases.claim_due(datetime.now(), 100, retries_only=True)]
+        self.assertNotIn(schedule_id, claimed)
+
+    def test_abandoned_after_max_attempts_fails_the_video(self):
+        schedule_id, video_id = create_due_post()
+        for attempt in range(1, 3):
+            leases = ScheduleLeases(owner=f"dead-{attempt}", lease_seconds=LEASE_SECONDS, max_attempts=2)
+            self.assertEqual(leases.claim(schedule_id)[3], attempt)
+            time.sleep(LEASE_SECONDS * 1.5)
+
+        last = ScheduleLeases(owner="last", lease_seconds=LEASE_SECONDS, max_attempts=2)
+        self.assertIsNone(last.claim(schedule_id))
+        self.assertEqual(last.stats()["abandoned"], 1)
+
+        schedule, video = load(schedule_id, video_id)
+        self.assertFalse(schedule.is_active)
+        self.assertEqual(schedule.attempts, 3)
+        self.assertIsNone(schedule.lease_owner)
+        self.assertEqual(video.status, VideoStatus.FAILED)
+
+    def test_apscheduler_engine_recovers_expired_lease(self):
+        from managers.scheduler import video_scheduler
+
+        schedule_id, video_id = create_due_post()
+        # Another process claimed the post when its job fired, then died.
+        ScheduleLeases(owner="dead", lease_seconds=LEASE_SECONDS).claim(schedule_id)
+        time.sleep(LEASE_SECONDS * 1.5)
+
+        # The recovery job may already have run; either way the post runs once more.
+        video_scheduler.recover_expired_leases()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            schedule, video = load(schedule_id, video_id)
+            if not schedule.is_active:
+                break
+            time.sleep(0.05)
+
+        self.assertFalse(schedule.is_active)
+        self.assertEqual(schedule.attempts, 2)
+        self.assertEqual(video.status, VideoStatus.POSTED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Streamed generations that the consumer stops reading halfway, against the fake LLM backend:
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# Settings are read at import time, so they must be in place before the app modules load.
+os.environ["AI_BACKEND"] = "fake"
+os.environ["AI_CACHE_METHODS"] = ""
+os.environ["AI_FAKE_LLM_LATENCY_MS"] = "0"
+os.environ["AI_FAKE_LLM_MS_PER_TOKEN"] = "0"
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='aifluence-tests-'), 'tests.db')}",
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from anthropic import APIConnectionError  # noqa: E402
+
+from managers.ai_generator import ai_generator  # noqa: E402
+from managers.circuit_breaker import CircuitBreaker  # noqa: E402
+from managers.model_router import HAIKU, SONNET, ModelRouter  # noqa: E402
+from managers.rate_limiter import rate_limiter  # noqa: E402
+
+INFLUENCER = SimpleNamespace(
+    id=1,
+    name="Stream Test",
+    persona={"background": "Stream test influencer", "tone": "casual"},
+    audience_targeting=None,
+    life_story="Grew up by the sea and now runs a small bakery.",
+)
+
+
+class ClosedStreamTest(unittest.TestCase):
+    def setUp(self):
+        # Every request is a half-open probe: one failure opens the circuit and
+        # the next check lets a single request through.
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        patcher = mock.patch("managers.ai_generator.circuit_breaker", self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settle = mock.patch.object(rate_limiter, "settle", wraps=rate_limiter.settle)
+        self.settle = settle.start()
+        self.addCleanup(settle.stop)
+
+    def open_circuit(self, model):
+        error = APIConnectionError(request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+        self.breaker.record_failure(model, error)
+
+    def assert_settled(self, model):
+        self.assertFalse(self.breaker.is_open(model), "the probe must not stay claimed")
+        self.settle.assert_called_once()
+        estimated, actual = self.settle.call_args.args
+        self.assertLess(actual, estimated)
+
+    def test_closed_plan_stream_releases_probe_and_settles(self):
+        model = ai_generator.reel_plan_request(INFLUENCER, 30)["model"]
+        self.open_circuit(model)
+
+        items = ai_generator.stream_reel_content_plan(INFLUENCER, 30)
+        self.assertIn("post_context", next(items))
+        items.close()
+
+        self.assert_settled(model)
+
+    def test_closed_life_story_stream_releases_probe_and_settles(self):
+        model = ai_generator.life_story_request("Stream Test", INFLUENCER.persona)["model"]
+        self.open_circuit(model)
+
+        chunks = ai_generator.stream_life_story("Stream Test", INFLUENCER.persona)
+        self.assertTrue(next(chunks))
+        chunks.close()
+
+        self.assert_settled(model)
+
+    def test_plan_stream_falls_back_to_the_next_model(self):
+        router = ModelRouter({"plan": [SONNET, HAIKU]})
+        self.breaker.reset_timeout = 3600
+        self.open_circuit(SONNET)
+
+        with mock.patch("managers.ai_generator.model_router", router), mock.patch.object(
+            ai_generator.client.messages, "stream", wraps=ai_generator.client.messages.stream
+        ) as stream:
+            items = list(ai_generator.stream_reel_content_plan(INFLUENCER, 30))
+
+        self.assertTrue(items)
+        self.assertEqual([c.kwargs["model"] for c in stream.call_args_list], [HAIKU])
+        self.assertEqual(router.stats()["plan"]["fallbacks"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,99 @@
 """Background task utilities for async processing"""
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 import logging
+import os
 import random
+import time
 from database.models import get_db_session, Influencer, Video, Schedule
 from managers.ai_generator import ai_generator
+from managers.scene_dedup import scene_deduplicator
 from managers.scheduler import video_scheduler
 from api.schemas import DatedPost
+from utils.lazy_generation import LAZY_GENERATION, lazy_stats, materialize_due_posts
 import json
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of plan items generated in parallel. Set to 1 to restore the
+# old one-at-a-time behaviour.
+GENERATION_CONCURRENCY = int(os.getenv("AI_GENERATION_CONCURRENCY", "8"))
+
+
+def plan_item_run_time(item: Dict[str, Any], today: datetime) -> datetime:
+    """Picks a posting time for a content plan item on its planned day."""
+    day_offset = item.get("day", 1) - 1
+    post_date = today + timedelta(days=day_offset)
+    random_hour = random.randint(9, 21) # Post between 9 AM and 9 PM
+    random_minute = random.randint(0, 59)
+    return post_date.replace(hour=random_hour, minute=random_minute, second=0, microsecond=0)
+
+
+def _generate_post_content(influencer, context: str) -> Tuple[Dict[str, Any], str]:
+    """Generates the scene prompt and caption for a single post in one call."""
+    return ai_generator.generate_post_content(influencer, context=context)
+
+
+def store_posts(db, videos: List[Video]) -> int:
+    """
+    Stores new posts and schedules each at its `scheduled_time`.
+
+    The videos and their schedules are each written with one batched INSERT
+    and a single commit, and the schedules are handed to the scheduler as one
+    batch. Returns the number of posts stored.
+    """
+    if not videos:
+        return 0
+    db.add_all(videos)
+    db.flush()
+    schedules = [
+        Schedule(video_id=video.id, run_at=video.scheduled_time, is_active=True)
+        for video in videos
+    ]
+    db.add_all(schedules)
+    db.flush()
+    # Read before the commit expires them, which would reload every row.
+    to_schedule = [(schedule.id, schedule.run_at) for schedule in schedules]
+    db.commit()
+    video_scheduler.schedule_many(to_schedule)
+    return len(videos)
+
+
+def delete_posts(db, videos: List[Video]):
+    """
+    Deletes posts whose schedules were cancelled, with one DELETE for their
+    schedules and one for the videos. The scene index of each affected
+    influencer is dropped, to be reloaded from the posts that are left.
+    """
+    if not videos:
+        return
+    for video in videos:
+        lazy_stats.record_discarded(video)
+    video_ids = [video.id for video in videos]
+    influencer_ids = {video.influencer_id for video in videos}
+    db.query(Schedule).filter(Schedule.video_id.in_(video_ids)).delete(synchronize_session=False)
+    db.query(Video).filter(Video.id.in_(video_ids)).delete()
+    db.commit()
+    for influencer_id in influencer_ids:
+        scene_deduplicator.forget(influencer_id)
+
+
+def clear_future_posts(db, influencer_id: int, exclude_video_ids: Tuple[int, ...] = ()) -> int:
+    """
+    Cancels and deletes an influencer's future posts that have not been
+    published yet. Returns the number of posts deleted.
+    """
+    cancelled = video_scheduler.cancel_for_influencer(influencer_id, exclude_video_ids=exclude_video_ids)
+    if not cancelled:
+        return 0
+    videos = db.query(Video).filter(Video.id.in_([video_id for _, video_id in cancelled])).all()
+    delete_posts(db, videos)
+    return len(videos)
+
+
 def process_interval_schedule(
     influencer_id: int, 
     days_to_schedule: int, 
@@ -30,7 +112,6 @@ def process_interval_schedule(
 
         now = datetime.now()
         end_date = now + timedelta(days=days_to_schedule)
-        created_count = 0
 
         schedule_items = []
         if reel_interval_hours:
@@ -45,24 +126,25 @@ def process_interval_schedule(
                 schedule_items.append({"time": current_time, "type": "story"})
                 current_time += timedelta(hours=story_interval_hours)
 
-        for item in sorted(schedule_items, key=lambda x: x["time"]):
+        schedule_items.sort(key=lambda x: x["time"])
+
+        # Every slot shares the same influencer context, so generate them in
+        # batched requests rather than one round trip per slot.
+        generated = ai_generator.generate_post_content_batch(
+            influencer,
+            [
+                f"A short {item['type']} about the influencer's daily life or a recent thought."
+                for item in schedule_items
+            ],
+        )
+
+        videos = []
+        for item, (generation_prompt, caption) in zip(schedule_items, generated):
             time_offset = timedelta(minutes=random.randint(-30, 30))
             scheduled_time = item["time"] + time_offset
             content_type = item["type"]
-            
-            # Generate a scene prompt using the influencer's persona
-            prompt_data = ai_generator.generate_scene_prompt(
-                influencer,
-                context=f"A short {content_type} about the influencer's daily life or a recent thought."
-            )
-            
-            # The generation_prompt is now the direct output of the AI
-            generation_prompt = prompt_data
-            
-            # Generate a caption from the new prompt data
-            caption = ai_generator.generate_caption(prompt_data)
-            
-            db_video = Video(
+
+            videos.append(Video(
                 influencer_id=influencer.id,
                 scheduled_time=scheduled_time,
                 content_type=content_type,
@@ -70,28 +152,8 @@ def process_interval_schedule(
                 caption=caption,
                 hashtags=["lifestyle", "aiinfluencer", f"dayinthelife"],
                 platform="instagram"
-            )
-            db.add(db_video)
-            db.commit()
-            db.refresh(db_video)
-            
-            db_schedule = Schedule(
-                video_id=db_video.id,
-                run_at=scheduled_time,
-                is_active=True
-            )
-            db.add(db_schedule)
-            db.commit()
-            db.refresh(db_schedule)
-
-            job_id = video_scheduler.schedule_video(
-                db_schedule.id,
-                scheduled_time
-            )
-            
-            db_schedule.job_id = job_id
-            db.commit()
-            created_count += 1
+            ))
+        created_count = store_posts(db, videos)
         
         logger.info(f"Created {created_count} interval-based scheduled posts for influencer {influencer_id}")
         
@@ -112,7 +174,7 @@ def process_dated_schedule(influencer_id: int, posts: List[Dict[str, Any]]):
             logger.error(f"Influencer {influencer_id} not found for dated scheduling.")
             return
         
-        created_count = 0
+        videos = []
         for post_data in posts:
             post = DatedPost.model_validate(post_data)
             
@@ -127,20 +189,15 @@ def process_dated_schedule(influencer_id: int, posts: List[Dict[str, Any]]):
             hashtags = ["aiinfluencer"]
             
             if post.prompt:
-                # Generate a scene prompt using the influencer's full profile and the specific post prompt
-                prompt_data = ai_generator.generate_scene_prompt(
+                # Generate the scene prompt and its caption in a single call,
+                # using the influencer's full profile and the specific post prompt
+                generation_prompt, caption = ai_generator.generate_post_content(
                     influencer,
                     context=post.prompt
                 )
-                
-                # The generation_prompt is now the direct output of the AI
-                generation_prompt = prompt_data
-                
-                # Generate a caption from the new prompt data
-                caption = ai_generator.generate_caption(prompt_data)
                 hashtags.append(post.content_type)
 
-            db_video = Video(
+            videos.append(Video(
                 influencer_id=influencer_id,
                 scheduled_time=scheduled_time,
                 content_type=post.content_type,
@@ -148,29 +205,8 @@ def process_dated_schedule(influencer_id: int, posts: List[Dict[str, Any]]):
                 caption=caption,
                 hashtags=hashtags,
                 platform="instagram"
-            )
-            db.add(db_video)
-            db.commit()
-            db.refresh(db_video)
-            
-            db_schedule = Schedule(
-                video_id=db_video.id,
-                run_at=scheduled_time,
-                is_active=True
-            )
-            db.add(db_schedule)
-            db.commit()
-            db.refresh(db_schedule)
-            
-            job_id = video_scheduler.schedule_video(
-                db_schedule.id,
-                scheduled_time
-            )
-            
-            db_schedule.job_id = job_id
-            db.commit()
-            
-            created_count += 1
+            ))
+        created_count = store_posts(db, videos)
         
         logger.info(f"Created {created_count} dated posts for influencer {influencer_id}")
         
@@ -179,10 +215,21 @@ def process_dated_schedule(influencer_id: int, posts: List[Dict[str, Any]]):
     finally:
         db.close()
 
-def plan_and_schedule_from_life_story(influencer_id: int, days_to_plan: int):
+def plan_and_schedule_from_life_story(
+    influencer_id: int, days_to_plan: int, max_workers: Optional[int] = None
+):
     """
     Generates a full content schedule based on an influencer's life story using
     a two-stage, narrative-aware planning process.
+
+    Both plans are streamed, and each plan item goes to post generation and
+    storage as soon as it is parsed: reel posts are generated while the rest of
+    the reel plan and then the story plan are still being written, and story
+    posts join the same pipeline.
+    Per-item scene prompts and captions are generated concurrently, bounded by
+    `max_workers` (defaults to AI_GENERATION_CONCURRENCY). With lazy generation
+    enabled, only posts within the materialisation lead time are generated
+    now; the rest are generated by the materializer as their run time nears.
     """
     db = get_db_session()
     try:
@@ -191,13 +238,21 @@ def plan_and_schedule_from_life_story(influencer_id: int, days_to_plan: int):
             logger.warning(f"Cannot schedule from life story for influencer {influencer_id}: No influencer or life story found.")
             return
 
-        reel_plan = ai_generator.generate_reel_content_plan(influencer, days_to_plan)
-        
-        reel_summary = "\n".join([f"- Day {r['day']}: {r['post_context']}" for r in reel_plan])
-        story_plan = ai_generator.generate_story_content_plan(influencer, reel_summary, days_to_plan)
-        
+        started = time.monotonic()
+        with PlanPipeline(db, influencer, datetime.now(), max_workers=max_workers) as pipeline:
+            reel_plan = []
+            for item in ai_generator.stream_reel_content_plan(influencer, days_to_plan):
+                reel_plan.append(item)
+                pipeline.submit(item)
+
+            reel_summary = "\n".join([f"- Day {r['day']}: {r['post_context']}" for r in reel_plan])
+            story_plan = []
+            for item in ai_generator.stream_story_content_plan(influencer, reel_summary, days_to_plan):
+                story_plan.append(item)
+                pipeline.submit(item)
+            created_count = pipeline.close()
+
         combined_plan = sorted(reel_plan + story_plan, key=lambda x: x['day'])
-        
         print("--- Generated Content Plan ---")
         print(json.dumps(combined_plan, indent=2))
         print("--------------------------")
@@ -205,53 +260,145 @@ def plan_and_schedule_from_life_story(influencer_id: int, days_to_plan: int):
         if not combined_plan:
             logger.error(f"AI failed to generate any content plan for influencer {influencer_id}.")
             return
-        
-        today = datetime.now()
-        created_count = 0
 
-        for item in combined_plan:
-            try:
-                day_offset = item.get("day", 1) - 1
-                post_date = today + timedelta(days=day_offset)
-                random_hour = random.randint(9, 21) # Post between 9 AM and 9 PM
-                random_minute = random.randint(0, 59)
-                scheduled_time = post_date.replace(hour=random_hour, minute=random_minute, second=0, microsecond=0)
+        first_post = (
+            f"{pipeline.first_write_at - started:.1f}s" if pipeline.first_write_at else "n/a"
+        )
+        logger.info(
+            f"Generated {created_count} scheduled posts from the life story for influencer {influencer_id} "
+            f"in {time.monotonic() - started:.1f}s (first post stored after {first_post})."
+        )
 
-                if scheduled_time < datetime.now():
-                    continue
+    except Exception as e:
+        logger.error(f"Error in life story scheduling for influencer {influencer_id}: {e}", exc_info=True)
+    finally:
+        db.close()
 
-                prompt_data = ai_generator.generate_scene_prompt(
-                    influencer,
-                    context=item.get("post_context", "A moment from their life.")
-                )
 
-                caption = ai_generator.generate_caption(prompt_data)
+class PlanPipeline:
+    """
+    Generates and stores content plan items as they are submitted.
 
-                db_video = Video(
-                    influencer_id=influencer.id,
-                    scheduled_time=scheduled_time,
-                    content_type=item.get("content_type", "reel"),
-                    generation_prompt=prompt_data,
-                    caption=caption,
-                    hashtags=["aiinfluencer", "lifestory"],
-                    platform="instagram"
-                )
-                db.add(db_video)
-                db.commit()
-                db.refresh(db_video)
+    Each submitted item's scene prompt and caption are generated on a worker
+    pool right away, and finished posts are written to the database and
+    scheduled in submission order by the thread that owns `db`, whenever an
+    item is submitted; all posts ready at that point are stored together.
+    Call `close` to wait for and store the rest. Used as a context manager,
+    the worker pool is shut down even if planning fails before `close`.
+    """
+
+    def __init__(
+        self,
+        db,
+        influencer: Influencer,
+        today: datetime,
+        max_workers: Optional[int] = None,
+    ):
+        self.db = db
+        self.today = today
+        # Workers read the influencer while this thread commits, and a commit
+        # expires every attribute of the objects in the session. Detach it so
+        # the loaded values stay put.
+        if influencer in db:
+            db.refresh(influencer)
+            db.expunge(influencer)
+        self.influencer = influencer
+        self.executor = None
+        if not LAZY_GENERATION:
+            self.executor = ThreadPoolExecutor(
+                max_workers=max(1, max_workers or GENERATION_CONCURRENCY),
+                thread_name_prefix="post-generation",
+            )
+        self.pending = deque()
+        self.created = 0
+        self.first_write_at = None
 
-                db_schedule = Schedule(video_id=db_video.id, run_at=scheduled_time, is_active=True)
-                db.add(db_schedule)
-                db.commit()
+    def __enter__(self) -> "PlanPipeline":
+        return self
 
-                created_count += 1
-            except (ValueError, KeyError) as e:
-                logger.error(f"Skipping malformed content plan item for influencer {influencer_id}: {item}. Error: {e}")
-                continue
+    def __exit__(self, *exc_info):
+        self._shutdown()
+        return False
 
-        logger.info(f"Generated {created_count} scheduled posts from the life story for influencer {influencer_id}.")
+    def submit(self, item: Dict[str, Any]):
+        try:
+            scheduled_time = plan_item_run_time(item, self.today)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Skipping malformed content plan item for influencer {self.influencer.id}: {item}. Error: {e}")
+            return
 
-    except Exception as e:
-        logger.error(f"Error in life story scheduling for influencer {influencer_id}: {e}", exc_info=True)
-    finally:
-        db.close()
\ No newline at end of file
+        if scheduled_time < datetime.now():
+            return
+
+        context = item.get("post_context", "A moment from their life.")
+        future = None
+        if self.executor:
+            future = self.executor.submit(_generate_post_content, self.influencer, context)
+        self.pending.append((item, scheduled_time, context, future))
+        self.write_ready()
+
+    def write_ready(self):
+        """Writes the posts at the head of the queue that have finished generating."""
+        videos = []
+        while self.pending and (self.pending[0][3] is None or self.pending[0][3].done()):
+            videos.append(self._video(*self.pending.popleft()))
+        if not videos:
+            return
+        self.created += store_posts(self.db, videos)
+        if self.first_write_at is None:
+            self.first_write_at = time.monotonic()
+
+    def close(self) -> int:
+        """Waits for and writes every remaining post. Returns the number of posts created."""
+        try:
+            while self.pending:
+                future = self.pending[0][3]
+                if future is not None:
+                    wait([future])
+                self.write_ready()
+        finally:
+            self._shutdown()
+
+        if LAZY_GENERATION:
+            lazy_stats.add(planned=self.created)
+            materialize_due_posts(influencer_id=self.influencer.id)
+        return self.created
+
+    def _shutdown(self):
+        # Posts not yet stored are dropped; shutting down twice is harmless.
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _video(self, item, scheduled_time, context, future) -> Video:
+        # Only store the plan when generating lazily; posts are generated
+        # shortly before they run.
+        prompt_data, caption = future.result() if future is not None else (None, None)
+        return Video(
+            influencer_id=self.influencer.id,
+            scheduled_time=scheduled_time,
+            content_type=item.get("content_type", "reel"),
+            generation_prompt=prompt_data,
+            caption=caption,
+            post_context=context,
+            hashtags=["aiinfluencer", "lifestory"],
+            platform="instagram"
+        )
+
+
+def store_plan_items(
+    db,
+    influencer: Influencer,
+    plan: List[Dict[str, Any]],
+    today: datetime,
+    max_workers: Optional[int] = None,
+) -> int:
+    """
+    Creates the videos and schedules for content plan items, whose `day` counts
+    from `today`. Items that would run in the past are skipped.
+
+    Returns the number of posts created.
+    """
+    with PlanPipeline(db, influencer, today, max_workers=max_workers) as pipeline:
+        for item in plan:
+            pipeline.submit(item)
+        return pipeline.close()
@@ -0,0 +1,288 @@
+"""Offline bulk re-planning through the Message Batches API"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from types import SimpleNamespace
+import argparse
+import logging
+import os
+import time
+import uuid
+
+from database.models import (
+    get_db_session,
+    Influencer,
+    InfluencerMode,
+    Video,
+)
+from managers.ai_generator import ai_generator
+from managers.scheduler import video_scheduler
+from managers.structured_output import StructuredOutputError
+from utils.background_tasks import clear_future_posts, plan_item_run_time, store_posts
+
+logger = logging.getLogger(__name__)
+
+# How often to check on a submitted batch. Batches usually finish well within
+# an hour, so there is no point polling aggressively.
+BATCH_POLL_INTERVAL_SECONDS = int(os.getenv("AI_BATCH_POLL_INTERVAL", "60"))
+
+# Requests per submitted batch. The API accepts up to 100k, but every request
+# carries a full life story, so stay well below the per-batch size limit.
+MAX_REQUESTS_PER_BATCH = 10000
+
+
+class LocalMessageBatches:
+    """
+    In-process stand-in for `client.messages.batches`.
+
+    Every request is answered by `create_message` (e.g. a real client's
+    `messages.create`, or a canned responder in tests) as soon as the batch is
+    submitted, and the batch reports as ended on the first poll. This lets the
+    bulk planner run end-to-end without the asynchronous batch endpoint.
+    """
+
+    def __init__(self, create_message: Callable[..., Any]):
+        self._create_message = create_message
+        self._results: Dict[str, List[Any]] = {}
+
+    def create(self, requests: List[Dict[str, Any]]) -> Any:
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex}"
+        results = []
+        for request in requests:
+            try:
+                message = self._create_message(**request["params"])
+                result = SimpleNamespace(type="succeeded", message=message)
+            except Exception as e:
+                result = SimpleNamespace(type="errored", error=str(e))
+            results.append(SimpleNamespace(custom_id=request["custom_id"], result=result))
+        self._results[batch_id] = results
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id: str) -> Any:
+        return SimpleNamespace(id=batch_id, processing_status="ended")
+
+    def results(self, batch_id: str) -> Iterable[Any]:
+        return iter(self._results[batch_id])
+
+
+class BulkPlanner:
+    """
+    Re-plans many lifestyle influencers at once using asynchronous batch jobs.
+
+    Runs the same three stages as `plan_and_schedule_from_life_story` (reel
+    plan, story plan, per-post scene prompt and caption), but each stage is
+    submitted for every influencer as one batch job. That trades interactive
+    latency for batch pricing and throughput. Results are written as
+    `Video`/`Schedule` rows once all stages have finished.
+    """
+
+    def __init__(
+        self,
+        batches: Optional[Any] = None,
+        poll_interval: float = BATCH_POLL_INTERVAL_SECONDS,
+        generator=ai_generator,
+    ):
+        if batches is None and generator.client:
+            # Batch submissions are not rate limited like regular requests, so
+            # keep the SDK's own retries for them.
+            batches = generator.client.with_options(max_retries=2).messages.batches
+        self.batches = batches
+        self.poll_interval = poll_interval
+        self.generator = generator
+
+    def run(
+        self,
+        influencer_ids: Optional[List[int]] = None,
+        days_to_plan: int = 30,
+        replace_existing: bool = True,
+    ) -> Dict[int, int]:
+        """
+        Plans `days_to_plan` days for each lifestyle influencer (or only those in
+        `influencer_ids`) and returns the number of posts scheduled per influencer.
+
+        With `replace_existing`, an influencer's pending future posts are replaced,
+        but only once a new plan has actually been produced for them.
+        """
+        if self.batches is None:
+            logger.error("No batch client configured. Cannot run bulk planning.")
+            return {}
+
+        db = get_db_session()
+        try:
+            query = (
+                db.query(Influencer)
+                .filter(Influencer.mode == InfluencerMode.LIFESTYLE)
+                .filter(Influencer.is_active == True)
+                .filter(Influencer.life_story.isnot(None))
+            )
+            if influencer_ids:
+                query = query.filter(Influencer.id.in_(influencer_ids))
+            influencers = {influencer.id: influencer for influencer in query.all()}
+            if not influencers:
+                logger.info("No lifestyle influencers to plan.")
+                return {}
+
+            logger.info(f"Bulk planning {days_to_plan} days for {len(influencers)} influencers")
+
+            # Stage 1: reel plans
+            reel_responses = self._run_batch(
+                "generate_reel_content_plan",
+                {
+                    f"reel-{influencer_id}": self.generator.reel_plan_request(influencer, days_to_plan)
+                    for influencer_id, influencer in influencers.items()
+                },
+            )
+            reel_plans = {
+                influencer_id: self._parse_plan(reel_responses.get(f"reel-{influencer_id}"))
+                for influencer_id in influencers
+            }
+
+            # Stage 2: story plans, each aware of its influencer's reel plan
+            story_responses = self._run_batch(
+                "generate_story_content_plan",
+                {
+                    f"story-{influencer_id}": self.generator.story_plan_request(
+                        influencer,
+                        "\n".join(
+                            f"- Day {r.get('day')}: {r.get('post_context')}"
+                            for r in reel_plans[influencer_id]
+                        ),
+                        days_to_plan,
+                    )
+                    for influencer_id, influencer in influencers.items()
+                },
+            )
+
+            today = datetime.now()
+            planned: Dict[int, List[Tuple[Dict[str, Any], datetime]]] = {}
+            for influencer_id in influencers:
+                story_plan = self._parse_plan(story_responses.get(f"story-{influencer_id}"))
+                combined_plan = sorted(
+                    reel_plans[influencer_id] + story_plan, key=lambda x: x.get("day", 1)
+                )
+                items = []
+                for item in combined_plan:
+                    try:
+                        scheduled_time = plan_item_run_time(item, today)
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.error(f"Skipping malformed content plan item for influencer {influencer_id}: {item}. Error: {e}")
+                        continue
+                    if scheduled_time >= datetime.now():
+                        items.append((item, scheduled_time))
+                planned[influencer_id] = items
+
+            # Stage 3: scene prompt and caption for every planned post
+            post_requests = {}
+            for influencer_id, items in planned.items():
+                for n, (item, _) in enumerate(items):
+                    post_requests[f"post-{influencer_id}-{n}"] = self.generator.post_content_request(
+                        influencers[influencer_id],
+                        context=item.get("post_context", "A moment from their life."),
+                    )
+            post_responses = self._run_batch("generate_post_content", post_requests)
+
+            created = {}
+            for influencer_id, items in planned.items():
+                if not items:
+                    logger.error(f"Bulk planning produced no content plan for influencer {influencer_id}.")
+                    created[influencer_id] = 0
+                    continue
+                if replace_existing:
+                    self._clear_future_posts(db, influencer_id)
+                created[influencer_id] = self._materialise(
+                    db, influencer_id, items, post_responses
+                )
+            logger.info(f"Bulk planning scheduled {sum(created.values())} posts for {len(created)} influencers")
+            return created
+        finally:
+            db.close()
+
+    def _run_batch(self, method: str, requests: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Submits requests as batch jobs, waits for them and returns messages by custom_id."""
+        custom_ids = list(requests)
+        messages: Dict[str, Any] = {}
+        for start in range(0, len(custom_ids), MAX_REQUESTS_PER_BATCH):
+            chunk = custom_ids[start:start + MAX_REQUESTS_PER_BATCH]
+            batch = self.batches.create(
+                requests=[{"custom_id": custom_id, "params": requests[custom_id]} for custom_id in chunk]
+            )
+            logger.info(f"Submitted {method} batch {batch.id} with {len(chunk)} requests")
+
+            while batch.processing_status != "ended":
+                time.sleep(self.poll_interval)
+                batch = self.batches.retrieve(batch.id)
+
+            failed = 0
+            for entry in self.batches.results(batch.id):
+                if entry.result.type != "succeeded":
+                    failed += 1
+                    logger.error(f"Batch request {entry.custom_id} did not succeed: {entry.result.type}")
+                    continue
+                message = entry.result.message
+                self.generator._report_cache_usage(method, message)
+                messages[entry.custom_id] = message
+            logger.info(f"{method} batch {batch.id} finished: {len(chunk) - failed} succeeded, {failed} failed")
+        return messages
+
+    def _parse_plan(self, message: Optional[Any]) -> List[Dict[str, Any]]:
+        if message is None:
+            return []
+        try:
+            return self.generator.parse_content_plan(message)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse batched content plan: {e}")
+            return []
+
+    def _clear_future_posts(self, db, influencer_id: int):
+        """Removes an influencer's future posts that have not been published yet."""
+        clear_future_posts(db, influencer_id)
+
+    def _materialise(
+        self,
+        db,
+        influencer_id: int,
+        items: List[Tuple[Dict[str, Any], datetime]],
+        post_responses: Dict[str, Any],
+    ) -> int:
+        videos = []
+        for n, (item, scheduled_time) in enumerate(items):
+            context = item.get("post_context", "A moment from their life.")
+            message = post_responses.get(f"post-{influencer_id}-{n}")
+            if message is None:
+                prompt_data = self.generator._fallback_prompt(context)
+                caption = self.generator._simple_caption(prompt_data, None)
+            else:
+                prompt_data, caption = self.generator.parse_post_content(message, context)
+
+            videos.append(Video(
+                influencer_id=influencer_id,
+                scheduled_time=scheduled_time,
+                content_type=item.get("content_type", "reel"),
+                generation_prompt=prompt_data,
+                caption=caption,
+                post_context=context,
+                hashtags=["aiinfluencer", "lifestory"],
+                platform="instagram"
+            ))
+        return store_posts(db, videos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-plan lifestyle influencers with batch jobs.")
+    parser.add_argument("--days", type=int, default=30, help="Number of days to plan.")
+    parser.add_argument("--influencer", type=int, action="append", help="Only plan these influencer ids.")
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Answer batch requests in-process through the regular Messages API.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    batches = None
+    if args.local and ai_generator.client:
+        batches = LocalMessageBatches(lambda **params: ai_generator._send_request(params)[0])
+    try:
+        BulkPlanner(batches=batches).run(args.influencer, days_to_plan=args.days)
+    finally:
+        video_scheduler.shutdown()
@@ -0,0 +1,108 @@
+"""Incremental parsing of JSON arrays that arrive in pieces"""
+
+from typing import Any, List, Optional
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\r\n"
+
+
+class JsonArrayStream:
+    """
+    Yields the elements of a streamed JSON array as soon as each one is complete.
+
+    With `key`, the array is the value of that key in the top-level object (the
+    `items` of a tool input, say); without it the document itself is the array.
+    Text is fed in arbitrary pieces, e.g. `input_json_delta` fragments. An
+    element cut off by the end of the stream is never returned, so a truncated
+    document still yields every element before the cut.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        self.done = False
+        self.items_parsed = 0
+        self.items_malformed = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key_chars: Optional[List[str]] = None
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item: List[str] = []
+
+    def feed(self, text: str) -> List[Any]:
+        """Consumes the next piece of the document; returns the elements it completed."""
+        completed = []
+        for ch in text:
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._item:
+                    self._item.append(ch)
+                elif self._key_chars is not None and not (ch == '"' and not self._escape):
+                    self._key_chars.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_chars is not None:
+                        self._last_key = "".join(self._key_chars)
+                        self._key_chars = None
+                continue
+
+            in_array = self._array_depth is not None and len(self._stack) == self._array_depth
+            if in_array and not self._item:
+                if ch in _WHITESPACE or ch == ",":
+                    continue
+                if ch == "]":
+                    self._stack.pop()
+                    self.done = True
+                    continue
+            elif in_array and ch in ",]":
+                # The end of a scalar element.
+                self._emit(completed)
+                if ch == "]":
+                    self._stack.pop()
+                    self.done = True
+                continue
+
+            if self._array_depth is not None and (self._item or in_array):
+                self._item.append(ch)
+
+            if ch == '"':
+                self._in_string = True
+                if self._stack == ["{"] and self._array_depth is None:
+                    self._key_chars = []
+            elif ch in "{[":
+                if ch == "[" and self._array_depth is None and self._is_target():
+                    self._stack.append(ch)
+                    self._array_depth = len(self._stack)
+                    continue
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._item and len(self._stack) == self._array_depth:
+                    self._emit(completed)
+        return completed
+
+    def _is_target(self) -> bool:
+        if self.key is None:
+            return not self._stack
+        return self._stack == ["{"] and self._last_key == self.key
+
+    def _emit(self, completed: List[Any]):
+        text = "".join(self._item).strip()
+        self._item = []
+        try:
+            completed.append(json.loads(text))
+            self.items_parsed += 1
+        except json.JSONDecodeError as e:
+            self.items_malformed += 1
+            logger.warning(f"Skipping malformed streamed array element: {e}")
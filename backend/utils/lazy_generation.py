@@ -0,0 +1,220 @@
+"""Just-in-time generation of planned posts shortly before they run"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import threading
+
+from sqlalchemy import or_, select, update
+
+from database.models import get_db_session, Influencer, Video, VideoStatus, Schedule
+from managers.ai_generator import ai_generator
+
+logger = logging.getLogger(__name__)
+
+# When enabled, life-story planning only stores plan items. Their scene prompt
+# and caption are generated once the post is within the lead time of its
+# run_at, so posts that get replanned before then never cost a generation.
+LAZY_GENERATION = os.getenv("AI_LAZY_GENERATION", "false").lower() in ("1", "true", "yes")
+MATERIALIZE_LEAD_HOURS = float(os.getenv("AI_MATERIALIZE_LEAD_HOURS", "24"))
+MATERIALIZE_INTERVAL_MINUTES = int(os.getenv("AI_MATERIALIZE_INTERVAL_MINUTES", "10"))
+# How long a materialisation pass owns the posts it claimed; posts of a pass
+# that died are picked up again after this.
+MATERIALIZE_CLAIM_SECONDS = int(os.getenv("AI_MATERIALIZE_CLAIM_SECONDS", "600"))
+
+MATERIALIZER_JOB_ID = "materialize_planned_posts"
+# APScheduler executor the materializer runs on, apart from the post jobs.
+MATERIALIZER_EXECUTOR = "materializer"
+
+
+class LazyGenerationStats:
+    """Counts how much scene/caption generation lazy planning has saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.planned = 0
+        self.materialized = 0
+        self.materialized_at_run_time = 0
+        self.discarded_unmaterialized = 0
+        self.discarded_materialized = 0
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def record_discarded(self, video: Video):
+        """Call for every future post deleted by a replan."""
+        if is_unmaterialized(video):
+            self.add(discarded_unmaterialized=1)
+        else:
+            self.add(discarded_materialized=1)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            discarded = self.discarded_unmaterialized + self.discarded_materialized
+            return {
+                "enabled": LAZY_GENERATION,
+                "lead_hours": MATERIALIZE_LEAD_HOURS,
+                "planned": self.planned,
+                "materialized": self.materialized,
+                "materialized_at_run_time": self.materialized_at_run_time,
+                # Generations skipped because the post was replanned first.
+                "generations_avoided": self.discarded_unmaterialized,
+                # Generated posts thrown away by a replan.
+                "generations_wasted": self.discarded_materialized,
+                "avoided_rate": (
+                    self.discarded_unmaterialized / discarded if discarded else 0.0
+                ),
+            }
+
+
+lazy_stats = LazyGenerationStats()
+
+def is_unmaterialized(video: Video) -> bool:
+    return video.caption is None and bool(video.post_context)
+
+
+def _unmaterialized_due(horizon: datetime, now: datetime):
+    """Ids of unclaimed planned posts running before `horizon`."""
+    return (
+        select(Video.id)
+        .join(Schedule, Schedule.video_id == Video.id)
+        .where(Schedule.is_active == True)
+        .where(Schedule.run_at <= horizon)
+        .where(Video.status == VideoStatus.PENDING)
+        .where(Video.caption.is_(None))
+        .where(Video.post_context.isnot(None))
+        .where(
+            or_(
+                Video.materialize_claimed_until.is_(None),
+                Video.materialize_claimed_until < now,
+            )
+        )
+    )
+
+
+def _claim_posts(db, influencer_id: int, horizon: datetime) -> List[int]:
+    """
+    Claims an influencer's due planned posts with one conditional UPDATE, so
+    concurrent passes (in this or another process) never generate the same
+    post twice. Returns the claimed video ids.
+    """
+    now = datetime.now()
+    due = _unmaterialized_due(horizon, now).where(Video.influencer_id == influencer_id)
+    claimed = db.execute(
+        update(Video)
+        .where(Video.id.in_(due.scalar_subquery()))
+        .where(or_(Video.materialize_claimed_until.is_(None), Video.materialize_claimed_until < now))
+        .values(materialize_claimed_until=now + timedelta(seconds=MATERIALIZE_CLAIM_SECONDS))
+        .returning(Video.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return list(claimed)
+
+
+def materialize_due_posts(
+    influencer_id: Optional[int] = None, lead_hours: Optional[float] = None
+) -> int:
+    """
+    Generates scene prompts and captions for planned posts running within the
+    lead time. Returns the number of posts materialised.
+
+    Posts are claimed per influencer right before they are generated, so a
+    planning request does not wait for a whole periodic pass and posts that
+    another pass or replica is generating are skipped.
+    """
+    horizon = datetime.now() + timedelta(
+        hours=MATERIALIZE_LEAD_HOURS if lead_hours is None else lead_hours
+    )
+    db = get_db_session()
+    materialized = 0
+    influencer_ids = []
+    try:
+        if influencer_id is not None:
+            influencer_ids = [influencer_id]
+        else:
+            due = _unmaterialized_due(horizon, datetime.now()).subquery()
+            influencer_ids = db.execute(
+                select(Video.influencer_id).where(Video.id.in_(select(due.c.id))).distinct()
+            ).scalars().all()
+
+        for pending_influencer_id in influencer_ids:
+            influencer = (
+                db.query(Influencer).filter(Influencer.id == pending_influencer_id).first()
+            )
+            if not influencer:
+                continue
+            claimed = _claim_posts(db, pending_influencer_id, horizon)
+            if not claimed:
+                continue
+            try:
+                videos = (
+                    db.query(Video)
+                    .join(Schedule, Schedule.video_id == Video.id)
+                    .filter(Video.id.in_(claimed))
+                    .order_by(Schedule.run_at)
+                    .all()
+                )
+                generated = ai_generator.generate_post_content_batch(
+                    influencer, [video.post_context for video in videos]
+                )
+                for video, (prompt_data, caption) in zip(videos, generated):
+                    video.generation_prompt = prompt_data
+                    video.caption = caption
+                    video.materialize_claimed_until = None
+                db.commit()
+                materialized += len(videos)
+            except Exception:
+                # Give the posts back so the next pass can retry them.
+                db.rollback()
+                db.query(Video).filter(Video.id.in_(claimed)).update(
+                    {Video.materialize_claimed_until: None}, synchronize_session=False
+                )
+                db.commit()
+                raise
+
+        if materialized:
+            lazy_stats.add(materialized=materialized)
+            logger.info(f"Materialized {materialized} planned posts for {len(influencer_ids)} influencers")
+        return materialized
+    except Exception as e:
+        logger.error(f"Error materializing planned posts: {e}", exc_info=True)
+        db.rollback()
+        return materialized
+    finally:
+        db.close()
+
+
+def materialize_video(db, video: Video):
+    """Generates a planned post that reached its run time without being materialised."""
+    influencer = db.query(Influencer).filter(Influencer.id == video.influencer_id).first()
+    video.generation_prompt, video.caption = ai_generator.generate_post_content(
+        influencer, context=video.post_context
+    )
+    db.commit()
+    lazy_stats.add(materialized=1, materialized_at_run_time=1)
+    logger.warning(f"Materialized video {video.id} at run time; the materializer fell behind")
+
+
+def start_materializer(scheduler):
+    """Registers the periodic materialisation job on an APScheduler scheduler."""
+    if not LAZY_GENERATION:
+        return
+    scheduler.add_job(
+        func=materialize_due_posts,
+        trigger="interval",
+        minutes=MATERIALIZE_INTERVAL_MINUTES,
+        id=MATERIALIZER_JOB_ID,
+        executor=MATERIALIZER_EXECUTOR,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(),
+    )
+    logger.info(
+        f"Materializing planned posts {MATERIALIZE_LEAD_HOURS}h ahead, "
+        f"every {MATERIALIZE_INTERVAL_MINUTES} minutes"
+    )
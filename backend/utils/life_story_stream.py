@@ -0,0 +1,168 @@
+"""Streaming life-story generation for new lifestyle influencers"""
+
+from typing import Any, Dict, Iterator, Optional
+import logging
+import threading
+import time
+
+from database.models import get_db_session, Influencer
+from managers.ai_generator import ai_generator
+from managers.llm_metrics import llm_metrics
+from utils.background_tasks import plan_and_schedule_from_life_story
+
+logger = logging.getLogger(__name__)
+
+# Persist the partial story every this many new characters, so clients polling
+# GET /influencer/{id} see it grow and a crash loses little.
+PERSIST_EVERY_CHARS = 500
+
+# Finished streams stay available for late subscribers for this long.
+FINISHED_STREAM_TTL_SECONDS = 600
+
+
+class LifeStoryStream:
+    """Buffered text stream of one influencer's life story generation."""
+
+    def __init__(self, influencer_id: int):
+        self.influencer_id = influencer_id
+        self.chunks = []
+        self.done = False
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self._condition = threading.Condition()
+
+    def publish(self, text: str):
+        with self._condition:
+            self.chunks.append(text)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[str] = None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def text(self) -> str:
+        with self._condition:
+            return "".join(self.chunks)
+
+    def iter_chunks(self, heartbeat: float = 15.0) -> Iterator[Optional[str]]:
+        """
+        Yields every chunk from the start, blocking for new ones until the stream
+        finishes. Yields None after `heartbeat` seconds without new text so SSE
+        responses can send keep-alives.
+        """
+        position = 0
+        while True:
+            with self._condition:
+                if position == len(self.chunks) and not self.done:
+                    self._condition.wait(timeout=heartbeat)
+                pending = self.chunks[position:]
+                done = self.done
+            position += len(pending)
+            if pending:
+                yield from pending
+            elif not done:
+                yield None
+            if done and position == len(self.chunks):
+                return
+
+
+_streams: Dict[int, LifeStoryStream] = {}
+_streams_lock = threading.Lock()
+
+
+def get_life_story_stream(influencer_id: int) -> Optional[LifeStoryStream]:
+    with _streams_lock:
+        return _streams.get(influencer_id)
+
+
+def start_life_story_generation(
+    influencer_id: int,
+    name: str,
+    persona: Dict[str, Any],
+    days_to_plan: Optional[int] = None,
+) -> LifeStoryStream:
+    """
+    Starts streaming a life story for an existing influencer on a worker thread.
+
+    Text is persisted to `Influencer.life_story` as it arrives. Once the story
+    is complete, the content plan is generated (if `days_to_plan` is given); if
+    generation fails, the partial story is kept and nothing is planned.
+    """
+    stream = LifeStoryStream(influencer_id)
+    with _streams_lock:
+        now = time.time()
+        for key in [
+            key for key, existing in _streams.items()
+            if existing.done and now - existing.finished_at > FINISHED_STREAM_TTL_SECONDS
+        ]:
+            del _streams[key]
+        _streams[influencer_id] = stream
+
+    threading.Thread(
+        target=_generate_life_story,
+        args=(stream, name, persona, days_to_plan),
+        name=f"life-story-{influencer_id}",
+        daemon=True,
+    ).start()
+    return stream
+
+
+def _save_life_story(influencer_id: int, life_story: str):
+    db = get_db_session()
+    try:
+        db.query(Influencer).filter(Influencer.id == influencer_id).update(
+            {Influencer.life_story: life_story}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _generate_life_story(
+    stream: LifeStoryStream,
+    name: str,
+    persona: Dict[str, Any],
+    days_to_plan: Optional[int],
+):
+    influencer_id = stream.influencer_id
+    unsaved_chars = 0
+    error = None
+    try:
+        with llm_metrics.for_influencer(influencer_id):
+            for text in ai_generator.stream_life_story(name, persona):
+                stream.publish(text)
+                unsaved_chars += len(text)
+                if unsaved_chars >= PERSIST_EVERY_CHARS:
+                    _save_life_story(influencer_id, stream.text())
+                    unsaved_chars = 0
+    except Exception as e:
+        logger.error(f"Life story stream failed for influencer {influencer_id}: {e}", exc_info=True)
+        error = str(e)
+
+    life_story = stream.text().strip()
+    try:
+        _save_life_story(influencer_id, life_story or None)
+    except Exception as e:
+        logger.error(f"Failed to save life story for influencer {influencer_id}: {e}", exc_info=True)
+        error = error or str(e)
+    finally:
+        stream.finish(error)
+
+    if error is not None:
+        # A plan built from half a story would be scheduled as if it were whole;
+        # keep the partial story for a retry instead.
+        logger.error(
+            f"Life story for influencer {influencer_id} is incomplete ({len(life_story)} chars kept); "
+            "skipping planning."
+        )
+        return
+    if not life_story:
+        logger.error(f"No life story was generated for influencer {influencer_id}; skipping planning.")
+        return
+    logger.info(f"Streamed life story for influencer {influencer_id} ({len(life_story)} chars)")
+
+    if days_to_plan:
+        plan_and_schedule_from_life_story(influencer_id, days_to_plan=days_to_plan)
@@ -0,0 +1,142 @@
+"""Incremental re-planning after a divine intervention"""
+
+from datetime import datetime
+from typing import List, Tuple
+import difflib
+import logging
+import re
+
+from database.models import get_db_session, Influencer, Video, VideoStatus, Schedule
+from managers.ai_generator import ai_generator
+from managers.scheduler import video_scheduler
+from utils.background_tasks import delete_posts, plan_and_schedule_from_life_story, store_plan_items
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def story_changes(old_story: str, new_story: str) -> str:
+    """
+    Sentence-level diff of two life stories, as the removed and added passages.
+    Returns an empty string when the stories say the same thing.
+    """
+    old_sentences = [s.strip() for s in _SENTENCE_RE.split(old_story or "") if s.strip()]
+    new_sentences = [s.strip() for s in _SENTENCE_RE.split(new_story or "") if s.strip()]
+    removed, added = [], []
+    matcher = difflib.SequenceMatcher(a=old_sentences, b=new_sentences, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete"):
+            removed.extend(old_sentences[i1:i2])
+        if tag in ("replace", "insert"):
+            added.extend(new_sentences[j1:j2])
+
+    sections = []
+    if removed:
+        sections.append("Removed or replaced:\n" + "\n".join(f"- {s}" for s in removed))
+    if added:
+        sections.append("New:\n" + "\n".join(f"- {s}" for s in added))
+    return "\n\n".join(sections)
+
+
+def _future_posts(db, influencer_id: int) -> List[Tuple[Schedule, Video]]:
+    return (
+        db.query(Schedule, Video)
+        .join(Video, Video.id == Schedule.video_id)
+        .filter(Video.influencer_id == influencer_id)
+        .filter(Schedule.run_at > datetime.now())
+        .order_by(Schedule.run_at)
+        .all()
+    )
+
+
+def _delete_posts(db, posts: List[Tuple[Schedule, Video]]):
+    if not posts:
+        return
+    video_scheduler.cancel_many([schedule.id for schedule, _ in posts])
+    delete_posts(db, [video for _, video in posts])
+
+
+def _full_replan(db, influencer_id: int, posts: List[Tuple[Schedule, Video]], days_to_plan: int):
+    _delete_posts(db, posts)
+    logger.info(f"Cleared {len(posts)} future posts for influencer {influencer_id}; replanning from scratch.")
+    plan_and_schedule_from_life_story(influencer_id, days_to_plan=days_to_plan)
+
+
+def replan_after_intervention(
+    influencer_id: int,
+    old_story: str,
+    event_description: str,
+    intensity: str,
+    days_to_plan: int = 30,
+):
+    """
+    Updates an influencer's future posts after their life story was rewritten.
+
+    Posts that are still consistent with the new story are kept as they are,
+    including their scheduled jobs. Only inconsistent posts are deleted, and new
+    posts are planned for just those days. Major interventions, influencers
+    without a plan, and failed reviews fall back to a full replan.
+    """
+    db = get_db_session()
+    try:
+        influencer = db.query(Influencer).filter(Influencer.id == influencer_id).first()
+        if not influencer or not influencer.life_story:
+            logger.warning(f"Cannot replan influencer {influencer_id}: No influencer or life story found.")
+            return
+
+        posts = _future_posts(db, influencer_id)
+        pending = [(s, v) for s, v in posts if v.status == VideoStatus.PENDING]
+        if intensity == "major" or not pending:
+            _full_replan(db, influencer_id, posts, days_to_plan)
+            return
+
+        changes = story_changes(old_story, influencer.life_story)
+        if not changes:
+            logger.info(f"Life story of influencer {influencer_id} is unchanged; keeping all {len(pending)} future posts.")
+            return
+
+        today = datetime.now()
+        items = [
+            {
+                "id": video.id,
+                "day": (schedule.run_at.date() - today.date()).days + 1,
+                "content_type": video.content_type,
+                "post_context": video.post_context
+                or (video.generation_prompt or {}).get("description", ""),
+            }
+            for schedule, video in pending
+        ]
+        inconsistent = ai_generator.review_content_plan(
+            influencer, changes, event_description, items
+        )
+        if inconsistent is None:
+            _full_replan(db, influencer_id, posts, days_to_plan)
+            return
+
+        removed_ids = set(inconsistent)
+        removed = [(s, v) for s, v in pending if v.id in removed_ids]
+        if not removed:
+            logger.info(f"All {len(pending)} future posts of influencer {influencer_id} still fit the new story.")
+            return
+
+        days = sorted({item["day"] for item in items if item["id"] in removed_ids})
+        kept_summary = "\n".join(
+            f"- Day {item['day']} ({item['content_type']}): {item['post_context']}"
+            for item in items
+            if item["id"] not in removed_ids
+        )
+        _delete_posts(db, removed)
+
+        replacements = ai_generator.generate_replacement_plan(
+            influencer, days, kept_summary, event_description
+        )
+        created = store_plan_items(db, influencer, replacements, today)
+        logger.info(
+            f"Replanned influencer {influencer_id}: kept {len(pending) - len(removed)} posts, "
+            f"replaced {len(removed)} on {len(days)} days with {created} new posts."
+        )
+    except Exception as e:
+        logger.error(f"Error replanning influencer {influencer_id}: {e}", exc_info=True)
+    finally:
+        db.close()